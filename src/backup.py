@@ -17,18 +17,27 @@ File:       backup.py
 Author:     Lorn B Kerr
 Copyright:  (c) 2022 - 2025 Lorn B Kerr
 License:    MIT, see file LICENSE
-Version:    1.1.0
+Version:    1.1.1
 """
 
+import multiprocessing
 import sys
 
 from main import Backup
 
 file_name = "backup.py"
-file_version = "1.1.0"
-changes = {"1.0.0": "Initial release", "1.1.0": "added file version info."}
+file_version = "1.1.1"
+changes = {
+    "1.0.0": "Initial release",
+    "1.1.0": "added file version info.",
+    "1.1.1": "Call multiprocessing.freeze_support() for the compression"
+    + " workers of the frozen program.",
+}
 
 if __name__ == "__main__":
+    # a worker process of the frozen program runs as a worker here,
+    #  rather than running the backup again.
+    multiprocessing.freeze_support()
     # get the command line arguments
     args = sys.argv
     args.pop(0)  # discard the program name
@@ -0,0 +1,261 @@
+"""
+Pack the small files of a directory into a single bundle file.
+
+File:       bundle.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.2
+"""
+
+import json
+import os
+import stat
+from typing import Any
+
+file_name = "bundle.py"
+file_version = "1.0.2"
+changes = {
+    "1.0.0": "Initial release",
+    "1.0.1": "Return the bytes extracted, so a short pack can be found.",
+    "1.0.2": "Added remove() for a directory with no small files left.",
+}
+
+PACK_NAME = ".backup.pack"
+""" The name of the pack file holding the small files of a directory. """
+
+INDEX_NAME = ".backup.pack.index"
+""" The name of the sidecar index of the pack file. """
+
+
+class Bundle:
+    """
+    The small files of a backup directory, packed into one file.
+
+    Each small file in a directory is appended to the pack file,
+    '.backup.pack', rather than copied to a file of its own, so a
+    drive with slow directory updates, such as FAT and exFAT drives,
+    writes two files for the directory rather than one for each small
+    file. The sidecar index, '.backup.pack.index', is a JSON file giving
+    the name, offset, size, mode and modification time of each file in
+    the pack, so any one file can be read back without reading the
+    rest.
+
+    When any of the small files changes, the pack and index are written
+    again from the source, to temporary files renamed into place, so a
+    pack is never left half written.
+
+    Parameters:
+        directory (str): the backup directory holding the bundle.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Read the index of the bundle in a directory, if there is one.
+
+        Parameters:
+            directory (str): the backup directory holding the bundle.
+        """
+        self.directory: str = str(directory)
+        """ The backup directory holding the bundle """
+        self.pack_path: str = os.path.join(self.directory, PACK_NAME)
+        """ The pack file """
+        self.index_path: str = os.path.join(self.directory, INDEX_NAME)
+        """ The index of the pack file """
+        self.entries: dict[str, dict[str, Any]] = self.read_index()
+        """ The index entry of each file in the pack, by name """
+
+    @staticmethod
+    def is_bundle_file(filename: str) -> bool:
+        """
+        Check if a file name is the name of a pack or index file.
+
+        Parameters:
+            filename (str): the file name.
+
+        Returns:
+            (bool) True if the file is part of a bundle.
+        """
+        return filename in (PACK_NAME, INDEX_NAME)
+
+    def read_index(self) -> dict[str, dict[str, Any]]:
+        """
+        Read the index of the pack file.
+
+        Returns:
+            (dict[str, dict[str, Any]]) the index entries by name, empty
+                if there is no valid index.
+        """
+        try:
+            with open(self.index_path, encoding="utf-8") as index:
+                files = json.load(index)["files"]
+            pack_size = os.stat(self.pack_path).st_size
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+        if sum(entry["size"] for entry in files) != pack_size:
+            return {}
+        return {entry["name"]: entry for entry in files}
+
+    def is_current(self, files: list[tuple[str, str, os.stat_result]]) -> bool:
+        """
+        Check if the bundle holds exactly the given files, unchanged.
+
+        Parameters:
+            files (list[tuple[str, str, os.stat_result]]): the name,
+                source path and status of each small file.
+
+        Returns:
+            (bool) True if the bundle need not be written again.
+        """
+        return len(files) == len(self.entries) and not self.changed_files(files)
+
+    def changed_files(self, files: list[tuple[str, str, os.stat_result]]) -> int:
+        """
+        Count the files that are new or changed since the pack was written.
+
+        Parameters:
+            files (list[tuple[str, str, os.stat_result]]): the name,
+                source path and status of each small file.
+
+        Returns:
+            (int) the count of new or changed files.
+        """
+        count = 0
+        for filename, source_path, source_stat in files:
+            entry = self.entries.get(filename)
+            if (
+                entry is None
+                or entry["size"] != source_stat.st_size
+                or entry["mtime_ns"] != source_stat.st_mtime_ns
+            ):
+                count += 1
+        return count
+
+    def write(self, files: list[tuple[str, str, os.stat_result]]) -> int:
+        """
+        Write the pack file and its index from the source files.
+
+        A file that changes size while it is read is recorded with the
+        size read.
+
+        Parameters:
+            files (list[tuple[str, str, os.stat_result]]): the name,
+                source path and status of each small file.
+
+        Returns:
+            (int) the size of the pack file.
+        """
+        entries = []
+        offset = 0
+        temp_pack = self.pack_path + ".tmp"
+        with open(temp_pack, "wb") as pack:
+            for filename, source_path, source_stat in sorted(files):
+                with open(source_path, "rb") as source:
+                    data = source.read()
+                pack.write(data)
+                entries.append(
+                    {
+                        "name": filename,
+                        "offset": offset,
+                        "size": len(data),
+                        "mode": stat.S_IMODE(source_stat.st_mode),
+                        "mtime_ns": source_stat.st_mtime_ns,
+                    }
+                )
+                offset += len(data)
+            pack.flush()
+            os.fsync(pack.fileno())
+
+        temp_index = self.index_path + ".tmp"
+        with open(temp_index, "w", encoding="utf-8") as index:
+            json.dump({"version": 1, "files": entries}, index, separators=(",", ":"))
+            index.flush()
+            os.fsync(index.fileno())
+
+        # the index is removed first, so a new pack is never read with
+        # an old index.
+        if os.path.exists(self.index_path):
+            os.unlink(self.index_path)
+        os.replace(temp_pack, self.pack_path)
+        os.replace(temp_index, self.index_path)
+        self.entries = {entry["name"]: entry for entry in entries}
+        return offset
+
+    def remove(self) -> None:
+        """Remove the pack and its index, once the directory has no small files."""
+        # the index is removed first, as when the pack is written again
+        for path in (self.index_path, self.pack_path):
+            if os.path.lexists(path):
+                os.unlink(path)
+        self.entries = {}
+
+    def read(self, filename: str) -> bytes:
+        """
+        Read a file from the pack.
+
+        Parameters:
+            filename (str): the name of the file.
+
+        Returns:
+            (bytes) the file data.
+
+        Raises:
+            KeyError: if the file is not in the pack.
+        """
+        entry = self.entries[filename]
+        with open(self.pack_path, "rb") as pack:
+            pack.seek(entry["offset"])
+            return pack.read(entry["size"])
+
+    def extract(self, filename: str, destination_path: str) -> int:
+        """
+        Restore a file from the pack, with its mode and modification time.
+
+        Parameters:
+            filename (str): the name of the file.
+            destination_path (str): the file to write.
+
+        Returns:
+            (int) the number of bytes written, less than the size of the
+                file if the pack is short.
+        """
+        entry = self.entries[filename]
+        with open(self.pack_path, "rb") as pack, open(
+            destination_path, "wb"
+        ) as destination:
+            pack.seek(entry["offset"])
+            remaining = entry["size"]
+            while remaining:
+                data = pack.read(min(remaining, 1024 * 1024))
+                if not data:
+                    break
+                destination.write(data)
+                remaining -= len(data)
+        os.chmod(destination_path, entry["mode"])
+        os.utime(destination_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        return entry["size"] - remaining
+
+    def link_from(self, previous: "Bundle") -> bool:
+        """
+        Hard link the pack and index of an unchanged bundle.
+
+        Parameters:
+            previous (Bundle): the same bundle in the previous snapshot.
+
+        Returns:
+            (bool) True if linked, False if the bundle must be written.
+        """
+        linked = []
+        try:
+            for previous_path, path in (
+                (previous.pack_path, self.pack_path),
+                (previous.index_path, self.index_path),
+            ):
+                os.link(previous_path, path)
+                linked.append(path)
+        except OSError:
+            for path in linked:
+                os.unlink(path)
+            return False
+        self.entries = self.read_index()
+        return True
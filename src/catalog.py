@@ -0,0 +1,471 @@
+"""
+Keep a searchable catalog of the files in each backup run.
+
+File:       catalog.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.1.0
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+file_name = "catalog.py"
+file_version = "1.1.0"
+changes = {
+    "1.0.0": "Initial release",
+    "1.1.0": "Added diff() to compare the files of two runs.",
+}
+
+WILDCARDS = "*?["
+""" A pattern with any of these is matched as a glob. """
+
+
+class Catalog:
+    """
+    Keep a searchable catalog of the files in each backup run.
+
+    The catalog is a SQLite database stored beside the log database, so
+    a file can be found in the backups without reading the backup drive.
+    Each run is recorded in the 'runs' table. The 'entries' table holds
+    the size and modification time of every file in the backup after
+    the run, keyed by the run and the file's path relative to the
+    source. Each path is stored once, in the 'paths' table, with a full
+    text index, 'paths_fts', using the trigram tokenizer, so a search
+    for any part of a path uses the index rather than reading every
+    path. Where SQLite has no FTS5 or trigram tokenizer the paths are
+    searched without the index.
+
+    Only the latest 'keep_runs' complete runs are kept. A run that did
+    not finish is dropped when the next run starts.
+
+    Parameters:
+        catalog_path (str): the path to the catalog database.
+        source (str): the source directory being backed up, the paths
+            are kept relative to it; default is "", keep them as given.
+    """
+
+    BATCH_SIZE = 5000
+    """ The number of entries held before they are written. """
+
+    def __init__(self, catalog_path: str, source: str = "") -> None:
+        """
+        Open the catalog database, creating it if needed.
+
+        Parameters:
+            catalog_path (str): the path to the catalog database.
+            source (str): the source directory being backed up.
+        """
+        self.source: str = str(source).rstrip(os.sep)
+        """ The source directory the paths are relative to """
+        self.run_id: int = None
+        """ The run being recorded, None if none """
+        self.pending: list[tuple[str, int, int]] = []
+        """ The entries waiting to be written """
+        self.lock: threading.RLock = threading.RLock()
+        """ Guards the database and the pending entries """
+
+        directory_path = os.path.dirname(catalog_path)
+        if directory_path and not os.path.exists(directory_path):
+            os.makedirs(directory_path)
+        self.db: sqlite3.Connection = sqlite3.connect(
+            catalog_path, check_same_thread=False
+        )
+        """ The catalog database connection """
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id INTEGER PRIMARY KEY, started INTEGER NOT NULL, "
+            "layout TEXT NOT NULL, location TEXT NOT NULL, snapshot TEXT, "
+            "files INTEGER NOT NULL DEFAULT 0, "
+            "complete INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS paths ("
+            "path_id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "run_id INTEGER NOT NULL, path_id INTEGER NOT NULL, "
+            "size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "PRIMARY KEY (run_id, path_id)) WITHOUT ROWID"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_path ON entries (path_id)")
+        self.indexed: bool = self.create_index()
+        """ True if the paths have a full text index """
+        self.db.commit()
+
+    def create_index(self) -> bool:
+        """
+        Create the full text index of the paths, if SQLite supports it.
+
+        Returns:
+            (bool) True if the paths are indexed.
+        """
+        try:
+            self.db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS paths_fts USING fts5("
+                "path, content='paths', content_rowid='path_id', "
+                "tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            return False  # no FTS5 or no trigram tokenizer
+        self.db.execute(
+            "CREATE TRIGGER IF NOT EXISTS paths_insert AFTER INSERT ON paths "
+            "BEGIN INSERT INTO paths_fts (rowid, path) "
+            "VALUES (new.path_id, new.path); END"
+        )
+        self.db.execute(
+            "CREATE TRIGGER IF NOT EXISTS paths_delete AFTER DELETE ON paths "
+            "BEGIN INSERT INTO paths_fts (paths_fts, rowid, path) "
+            "VALUES ('delete', old.path_id, old.path); END"
+        )
+        return True
+
+    @staticmethod
+    def default_path(log_path: str, log_name: str) -> str | None:
+        """
+        Get the path of the catalog kept beside a log database.
+
+        Parameters:
+            log_path (str): the log directory.
+            log_name (str): the log database name.
+
+        Returns:
+            (str | None) the catalog path, None if there is no log path.
+        """
+        if not log_path or not log_name:
+            return None
+        return os.path.join(log_path, os.path.splitext(log_name)[0] + ".catalog")
+
+    def start_run(
+        self, started: int, layout: str, location: str, snapshot: str = None
+    ) -> int:
+        """
+        Start recording a backup run, dropping any run that did not finish.
+
+        Parameters:
+            started (int): the time the run started.
+            layout (str): the backup layout.
+            location (str): the backup location.
+            snapshot (str): the snapshot written by the run, if any.
+
+        Returns:
+            (int) the run id.
+        """
+        with self.lock:
+            self.drop_runs(
+                [
+                    row[0]
+                    for row in self.db.execute(
+                        "SELECT run_id FROM runs WHERE NOT complete"
+                    )
+                ]
+            )
+            cursor = self.db.execute(
+                "INSERT INTO runs (started, layout, location, snapshot) "
+                "VALUES (?, ?, ?, ?)",
+                (started, layout, str(location), snapshot),
+            )
+            self.run_id = cursor.lastrowid
+            self.db.commit()
+            return self.run_id
+
+    def relative_path(self, path: str) -> str:
+        """
+        Get a path relative to the source.
+
+        Parameters:
+            path (str): the path of a source file.
+
+        Returns:
+            (str) the path relative to the source.
+        """
+        path = str(path)
+        if self.source and path.startswith(self.source + os.sep):
+            return path[len(self.source) + 1 :]
+        return path
+
+    def add(self, path: str, file_stat: os.stat_result) -> None:
+        """
+        Add a file to the run being recorded.
+
+        Parameters:
+            path (str): the path of the source file.
+            file_stat (os.stat_result): the file status.
+        """
+        with self.lock:
+            self.pending.append(
+                (self.relative_path(path), file_stat.st_size, file_stat.st_mtime_ns)
+            )
+            if len(self.pending) >= self.BATCH_SIZE:
+                self.flush()
+
+    def discard(self, path: str) -> None:
+        """
+        Remove a file that could not be backed up from the run.
+
+        Parameters:
+            path (str): the path of the source file.
+        """
+        with self.lock:
+            self.flush()
+            self.db.execute(
+                "DELETE FROM entries WHERE run_id = ? AND path_id = "
+                "(SELECT path_id FROM paths WHERE path = ?)",
+                (self.run_id, self.relative_path(path)),
+            )
+            self.db.commit()
+
+    def flush(self) -> None:
+        """Write the pending entries to the database."""
+        with self.lock:
+            if not self.pending:
+                return
+            self.db.executemany(
+                "INSERT OR IGNORE INTO paths (path) VALUES (?)",
+                [(entry[0],) for entry in self.pending],
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entries (run_id, path_id, size, mtime_ns) "
+                "SELECT ?, path_id, ?, ? FROM paths WHERE path = ?",
+                [
+                    (self.run_id, size, mtime_ns, path)
+                    for path, size, mtime_ns in self.pending
+                ],
+            )
+            self.db.commit()
+            self.pending = []
+
+    def finish_run(self, keep_runs: int = 0) -> None:
+        """
+        Complete the run being recorded, and drop the oldest runs.
+
+        Parameters:
+            keep_runs (int): the number of complete runs to keep, 0 to
+                keep them all.
+        """
+        with self.lock:
+            self.flush()
+            self.db.execute(
+                "UPDATE runs SET complete = 1, files = "
+                "(SELECT COUNT(*) FROM entries WHERE run_id = ?) WHERE run_id = ?",
+                (self.run_id, self.run_id),
+            )
+            if keep_runs:
+                self.drop_runs(
+                    [
+                        row[0]
+                        for row in self.db.execute(
+                            "SELECT run_id FROM runs WHERE complete "
+                            "ORDER BY run_id DESC LIMIT -1 OFFSET ?",
+                            (keep_runs,),
+                        )
+                    ]
+                )
+            self.db.commit()
+            self.run_id = None
+
+    def drop_runs(self, run_ids: list[int]) -> None:
+        """
+        Remove runs and their entries, and the paths no run holds.
+
+        Parameters:
+            run_ids (list[int]): the runs to remove.
+        """
+        if not run_ids:
+            return
+        with self.lock:
+            for run_id in run_ids:
+                self.db.execute("DELETE FROM entries WHERE run_id = ?", (run_id,))
+                self.db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self.db.execute(
+                "DELETE FROM paths WHERE NOT EXISTS "
+                "(SELECT 1 FROM entries WHERE entries.path_id = paths.path_id)"
+            )
+
+    def runs(self) -> list[tuple[int, int, str, int]]:
+        """
+        Get the complete runs.
+
+        Returns:
+            (list[tuple[int, int, str, int]]) the run id, start time,
+                snapshot name and file count of each run, oldest first.
+        """
+        with self.lock:
+            return [
+                tuple(row)
+                for row in self.db.execute(
+                    "SELECT run_id, started, snapshot, files FROM runs "
+                    "WHERE complete ORDER BY run_id"
+                )
+            ]
+
+    def diff(self, run_a: int, run_b: int) -> tuple[list[str], list[str], list[str]]:
+        """
+        Find the files added, removed and modified between two runs.
+
+        The entries of each run are read in path id order, straight from
+        the primary key, and merged in one pass, so no path is compared
+        twice and only the changed paths are looked up.
+
+        Parameters:
+            run_a (int): the earlier run.
+            run_b (int): the later run.
+
+        Returns:
+            (tuple[list[str], list[str], list[str]]) the paths added,
+                removed and modified, each sorted.
+        """
+        with self.lock:
+            self.flush()
+            added, removed, modified = [], [], []
+            old_entries = self.run_entries(run_a)
+            new_entries = self.run_entries(run_b)
+            old = next(old_entries, None)
+            new = next(new_entries, None)
+            while old is not None or new is not None:
+                if new is None or (old is not None and old[0] < new[0]):
+                    removed.append(old[0])
+                    old = next(old_entries, None)
+                elif old is None or new[0] < old[0]:
+                    added.append(new[0])
+                    new = next(new_entries, None)
+                else:
+                    if old[1:] != new[1:]:
+                        modified.append(new[0])
+                    old = next(old_entries, None)
+                    new = next(new_entries, None)
+            return (
+                self.path_names(added),
+                self.path_names(removed),
+                self.path_names(modified),
+            )
+
+    def run_entries(self, run_id: int) -> sqlite3.Cursor:
+        """
+        Get the entries of a run in path id order.
+
+        Parameters:
+            run_id (int): the run.
+
+        Returns:
+            (sqlite3.Cursor) the path id, size and modification time of
+                each entry.
+        """
+        cursor = self.db.cursor()
+        cursor.arraysize = self.BATCH_SIZE
+        return cursor.execute(
+            "SELECT path_id, size, mtime_ns FROM entries WHERE run_id = ? "
+            "ORDER BY path_id",
+            (run_id,),
+        )
+
+    def path_names(self, path_ids: list[int]) -> list[str]:
+        """
+        Get the paths for a list of path ids.
+
+        Parameters:
+            path_ids (list[int]): the path ids.
+
+        Returns:
+            (list[str]) the paths, sorted.
+        """
+        paths = []
+        for start in range(0, len(path_ids), 500):
+            batch = path_ids[start : start + 500]
+            paths.extend(
+                row[0]
+                for row in self.db.execute(
+                    "SELECT path FROM paths WHERE path_id IN ("
+                    + ", ".join("?" * len(batch))
+                    + ")",
+                    batch,
+                )
+            )
+        return sorted(paths)
+
+    def find(self, pattern: str, limit: int = 1000) -> list[tuple]:
+        """
+        Find the files whose path matches a pattern, in every run.
+
+        A pattern with a wildcard, '*', '?' or '[...]', is matched
+        against the whole path; any other pattern is found anywhere in
+        the path, ignoring case.
+
+        Parameters:
+            pattern (str): the pattern to find.
+            limit (int): the most results to return.
+
+        Returns:
+            (list[tuple]) the path, run id, run start time, snapshot name,
+                size and modification time of each match, by path and
+                run.
+        """
+        if any(wildcard in pattern for wildcard in WILDCARDS):
+            table = "paths_fts" if self.indexed else "paths"
+            id_column = "rowid" if self.indexed else "path_id"
+            matches = "SELECT " + id_column + " FROM " + table + " WHERE path GLOB ?"
+            value = pattern
+        elif self.indexed and len(pattern) >= 3:
+            matches = "SELECT rowid FROM paths_fts WHERE paths_fts MATCH ?"
+            value = '"' + pattern.replace('"', '""') + '"'
+        else:
+            matches = "SELECT path_id FROM paths WHERE path LIKE ? ESCAPE '\\'"
+            value = (
+                "%"
+                + pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                + "%"
+            )
+        with self.lock:
+            self.flush()
+            return [
+                tuple(row)
+                for row in self.db.execute(
+                    "SELECT paths.path, runs.run_id, runs.started, runs.snapshot, "
+                    "entries.size, entries.mtime_ns FROM paths "
+                    "JOIN entries ON entries.path_id = paths.path_id "
+                    "JOIN runs ON runs.run_id = entries.run_id AND runs.complete "
+                    "WHERE paths.path_id IN (" + matches + ") "
+                    "ORDER BY paths.path, runs.run_id LIMIT ?",
+                    (value, limit),
+                )
+            ]
+
+    @staticmethod
+    def describe(match: tuple) -> str:
+        """
+        Describe a file found by find().
+
+        Parameters:
+            match (tuple): the path, run id, run start time, snapshot
+                name, size and modification time of the file.
+
+        Returns:
+            (str) the description, one line.
+        """
+        path, run_id, started, snapshot, size, mtime_ns = match
+        description = (
+            path
+            + "  "
+            + str(size)
+            + " bytes  modified "
+            + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(mtime_ns / 1e9))
+            + "  run "
+            + str(run_id)
+            + " of "
+            + time.strftime("%Y-%m-%d %H:%M", time.localtime(started))
+        )
+        if snapshot:
+            description += "  snapshot " + snapshot
+        return description
+
+    def close(self) -> None:
+        """Write any pending entries and close the database."""
+        with self.lock:
+            self.flush()
+            self.db.close()
@@ -0,0 +1,256 @@
+"""
+Compress files as they are copied to the backup drive.
+
+File:       compressor.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.1.1
+"""
+
+import lzma
+import multiprocessing
+import os
+import shutil
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO
+
+from hasher import StreamDigest
+
+try:
+    from compression import zstd
+except ImportError:  # before Python 3.14
+    zstd = None
+
+file_name = "compressor.py"
+file_version = "1.1.1"
+changes = {
+    "1.0.0": "Initial release",
+    "1.1.0": "Hash the data as it is compressed; added open_compressed().",
+    "1.1.1": "Start the compression processes with forkserver, or spawn,"
+    + " rather than fork.",
+}
+
+SUFFIXES = {"zstd": ".zst", "lzma": ".xz"}
+""" The suffix added to the name of a compressed file by method. """
+
+SAMPLE_SIZE = 64 * 1024
+""" The size of the first block read to decide if a file compresses. """
+
+MIN_SAVING = 0.05
+""" The part of the sample a fast compression must save. """
+
+COMPRESSED_SIGNATURES = (
+    (0, b"\xff\xd8\xff"),  # JPEG
+    (0, b"\x89PNG\r\n\x1a\n"),  # PNG
+    (0, b"GIF8"),  # GIF
+    (8, b"WEBP"),  # WebP
+    (4, b"ftyp"),  # MP4, MOV, HEIC
+    (0, b"\x1a\x45\xdf\xa3"),  # Matroska, WebM
+    (0, b"ID3"),  # MP3
+    (0, b"OggS"),  # Ogg
+    (0, b"fLaC"),  # FLAC
+    (0, b"PK\x03\x04"),  # ZIP, JAR, office documents
+    (0, b"\x1f\x8b"),  # gzip
+    (0, b"\x28\xb5\x2f\xfd"),  # zstd
+    (0, b"\xfd7zXZ\x00"),  # xz
+    (0, b"BZh"),  # bzip2
+    (0, b"7z\xbc\xaf\x27\x1c"),  # 7-Zip
+    (0, b"Rar!\x1a\x07"),  # RAR
+)
+""" The offsets and signatures of data that is already compressed. """
+
+
+def is_compressible(sample: bytes) -> bool:
+    """
+    Decide from the first block of a file if the file will compress.
+
+    Files in a known compressed format are not compressed again, nor
+    are files whose first block does not shrink with a fast compression.
+
+    Parameters:
+        sample (bytes): the first block of the file.
+
+    Returns:
+        (bool) True if the file is worth compressing.
+    """
+    for offset, signature in COMPRESSED_SIGNATURES:
+        if sample.startswith(signature, offset):
+            return False
+    if not sample:
+        return False
+    return len(zlib.compress(sample, 1)) <= len(sample) * (1 - MIN_SAVING)
+
+
+def compress_file(
+    source_path: str, destination_path: str, method: str, level: int
+) -> tuple[bool, int, int, str]:
+    """
+    Compress a file to the backup drive, if it will compress.
+
+    This runs in the compression processes. The file is streamed to a
+    temporary file that is renamed into place when complete, and hashed
+    as it is read.
+
+    Parameters:
+        source_path (str): the file to compress.
+        destination_path (str): the compressed file to write.
+        method (str): "zstd" or "lzma".
+        level (int): the compression level, 0 for the default.
+
+    Returns:
+        (tuple[bool, int, int, str]) True if compressed, the bytes read
+            and written, and the content hash of the data read; False if
+            the file should be copied as it is.
+    """
+    temp_path = destination_path + ".tmp"
+    digest = StreamDigest()
+    with open(source_path, "rb") as source:
+        sample = source.read(SAMPLE_SIZE)
+        if not is_compressible(sample):
+            return False, 0, 0, None
+        if method == "zstd":
+            options = {"level": level} if level else {}
+            output = zstd.open(temp_path, "wb", **options)
+        else:
+            output = lzma.open(temp_path, "wb", preset=level or None)
+        with output:
+            data = sample
+            while data:
+                digest.update(data)
+                output.write(data)
+                data = source.read(1024 * 1024)
+        bytes_read = source.tell()
+    shutil.copymode(source_path, temp_path)
+    os.replace(temp_path, destination_path)
+    return True, bytes_read, os.stat(destination_path).st_size, digest.hexdigest()
+
+
+def open_compressed(path: str) -> BinaryIO:
+    """
+    Open a compressed backup copy to read the original data.
+
+    Parameters:
+        path (str): the compressed file, named with its method's suffix.
+
+    Returns:
+        (BinaryIO) the file, giving the data as it was before it was
+            compressed.
+
+    Raises:
+        ValueError: if the suffix is not of a known method, or the
+            method is not available.
+    """
+    if path.endswith(SUFFIXES["lzma"]):
+        return lzma.open(path, "rb")
+    if path.endswith(SUFFIXES["zstd"]) and zstd is not None:
+        return zstd.open(path, "rb")
+    raise ValueError("Cannot read the compressed file " + path)
+
+
+class Compressor:
+    """
+    Compress files to the backup drive with a pool of processes.
+
+    Each file is compressed to '<name>.zst' or '<name>.xz' by one of the
+    processes, so the compression of several files can use several
+    CPUs while the copy threads wait for them. Files that are already
+    compressed, judged from their first block, are left for the copy
+    threads to copy as they are.
+
+    Parameters:
+        method (str): "zstd" or "lzma".
+        level (int): the compression level, 0 for the default.
+        workers (int): the number of compression processes, 0 for one
+            per CPU.
+    """
+
+    def __init__(self, method: str, level: int = 0, workers: int = 0) -> None:
+        """
+        Set the compression method.
+
+        Parameters:
+            method (str): "zstd" or "lzma".
+            level (int): the compression level, 0 for the default.
+            workers (int): the number of compression processes, 0 for
+                one per CPU.
+        """
+        self.method: str = method
+        """ The compression method, "zstd" or "lzma" """
+        self.level: int = level
+        """ The compression level, 0 for the default """
+        self.workers: int = workers or os.cpu_count() or 1
+        """ The number of compression processes """
+        self.suffix: str = SUFFIXES[method]
+        """ The suffix added to the name of a compressed file """
+        self.pool: ProcessPoolExecutor = None
+        """ The compression processes, started when first needed """
+        self.lock: threading.Lock = threading.Lock()
+        """ Guards the pool and the counts """
+        self.files_compressed: int = 0
+        """ The count of the files compressed """
+        self.bytes_read: int = 0
+        """ The bytes read from the files compressed """
+        self.bytes_written: int = 0
+        """ The bytes written for the files compressed """
+
+    @staticmethod
+    def available(method: str) -> bool:
+        """
+        Check if a compression method can be used.
+
+        Parameters:
+            method (str): the compression method.
+
+        Returns:
+            (bool) True if the method is known and available.
+        """
+        return method == "lzma" or (method == "zstd" and zstd is not None)
+
+    def compress(self, source_path: str, destination_path: str) -> str | None:
+        """
+        Compress a file to the backup drive, if it will compress.
+
+        Parameters:
+            source_path (str): the file to compress.
+            destination_path (str): the backup copy, without the suffix.
+
+        Returns:
+            (str | None) the content hash of the file, see
+                'hasher.file_digest', if compressed to the destination
+                path with the suffix added; None if the file must be
+                copied.
+        """
+        with self.lock:
+            if self.pool is None:
+                # the copy threads are running, and forking a process
+                # with threads can deadlock on a lock another thread holds
+                start_method = "spawn"
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    start_method = "forkserver"
+                self.pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context(start_method)
+                )
+            pool = self.pool
+        compressed, bytes_read, bytes_written, digest = pool.submit(
+            compress_file,
+            str(source_path),
+            str(destination_path) + self.suffix,
+            self.method,
+            self.level,
+        ).result()
+        if compressed:
+            with self.lock:
+                self.files_compressed += 1
+                self.bytes_read += bytes_read
+                self.bytes_written += bytes_written
+        return digest
+
+    def close(self) -> None:
+        """Stop the compression processes."""
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
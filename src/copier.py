@@ -0,0 +1,398 @@
+"""
+Copy files to the backup drive.
+
+File:       copier.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.3.1
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import stat
+
+from hasher import StreamDigest
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+file_name = "copier.py"
+file_version = "1.3.1"
+changes = {
+    "1.0.0": "Initial release",
+    "1.1.0": "Added append_tail() to copy only the new end of a grown file.",
+    "1.2.0": "Replace, rather than write through, a copy that is a link or"
+    + " is shared by hard links.",
+    "1.3.0": "Added copy_hashed() to hash the data as it is copied.",
+    "1.3.1": "Raise SpecialFileError for a source that is not a regular file or"
+    + " a link, rather than blocking on a named pipe.",
+}
+
+FICLONE = 0x40049409
+""" The Linux ioctl to clone a file, sharing the data blocks. """
+
+UNSUPPORTED = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSOCK,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EPERM,
+    errno.EXDEV,
+}
+""" The error numbers showing a copy method will not work here. """
+
+
+class CopyMethodUnsupported(Exception):
+    """A copy method does not work for this pair of file systems."""
+
+
+class FileCopier:
+    """
+    Copy a file, keeping the data in the kernel where possible.
+
+    The copy methods are tried in the order
+        reflink: clone the file, sharing its data blocks; only on a
+            copy-on-write file system such as btrfs or XFS, and only if
+            the source is on the same volume,
+        copy_file_range: copy in the kernel, possibly offloaded to the
+            file system or storage,
+        sendfile: copy in the kernel,
+        buffered: read and write through a buffer.
+    The first method that works for a pair of source and destination
+    file systems is remembered, so the methods that failed are not
+    tried again for every file.
+
+    Like 'shutil.copy2', symbolic links are copied as links, other files
+    that are not regular files, such as named pipes, raise
+    'shutil.SpecialFileError' rather than being read, and the file
+    permissions and times are copied with the data. An existing
+    copy that is a link, or is shared by hard links, such as a file
+    linked from a previous snapshot, is replaced rather than written
+    through.
+    """
+
+    BUFFER_SIZE = 1024 * 1024
+    """ The size of the buffer for a buffered copy. """
+
+    CHUNK_SIZE = 1024 * 1024 * 1024
+    """ The most bytes asked for in one kernel copy call. """
+
+    TAIL_CHECK_SIZE = 64 * 1024
+    """ The size of the last block of a backup copy checked by append_tail(). """
+
+    def __init__(self) -> None:
+        """Set up the copy methods available on this system."""
+        self.methods: list[str] = []
+        """ The copy methods, in the order they are tried """
+        if fcntl is not None and hasattr(fcntl, "ioctl"):
+            self.methods.append("reflink")
+        if hasattr(os, "copy_file_range"):
+            self.methods.append("copy_file_range")
+        if hasattr(os, "sendfile"):
+            self.methods.append("sendfile")
+        self.methods.append("buffered")
+
+        self.first_method: dict[tuple[int, int], int] = {}
+        """ The first method to try for a (source, destination) device """
+
+    def copy(self, source_path: str, destination_path: str) -> str:
+        """
+        Copy a file with its permissions and times.
+
+        Parameters:
+            source_path (str): the file to copy.
+            destination_path (str): the copy to write.
+
+        Returns:
+            (str) the copy method used.
+        """
+        if self.prepare_destination(source_path, destination_path):
+            shutil.copy2(source_path, destination_path, follow_symlinks=False)
+            return "link"
+        method = self.copy_data(source_path, destination_path)
+        shutil.copystat(source_path, destination_path)
+        return method
+
+    def copy_hashed(self, source_path: str, destination_path: str) -> str | None:
+        """
+        Copy a file through a buffer, hashing the data as it is copied.
+
+        The data is read once, so the hash of the source costs no more
+        reading, but the copy cannot be done in the kernel.
+
+        Parameters:
+            source_path (str): the file to copy.
+            destination_path (str): the copy to write.
+
+        Returns:
+            (str | None) the hex content hash of the data copied, see
+                'hasher.file_digest', or None for a symbolic link.
+        """
+        if self.prepare_destination(source_path, destination_path):
+            shutil.copy2(source_path, destination_path, follow_symlinks=False)
+            return None
+        digest = StreamDigest()
+        buffer = bytearray(self.BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(source_path, "rb", buffering=0) as source, open(
+            destination_path, "wb", buffering=0
+        ) as dest:
+            while count := source.readinto(buffer):
+                digest.update(view[:count])
+                written = 0
+                while written < count:
+                    written += dest.write(view[written:count])
+        shutil.copystat(source_path, destination_path)
+        return digest.hexdigest()
+
+    @staticmethod
+    def prepare_destination(source_path: str, destination_path: str) -> bool:
+        """
+        Remove an existing copy that must be replaced, not written through.
+
+        Parameters:
+            source_path (str): the file to copy.
+            destination_path (str): the copy to write.
+
+        Returns:
+            (bool) True if the source is a symbolic link.
+
+        Raises:
+            shutil.SpecialFileError: if the source is not a regular file
+                or a symbolic link.
+        """
+        source_mode = os.lstat(source_path).st_mode
+        if not stat.S_ISREG(source_mode) and not stat.S_ISLNK(source_mode):
+            raise shutil.SpecialFileError(
+                "`" + str(source_path) + "` is not a regular file"
+            )
+        is_link = stat.S_ISLNK(source_mode)
+        try:
+            dest_stat = os.stat(destination_path, follow_symlinks=False)
+        except OSError:
+            dest_stat = None
+        if (
+            dest_stat is not None
+            and not stat.S_ISDIR(dest_stat.st_mode)
+            and (is_link or stat.S_ISLNK(dest_stat.st_mode) or dest_stat.st_nlink > 1)
+        ):
+            os.unlink(destination_path)
+        return is_link
+
+    def copy_data(self, source_path: str, destination_path: str) -> str:
+        """
+        Copy the data of a file.
+
+        Parameters:
+            source_path (str): the file to copy.
+            destination_path (str): the copy to write.
+
+        Returns:
+            (str) the copy method used.
+        """
+        with open(source_path, "rb") as source, open(destination_path, "wb") as dest:
+            return self.copy_range(source.fileno(), dest.fileno(), 0)
+
+    def append_tail(self, source_path: str, destination_path: str) -> str | None:
+        """
+        Copy only the new end of a file that has grown.
+
+        The backup copy is taken to be the start of the source file if
+        it is shorter and its last block is the same as the same block
+        of the source. A backup copy with other hard links is not
+        changed.
+
+        Parameters:
+            source_path (str): the file to copy.
+            destination_path (str): the backup copy.
+
+        Returns:
+            (str | None) the copy method used, or None if the backup
+                copy is not the start of the source file and the whole
+                file must be copied.
+        """
+        try:
+            dest_stat = os.stat(destination_path, follow_symlinks=False)
+        except OSError:
+            return None
+        if (
+            not stat.S_ISREG(os.lstat(source_path).st_mode)
+            or not stat.S_ISREG(dest_stat.st_mode)
+            or dest_stat.st_nlink > 1
+        ):
+            return None
+
+        with open(source_path, "rb") as source, open(destination_path, "r+b") as dest:
+            source_fd = source.fileno()
+            dest_fd = dest.fileno()
+            offset = os.fstat(dest_fd).st_size
+            if offset == 0 or offset >= os.fstat(source_fd).st_size:
+                return None
+            start = max(0, offset - self.TAIL_CHECK_SIZE)
+            if self.range_digest(source_fd, start, offset) != self.range_digest(
+                dest_fd, start, offset
+            ):
+                return None
+            method = self.copy_range(source_fd, dest_fd, offset)
+        shutil.copystat(source_path, destination_path)
+        return method
+
+    @staticmethod
+    def range_digest(fd: int, start: int, end: int) -> bytes:
+        """
+        Get the checksum of part of an open file.
+
+        Parameters:
+            fd (int): the open file.
+            start (int): the start of the part.
+            end (int): the end of the part.
+
+        Returns:
+            (bytes) the checksum; the file position is left at 'end'.
+        """
+        digest = hashlib.blake2b()
+        os.lseek(fd, start, os.SEEK_SET)
+        while start < end:
+            data = os.read(fd, end - start)
+            if not data:
+                break
+            digest.update(data)
+            start += len(data)
+        return digest.digest()
+
+    def copy_range(self, source_fd: int, dest_fd: int, offset: int) -> str:
+        """
+        Copy the data of an open file from an offset to the end.
+
+        Both files must be positioned at the offset. A whole file copy
+        remembers the method that works for the file systems; a partial
+        copy cannot be cloned, so it starts from the next method.
+
+        Parameters:
+            source_fd (int): the open source file.
+            dest_fd (int): the open destination file.
+            offset (int): the position to copy from.
+
+        Returns:
+            (str) the copy method used.
+        """
+        source_stat = os.fstat(source_fd)
+        size = source_stat.st_size - offset
+        devices = (source_stat.st_dev, os.fstat(dest_fd).st_dev)
+
+        index = self.first_method.get(devices, 0)
+        while True:
+            method = self.methods[index]
+            if offset and method == "reflink":
+                index += 1
+                continue
+            try:
+                getattr(self, "copy_" + method)(source_fd, dest_fd, size)
+                return method
+            except CopyMethodUnsupported:
+                # start over with the next method
+                index += 1
+                if not offset:
+                    self.first_method[devices] = index
+                os.lseek(source_fd, offset, os.SEEK_SET)
+                os.lseek(dest_fd, offset, os.SEEK_SET)
+                os.ftruncate(dest_fd, offset)
+
+    @staticmethod
+    def unsupported(exc: OSError) -> None:
+        """
+        Raise CopyMethodUnsupported if an error shows a method can't work.
+
+        Parameters:
+            exc (OSError): the error from the copy method.
+
+        Raises:
+            CopyMethodUnsupported
+        """
+        if exc.errno in UNSUPPORTED:
+            raise CopyMethodUnsupported() from exc
+
+    def copy_reflink(self, source_fd: int, dest_fd: int, size: int) -> None:
+        """
+        Clone the source file into the destination file.
+
+        Parameters:
+            source_fd (int): the open source file.
+            dest_fd (int): the open destination file.
+            size (int): the number of bytes to copy.
+        """
+        try:
+            fcntl.ioctl(dest_fd, FICLONE, source_fd)
+        except OSError as exc:
+            self.unsupported(exc)
+            raise
+
+    def copy_copy_file_range(self, source_fd: int, dest_fd: int, size: int) -> None:
+        """
+        Copy the file with 'os.copy_file_range'.
+
+        Parameters:
+            source_fd (int): the open source file.
+            dest_fd (int): the open destination file.
+            size (int): the number of bytes to copy.
+        """
+        copied = 0
+        while True:
+            try:
+                count = os.copy_file_range(source_fd, dest_fd, self.CHUNK_SIZE)
+            except OSError as exc:
+                self.unsupported(exc)
+                raise
+            if count == 0:
+                break
+            copied += count
+        # some file systems report nothing copied rather than an error
+        if copied == 0 and size > 0:
+            raise CopyMethodUnsupported()
+
+    def copy_sendfile(self, source_fd: int, dest_fd: int, size: int) -> None:
+        """
+        Copy the file with 'os.sendfile'.
+
+        Parameters:
+            source_fd (int): the open source file.
+            dest_fd (int): the open destination file.
+            size (int): the number of bytes to copy.
+        """
+        start = offset = os.lseek(source_fd, 0, os.SEEK_CUR)
+        while True:
+            try:
+                count = os.sendfile(dest_fd, source_fd, offset, self.CHUNK_SIZE)
+            except OSError as exc:
+                self.unsupported(exc)
+                raise
+            if count == 0:
+                break
+            offset += count
+        if offset == start and size > 0:
+            raise CopyMethodUnsupported()
+
+    def copy_buffered(self, source_fd: int, dest_fd: int, size: int) -> None:
+        """
+        Copy the file through a buffer.
+
+        Parameters:
+            source_fd (int): the open source file.
+            dest_fd (int): the open destination file.
+            size (int): the number of bytes to copy, not used.
+        """
+        buffer = bytearray(self.BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(source_fd, "rb", buffering=0, closefd=False) as source:
+            while count := source.readinto(buffer):
+                written = 0
+                while written < count:
+                    written += os.write(dest_fd, view[written:count])
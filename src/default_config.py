@@ -5,19 +5,39 @@ File:       default_config.py
 Author:     Lorn B Kerr
 Copyright:  (c) 2022,2023 Lorn B Kerr
 License:    MIT, see file LICENSE
-Version:    1.1.0
+Version:    1.17.0
 """
 
 import os
 import platform
+from typing import Any
 
 file_name = "default_config.py"
-file_version = "1.1.0"
+file_version = "1.17.0"
 changes = {
     "1.0.0": "Initial release",
     "1.1.0": "Removed unused cloud options and config values;"
     + "Removed unnecessary section headers to make a single level dict;"
     + "Corrected 'base_dir' to 'start_dir'.",
+    "1.2.0": "Added the 'since_last_backup', 'scan_workers' and"
+    + " 'copy_workers' options.",
+    "1.3.0": "Added the 'delta_copy', 'delta_min_size' and 'delta_block_size'"
+    + " options.",
+    "1.4.0": "Added the 'append_copy' option.",
+    "1.5.0": "Added the 'backup_layout' option.",
+    "1.6.0": "Added the 'repository' backup layout.",
+    "1.7.0": "Added the retention options and config_option().",
+    "1.8.0": "Added the 'compression' options.",
+    "1.9.0": "Added the 'bundle_max_size' option.",
+    "1.10.0": "Added the 'detect_moves' option.",
+    "1.11.0": "Added the 'mirror_delete' and 'deleted_keep_days' options.",
+    "1.12.0": "Added the 'hash_workers' option.",
+    "1.13.0": "Added the 'hash_copies' and 'verify_copies' options.",
+    "1.14.0": "Added the 'verify_rate', 'verify_sample' and 'verify_workers'"
+    + " options.",
+    "1.15.0": "Added the 'restore_workers' option.",
+    "1.16.0": "Added the 'catalog' and 'catalog_keep_runs' options.",
+    "1.17.0": "Added the 'mirror_delete_max_percent' option.",
 }
 
 # Set correct platform directories.
@@ -95,4 +115,164 @@ default_config = {
 
     # Set of named  files to include.
     "include_specific_files": [],
+
+    # The following options are not shown in the Setup dialog; edit the
+    # configuration file to change them.
+
+    # Only check files changed since the last successful backup. A file
+    # whose modification and status change times are both before the
+    # 'last_backup' time is skipped without looking at the backup drive.
+    "since_last_backup": False,
+
+    # The number of threads reading directories ahead of the backup.
+    # More threads help most on network drives and fast SSDs; 1 reads
+    # one directory at a time.
+    "scan_workers": 4,
+
+    # The number of threads copying files to the backup drive while the
+    # directories are scanned; 0 copies each file as it is found.
+    "copy_workers": 2,
+
+    # Update large files in place, rewriting only the blocks that have
+    # changed, rather than copying the whole file again. The checksums
+    # of the blocks are kept in a hidden '.<name>.blocksums' file beside
+    # each backup copy. Only files of at least 'delta_min_size' bytes
+    # are copied this way.
+    "delta_copy": False,
+    "delta_min_size": 64 * 1024 * 1024,
+    "delta_block_size": 256 * 1024,
+
+    # Copy only the new end of a file that has grown, such as a log or
+    # mailbox file, when the last block of the backup copy matches the
+    # same block of the file. Otherwise the whole file is copied.
+    "append_copy": False,
+
+    # How the backup is kept in the backup location:
+    #   "mirror": a single copy of the source, updated by each backup,
+    #   "snapshot": a new dated directory for each backup, holding a
+    #       complete tree; unchanged files are hard links to the copy in
+    #       the previous snapshot, so only changed files take up space,
+    #   "repository": files are split into chunks and each chunk is
+    #       stored once, however many files hold it; each backup writes
+    #       a snapshot manifest listing the chunks of each file.
+    # The 'since_last_backup' option is only used for a mirror.
+    "backup_layout": "mirror",
+
+    # How many snapshots 'backup --prune' keeps for the "snapshot" and
+    # "repository" layouts: the latest snapshot of each of the last
+    # 'keep_daily' days, 'keep_weekly' weeks and 'keep_monthly' months.
+    # The latest snapshot is always kept.
+    "keep_daily": 7,
+    "keep_weekly": 4,
+    "keep_monthly": 12,
+
+    # The number of threads deleting files when pruning.
+    "prune_workers": 8,
+
+    # Compress each file as it is copied to a "mirror" or "snapshot"
+    # backup: "zstd" (Python 3.14 on) writes '<name>.zst', "lzma" writes
+    # '<name>.xz'; "" copies the files as they are. Files that are
+    # already compressed, such as JPEG, MP4 and ZIP files, or whose
+    # first block does not compress, are copied as they are. The files
+    # are compressed by 'compression_workers' processes, 0 for one per
+    # CPU; 'compression_level' 0 uses the default level of the method.
+    "compression": "",
+    "compression_level": 0,
+    "compression_workers": 0,
+
+    # Pack the regular files smaller than this many bytes into a single
+    # bundle file in each backup directory, '.backup.pack', with an
+    # index, '.backup.pack.index', rather than copying each to a file
+    # of its own. This is much faster on FAT and exFAT drives. The
+    # bundle is written again when any of its files change; 0 copies
+    # every file on its own. Not used for the "repository" layout.
+    "bundle_max_size": 0,
+
+    # Find files that have been moved or renamed since the last backup
+    # in the "mirror" and "snapshot" layouts, so their backup copy is
+    # renamed or hard linked rather than copied again:
+    #   "inode": a new file with the same device, inode, size and
+    #       modification time as a file already backed up,
+    #   "content": as "inode", or a new file with the same content hash
+    #       as a file already backed up; each file copied is read twice,
+    #   "": every new file is copied.
+    "detect_moves": "inode",
+
+    # Remove the backup copies of the files and directories deleted from
+    # the source from a "mirror" backup. The deleted files are found
+    # from the manifest, the backup drive is not read. If
+    # 'deleted_keep_days' is set, the deleted files are moved to
+    # '.backup-deleted/<time>' in the backup location and removed after
+    # that many days, rather than removed at once. Nothing is removed if
+    # the source has no files, as an unmounted drive would, or if more
+    # than 'mirror_delete_max_percent' of the files backed up would be
+    # removed; 100 removes them whatever the count.
+    "mirror_delete": False,
+    "deleted_keep_days": 0,
+    "mirror_delete_max_percent": 50,
+
+    # The number of threads hashing the parts of large files when files
+    # are compared by content, with 'backup --checksum' or
+    # 'detect_moves' "content". The hashes are kept in a cache beside
+    # the log database, so unchanged files are not read again.
+    "hash_workers": 4,
+
+    # Hash each file as it is copied and keep the hash in the manifest,
+    # in the "mirror" and "snapshot" layouts. The file is read once for
+    # both; the data passes through the program rather than being copied
+    # by the kernel, and 'delta_copy' and 'append_copy' are not used.
+    # With 'verify_copies', each copy is also read back from the backup
+    # drive and checked against the hash; a copy that does not match is
+    # removed and logged.
+    "hash_copies": False,
+    "verify_copies": False,
+
+    # 'backup --verify' reads back the backup copies and checks them
+    # against their hashes, to find copies that have decayed on the
+    # drive. The reads are held to 'verify_rate' MiB a second, 0 for no
+    # limit. Each run checks the 'verify_sample' part of the files, the
+    # files not checked for longest first, so runs with a sample of 0.1
+    # check the whole drive every ten runs; 1 checks every file.
+    # 'verify_workers' threads read the copies; one suits a hard drive.
+    "verify_rate": 50,
+    "verify_sample": 1.0,
+    "verify_workers": 1,
+
+    # The number of threads writing files for 'backup --restore'.
+    "restore_workers": 8,
+
+    # The catalog records the path, size and modification time of every
+    # file in each backup run, in the log directory, so 'backup --find'
+    # can search the backups without the backup drive. The latest
+    # 'catalog_keep_runs' runs are kept, 0 keeps them all.
+    "catalog": True,
+    "catalog_keep_runs": 100,
 }
+
+
+def config_option(config, key: str) -> Any:
+    """
+    Get a configuration value that is not set in the Setup dialog.
+
+    These values may be missing from the configuration, so the value
+    from 'default_config' is used if not set. The value is converted
+    to the type of the default.
+
+    Parameters:
+        config (Settings): the configuration.
+        key (str): the configuration key.
+
+    Returns:
+        (Any) the configuration value.
+    """
+    default = default_config[key]
+    value = config.value(key)
+    if value is None or value == "":
+        return default
+    if isinstance(default, bool):
+        if isinstance(value, bool):
+            return value
+        return str(value).lower() in ("true", "1", "yes")
+    if isinstance(default, int):
+        return int(value)
+    return value
@@ -0,0 +1,268 @@
+"""
+Update large files in the backup by rewriting only the changed blocks.
+
+File:       delta_copier.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import hashlib
+import os
+import shutil
+import stat
+import struct
+import threading
+
+file_name = "delta_copier.py"
+file_version = "1.0.0"
+changes = {
+    "1.0.0": "Initial release",
+}
+
+SIDECAR_SUFFIX = ".blocksums"
+""" Added to the hidden name of the block checksum sidecar file. """
+
+SIDECAR_MAGIC = b"LBKBLKS1"
+""" Marks a block checksum sidecar file. """
+
+SIDECAR_HEADER = struct.Struct("<8sQQq")
+""" The sidecar header: magic, block size, file size and mtime_ns. """
+
+DIGEST_SIZE = 16
+""" The size of each block checksum in bytes. """
+
+
+class DeltaCopier:
+    """
+    Copy a large file by rewriting only the blocks that have changed.
+
+    The file is split into fixed size blocks. The checksum of each
+    block of the backup copy is kept in a hidden sidecar file beside
+    it, '.<name>.blocksums'. When the file is copied again, each source
+    block is read and checked against the sidecar, and only the blocks
+    that differ are written, in place, to the backup copy.
+
+    The sidecar records the size and modification time of the copy it
+    describes. If the copy does not match, or the sidecar is missing or
+    unreadable, every block is written. The sidecar is removed before
+    the copy is changed and a new one is written to a temporary file
+    and renamed into place after, so a copy that was interrupted is
+    never trusted.
+
+    A backup copy with more than one hard link is never changed in
+    place, the other links would change as well; it is replaced.
+
+    Parameters:
+        block_size (int): the size of the blocks compared.
+    """
+
+    def __init__(self, block_size: int) -> None:
+        """
+        Set the block size.
+
+        Parameters:
+            block_size (int): the size of the blocks compared.
+        """
+        self.block_size: int = block_size
+        """ The size of the blocks compared """
+        self.blocks_checked: int = 0
+        """ The count of the blocks read from the source files """
+        self.blocks_written: int = 0
+        """ The count of the blocks written to the backup copies """
+        self.lock: threading.Lock = threading.Lock()
+        """ Guards the counters, files may be copied by several threads """
+
+    @staticmethod
+    def sidecar_path(destination_path: str) -> str:
+        """
+        Get the path of the sidecar for a backup copy.
+
+        Parameters:
+            destination_path (str): the backup copy.
+
+        Returns:
+            (str) the sidecar path.
+        """
+        directory, name = os.path.split(str(destination_path))
+        return os.path.join(directory, "." + name + SIDECAR_SUFFIX)
+
+    @staticmethod
+    def is_sidecar(filename: str) -> bool:
+        """
+        Check if a file name is the name of a sidecar.
+
+        Parameters:
+            filename (str): the file name.
+
+        Returns:
+            (bool) True if the file is a sidecar.
+        """
+        return filename.startswith(".") and filename.endswith(SIDECAR_SUFFIX)
+
+    def read_sidecar(self, destination_path: str) -> list[bytes]:
+        """
+        Read the block checksums of a backup copy.
+
+        Parameters:
+            destination_path (str): the backup copy.
+
+        Returns:
+            (list[bytes]) the block checksums, empty if there is no
+                valid sidecar for the copy as it is now.
+        """
+        try:
+            dest_stat = os.stat(destination_path, follow_symlinks=False)
+            with open(self.sidecar_path(destination_path), "rb") as sidecar:
+                data = sidecar.read()
+        except OSError:
+            return []
+        if not stat.S_ISREG(dest_stat.st_mode) or dest_stat.st_nlink > 1:
+            return []
+        if len(data) < SIDECAR_HEADER.size:
+            return []
+
+        magic, block_size, size, mtime_ns = SIDECAR_HEADER.unpack_from(data)
+        digests = data[SIDECAR_HEADER.size :]
+        block_count = -(-size // block_size) if block_size else -1
+        if (
+            magic != SIDECAR_MAGIC
+            or block_size != self.block_size
+            or size != dest_stat.st_size
+            or mtime_ns != dest_stat.st_mtime_ns
+            or len(digests) != block_count * DIGEST_SIZE
+        ):
+            return []
+        return [
+            digests[i : i + DIGEST_SIZE] for i in range(0, len(digests), DIGEST_SIZE)
+        ]
+
+    def write_sidecar(self, destination_path: str, digests: list[bytes]) -> None:
+        """
+        Write the block checksums of a backup copy.
+
+        This is called once the copy is complete and its times are set,
+        as the sidecar records the copy's size and modification time.
+        The sidecar is replaced atomically.
+
+        Parameters:
+            destination_path (str): the backup copy.
+            digests (list[bytes]): the block checksums.
+        """
+        dest_stat = os.stat(destination_path)
+        sidecar_path = self.sidecar_path(destination_path)
+        temp_path = sidecar_path + ".tmp"
+        with open(temp_path, "wb") as sidecar:
+            sidecar.write(
+                SIDECAR_HEADER.pack(
+                    SIDECAR_MAGIC,
+                    self.block_size,
+                    dest_stat.st_size,
+                    dest_stat.st_mtime_ns,
+                )
+            )
+            sidecar.write(b"".join(digests))
+            sidecar.flush()
+            os.fsync(sidecar.fileno())
+        os.replace(temp_path, sidecar_path)
+
+    def remove_sidecar(self, destination_path: str) -> None:
+        """
+        Remove the sidecar of a backup copy, if there is one.
+
+        Parameters:
+            destination_path (str): the backup copy.
+        """
+        try:
+            os.unlink(self.sidecar_path(destination_path))
+        except FileNotFoundError:
+            pass
+
+    def copy(self, source_path: str, destination_path: str) -> list[bytes]:
+        """
+        Copy a file, writing only the blocks that have changed.
+
+        The permissions and times are copied as with 'shutil.copy2';
+        the sidecar is not written, see write_sidecar().
+
+        Parameters:
+            source_path (str): the file to copy.
+            destination_path (str): the backup copy.
+
+        Returns:
+            (list[bytes]) the block checksums of the new copy.
+        """
+        previous = self.read_sidecar(destination_path)
+        # the copy is no longer described by the sidecar once changed
+        self.remove_sidecar(destination_path)
+        if previous:
+            mode = "r+b"
+        else:
+            # a link or a shared copy must not be written through
+            if os.path.lexists(destination_path) and not os.path.isdir(
+                destination_path
+            ):
+                os.unlink(destination_path)
+            mode = "wb"
+
+        digests = []
+        written = 0
+        buffer = bytearray(self.block_size)
+        view = memoryview(buffer)
+        with open(source_path, "rb", buffering=0) as source, open(
+            destination_path, mode, buffering=0
+        ) as dest:
+            offset = 0
+            while count := self.read_block(source, view):
+                block = view[:count]
+                digest = hashlib.blake2b(block, digest_size=DIGEST_SIZE).digest()
+                index = len(digests)
+                if index >= len(previous) or previous[index] != digest:
+                    self.write_block(dest, block, offset)
+                    written += 1
+                digests.append(digest)
+                offset += count
+            dest.truncate(offset)
+            os.fsync(dest.fileno())
+        shutil.copystat(source_path, destination_path)
+        with self.lock:
+            self.blocks_checked += len(digests)
+            self.blocks_written += written
+        return digests
+
+    @staticmethod
+    def read_block(source, view: memoryview) -> int:
+        """
+        Fill a block buffer from the source file.
+
+        Parameters:
+            source: the open source file.
+            view (memoryview): the block buffer.
+
+        Returns:
+            (int) the number of bytes read, less than the block size
+                only at the end of the file.
+        """
+        count = 0
+        while count < len(view):
+            read = source.readinto(view[count:])
+            if not read:
+                break
+            count += read
+        return count
+
+    @staticmethod
+    def write_block(dest, block: memoryview, offset: int) -> None:
+        """
+        Write a block to the backup copy.
+
+        Parameters:
+            dest: the open, unbuffered backup copy.
+            block (memoryview): the block data.
+            offset (int): the position of the block in the file.
+        """
+        dest.seek(offset)
+        written = 0
+        while written < len(block):
+            written += dest.write(block[written:])
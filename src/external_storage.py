@@ -5,25 +5,96 @@ File:       external_storage.py
 Author:     Lorn B Kerr
 Copyright:  (c) 2022 Lorn B Kerr
 License:    MIT, see file LICENSE
-Version:    1.1.0
+Version:    1.22.9
 """
 
+import hashlib
 import os
-import shutil
+import queue
+import sqlite3
+import stat
 import sys
+import threading
 import time
+from typing import Any, Callable
 
+from bundle import PACK_NAME, Bundle
+from catalog import Catalog
+from compressor import Compressor, open_compressed
+from copier import FileCopier
+from default_config import config_option
+from delta_copier import DeltaCopier
+from hasher import Hasher, read_back_digest
 from lbk_library.gui import Settings
 from logger import Logger
+from manifest import Manifest
+from path_filter import PathFilter
+from repository import ChunkRepository
 from result_codes import ResultCodes
+from scanner import Scanner
+from snapshots import Snapshots
+from sweeper import MirrorSweeper
 
 file_name = "external_storage.py"
-file_version = "1.1.0"
+file_version = "1.22.9"
 changes = {
     "1.0.0": "Initial release",
     "1.1.0": "Removed unused cloud options and config values;"
     + "Removed unnecessary section headers to make a single level dict;"
     + "Corrected 'base_dir' to 'start_dir'.",
+    "1.2.0": "Walk the source with the 'os.scandir' based Scanner and pass"
+    + " the file status from the directory entries through to process_file().",
+    "1.3.0": "Prune excluded directories from the walk; walk the included"
+    + " directories that are inside excluded directories as seeds.",
+    "1.4.0": "Match directories and files with a compiled PathFilter rather"
+    + " than scanning the criteria lists for each name.",
+    "1.5.0": "Detect unchanged files from the Manifest and the source file"
+    + " status without reading the backup drive.",
+    "1.6.0": "Added the 'since_last_backup' option and the 'result' of the"
+    + " backup.",
+    "1.7.0": "Read directories with 'scan_workers' threads.",
+    "1.8.0": "Copy files with a pool of 'copy_workers' threads fed from a"
+    + " bounded queue while the walk continues.",
+    "1.9.0": "Copy the file data in the kernel with the FileCopier.",
+    "1.10.0": "Added the 'delta_copy' option to rewrite only the changed"
+    + " blocks of large files.",
+    "1.11.0": "Added the 'append_copy' option to copy only the new end of"
+    + " files that have grown.",
+    "1.12.0": "Added the 'snapshot' backup layout, hard linking unchanged"
+    + " files to the previous snapshot.",
+    "1.13.0": "Added the 'repository' backup layout, a deduplicating store"
+    + " of file chunks.",
+    "1.14.0": "Moved the option defaults to 'default_config.config_option'.",
+    "1.15.0": "Added the 'compression' option to compress files as they are"
+    + " copied.",
+    "1.16.0": "Added the 'bundle_max_size' option to pack the small files of"
+    + " each directory into a bundle.",
+    "1.17.0": "Added the 'detect_moves' option to rename or link the backup"
+    + " copy of a file that has been moved rather than copy it again.",
+    "1.18.0": "Added the 'mirror_delete' option to remove the files deleted"
+    + " from the source from a mirror.",
+    "1.19.0": "Added the '--checksum' action to compare files by content, with"
+    + " the hashes kept by the Hasher.",
+    "1.20.0": "Added the 'hash_copies' and 'verify_copies' options to hash"
+    + " files as they are copied and check the copies against the hash.",
+    "1.21.0": "Added the 'catalog' option to record the files of each run in"
+    + " a searchable Catalog.",
+    "1.22.0": "Count the bytes backed up and record the files that could not"
+    + " be backed up as file events in the log.",
+    "1.22.1": "A manifest error after a good copy no longer fails the copy.",
+    "1.22.2": "Copy a file as it is if its compressed name is another source"
+    + " file.",
+    "1.22.3": "Keep the content hash in the manifest for files found unchanged"
+    + " by '--checksum'.",
+    "1.22.4": "Write the log entries that have waited long enough after each"
+    + " directory.",
+    "1.22.5": "'--checksum' does not read a file that is not a regular file.",
+    "1.22.6": "Remove the bundle of a directory with no small files left.",
+    "1.22.7": "A copy job that raises an error fails its files rather than"
+    + " ending the copy thread.",
+    "1.22.8": "Check all files when the include or exclude criteria have"
+    + " changed since the last backup.",
+    "1.22.9": "Log why the sweeper removed nothing.",
 }
 
 
@@ -57,19 +128,90 @@ class ExternalStorage:
         """ The count of files checked for potential backup. """
         self.files_backed_up: int = 0
         """ The count of the fresh files actually backed up """
+        self.bytes_backed_up: int = 0
+        """ The size of the fresh files actually backed up """
+        self.files_failed: int = 0
+        """ The count of the files that failed to copy """
+        self.files_appended: int = 0
+        """ The count of the files backed up by copying only the new end """
+        self.files_linked: int = 0
+        """ The count of the unchanged files linked to the previous snapshot """
+        self.files_moved: int = 0
+        """ The count of the moved files renamed or linked in the backup """
+        self.files_bundled: int = 0
+        """ The count of the small files backed up in bundles """
+        self.bundles_written: int = 0
+        """ The count of the bundles written """
         self.logger: Logger = logger
         """ The result logger for the database. """
+        self.result: int = ResultCodes.SUCCESS
+        """ The overall result of the backup, from ResultCodes """
+        self.counter_lock: threading.Lock = threading.Lock()
+        """ Guards the counters updated by the copy threads """
+        self.copy_queue: queue.Queue = None
+        """ The files waiting for the copy threads, None to copy directly """
+        self.copiers: list[threading.Thread] = []
+        """ The copy threads """
+        self.failed_files: queue.SimpleQueue = queue.SimpleQueue()
+        """ The files that failed to copy, waiting to be logged """
+        self.file_copier: FileCopier = FileCopier()
+        """ Copies the file data, remembering what works for each drive """
+        self.delta_copier: DeltaCopier = None
+        """ Rewrites the changed blocks of large files, None if not used """
+        self.delta_min_size: int = self.option("delta_min_size")
+        """ The smallest file copied by the delta_copier """
+        if self.option("delta_copy"):
+            self.delta_copier = DeltaCopier(self.option("delta_block_size"))
+        self.append_copy: bool = self.option("append_copy")
+        """ Copy only the new end of files that have grown """
+        self.detect_moves: str = self.option("detect_moves")
+        """ Find moved files by "inode" or "content", "" for none """
+        self.bundle_max_size: int = self.option("bundle_max_size")
+        """ Files smaller than this are packed in bundles, 0 for none """
+        if self.option("backup_layout") == "repository":
+            self.bundle_max_size = 0  # the chunks are already packed
+        self.compressor: Compressor = self.open_compressor()
+        """ Compresses the files copied, None if not used """
+        self.snapshots: Snapshots = None
+        """ The snapshots for the 'snapshot' layout, None for a mirror """
+        self.repository: ChunkRepository = None
+        """ The chunk store for the 'repository' layout, None for a mirror """
+        self.sweeper: MirrorSweeper = None
+        """ Removes the files deleted from the source, None if not used """
+        self.checksum: bool = bool(actions and actions.get("checksum"))
+        """ Compare the files with their backup copies by content """
+        self.files_matched: int = 0
+        """ The count of the files found unchanged by content """
+        self.verify_copies: bool = self.option("verify_copies")
+        """ Read back each copy and check it against the copied data """
+        self.hash_copies: bool = self.verify_copies or self.option("hash_copies")
+        """ Hash the files as they are copied, keeping the hash """
+        self.files_verified: int = 0
+        """ The count of the backup copies read back and found correct """
+        self.unverified_files: queue.SimpleQueue = queue.SimpleQueue()
+        """ The files whose copies did not match, waiting to be logged """
+        self.catalog: Catalog = None
+        """ The searchable record of the files in each run, None if not kept """
 
         self.excluded_dir_list = self.dir_exclude_list()
         self.included_dir_list = self.dir_include_list()
         self.excluded_file_list = self.file_exclude_list()
         self.included_file_list = self.file_include_list()
+        self.filter: PathFilter = None
+        """ The compiled criteria lists, see path_filter() """
+        self.manifest: Manifest = self.open_manifest()
+        """ The record of the files already backed up, None if no log path """
+        self.since_time: int = self.since_last_backup()
+        """ Skip files not changed since this time, 0 to check all files """
+        self.hasher: Hasher = self.open_hasher()
+        """ Hashes the file contents, None if not needed """
 
         if (
             self.config.value("start_dir") == ""
             or self.config.value("backup_location") == ""
         ):
             print("Need start and backup location dirs")
+            self.result = ResultCodes.NO_SOURCE_OR_DESTINATION
             self.logger.add_log_entry(
                 {
                     "timestamp": int(time.time()),
@@ -114,6 +256,118 @@ class ExternalStorage:
                 + " files backed up to external storage.",
             }
         )
+        if self.snapshots:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.files_linked)
+                    + " unchanged files linked to the previous snapshot.",
+                }
+            )
+        if self.repository:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.repository.chunks_written)
+                    + " new chunks, "
+                    + str(self.repository.bytes_written)
+                    + " bytes, written to the repository; "
+                    + str(self.repository.bytes_reused)
+                    + " bytes already in the repository.",
+                }
+            )
+        if self.hasher:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.hasher.files_hashed)
+                    + " files, "
+                    + str(self.hasher.bytes_hashed)
+                    + " bytes, hashed; "
+                    + str(self.hasher.cache_hits)
+                    + " hashes from the cache; "
+                    + str(self.files_matched)
+                    + " files unchanged by content.",
+                }
+            )
+        if self.sweeper:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.sweeper.files_deleted)
+                    + " deleted files, "
+                    + str(self.sweeper.bytes_deleted)
+                    + " bytes, and "
+                    + str(self.sweeper.dirs_deleted)
+                    + " deleted directories removed from the backup.",
+                }
+            )
+        if self.files_moved:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.files_moved)
+                    + " moved files renamed or linked in the backup.",
+                }
+            )
+        if self.bundles_written:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.files_bundled)
+                    + " small files backed up in "
+                    + str(self.bundles_written)
+                    + " bundles.",
+                }
+            )
+        if self.files_verified:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.files_verified)
+                    + " backup copies read back and verified.",
+                }
+            )
+        if self.compressor and self.compressor.files_compressed:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.compressor.files_compressed)
+                    + " files compressed from "
+                    + str(self.compressor.bytes_read)
+                    + " to "
+                    + str(self.compressor.bytes_written)
+                    + " bytes.",
+                }
+            )
+        if self.files_appended:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.files_appended)
+                    + " files backed up by copying only the new end.",
+                }
+            )
+        if self.delta_copier and self.delta_copier.blocks_checked:
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": str(self.delta_copier.blocks_written)
+                    + " of "
+                    + str(self.delta_copier.blocks_checked)
+                    + " blocks rewritten by delta copy.",
+                }
+            )
 
         if self.actions["verbose"]:
             print(self.directories_checked, "directories checked.")
@@ -122,6 +376,74 @@ class ExternalStorage:
             )
             print(self.files_files_checked, "files checked.")
             print(self.files_backed_up, "files backed up to external storage.")
+            if self.snapshots:
+                print(
+                    self.files_linked,
+                    "unchanged files linked to the previous snapshot.",
+                )
+            if self.repository:
+                print(
+                    self.repository.chunks_written,
+                    "new chunks,",
+                    self.repository.bytes_written,
+                    "bytes, written to the repository;",
+                    self.repository.bytes_reused,
+                    "bytes already in the repository.",
+                )
+            if self.hasher:
+                print(
+                    self.hasher.files_hashed,
+                    "files,",
+                    self.hasher.bytes_hashed,
+                    "bytes, hashed;",
+                    self.hasher.cache_hits,
+                    "hashes from the cache;",
+                    self.files_matched,
+                    "files unchanged by content.",
+                )
+            if self.sweeper:
+                print(
+                    self.sweeper.files_deleted,
+                    "deleted files,",
+                    self.sweeper.bytes_deleted,
+                    "bytes, and",
+                    self.sweeper.dirs_deleted,
+                    "deleted directories removed from the backup.",
+                )
+            if self.files_moved:
+                print(
+                    self.files_moved, "moved files renamed or linked in the backup."
+                )
+            if self.bundles_written:
+                print(
+                    self.files_bundled,
+                    "small files backed up in",
+                    self.bundles_written,
+                    "bundles.",
+                )
+            if self.files_verified:
+                print(self.files_verified, "backup copies read back and verified.")
+            if self.compressor and self.compressor.files_compressed:
+                print(
+                    self.compressor.files_compressed,
+                    "files compressed from",
+                    self.compressor.bytes_read,
+                    "to",
+                    self.compressor.bytes_written,
+                    "bytes.",
+                )
+            if self.files_appended:
+                print(
+                    self.files_appended,
+                    "files backed up by copying only the new end.",
+                )
+            if self.delta_copier and self.delta_copier.blocks_checked:
+                print(
+                    self.delta_copier.blocks_written,
+                    "of",
+                    self.delta_copier.blocks_checked,
+                    "blocks rewritten by delta copy.",
+                )
 
     def backup(self) -> None:
         """
@@ -144,6 +466,7 @@ class ExternalStorage:
                 os.makedirs(destination)
         except Exception as exc:
             print(" Could not access the Extrernal Storage Drive ")
+            self.result = ResultCodes.NO_EXTERNAL_STORAGE
             self.logger.add_log_entry(
                 {
                     "timestamp": int(time.time()),
@@ -153,44 +476,566 @@ class ExternalStorage:
             )
             sys.exit(ResultCodes.NO_EXTERNAL_STORAGE)
 
-        # walk the base directory and all subdirectories.
-        for current_dir, subdirs, fileset in os.walk(source):
-            self.directories_checked += 1
+        # a snapshot is written to a new directory in the backup location
+        if self.option("backup_layout") == "snapshot":
+            self.snapshots = Snapshots(destination)
+            destination = self.snapshots.start(int(time.time()))
+            if self.manifest:
+                self.manifest.root = destination
+        elif self.option("backup_layout") == "repository":
+            self.repository = ChunkRepository(destination)
+            self.repository.start(int(time.time()))
+            # files are stored under their path relative to the source
+            destination = ""
+        elif self.option("mirror_delete") and self.manifest:
+            self.sweeper = MirrorSweeper(
+                source,
+                destination,
+                self.manifest,
+                self.option("prune_workers"),
+                self.option("deleted_keep_days"),
+                [self.compressor.suffix] if self.compressor else [],
+                self.option("mirror_delete_max_percent"),
+            )
+        self.catalog = self.open_catalog()
+
+        # walk the base directory and all subdirectories, excluded
+        # directories are cut from the walk.
+        path_filter = self.path_filter()
+        scanner = Scanner(
+            source,
+            lambda path: not path_filter.dir_included(path),
+            self.dir_include_roots(),
+            self.option("scan_workers"),
+        )
+        copy_workers = self.option("copy_workers")
+        if self.compressor and self.repository is None and copy_workers:
+            # each copy thread waits for one compression process
+            copy_workers = max(copy_workers, self.compressor.workers)
+        self.start_copiers(copy_workers)
+        try:
+            for current_dir, subdirs, fileset in scanner.scan():
+                self.directories_checked += 1
+                if self.actions["verbose"]:
+                    if self.directories_checked % 1000 == 0:
+                        print(self.directories_checked, "directories processed")
+
+                # make sure the current destination directory exists, the
+                # parents of an included directory may have been pruned.
+                destination_dir = os.path.join(
+                    destination, current_dir[source_len:]
+                )
+                if self.repository is None and not os.path.isdir(destination_dir):
+                    os.makedirs(destination_dir)
+
+                # backup the included directories and files to the backup
+                if path_filter.dir_included(current_dir):
+                    self.process_dir_files(current_dir, destination_dir, fileset)
+                    self.directories_backed_up += 1
+                self.log_failed_files()
+        finally:
+            self.stop_copiers()
+            self.log_failed_files()
+            if self.compressor:
+                self.compressor.close()
+            if self.hasher:
+                self.hasher.close()
+
+        if self.actions["verbose"]:
+            print(scanner.directories_pruned, "excluded directories skipped.")
+
+        if self.sweeper:
+            self.sweeper.finish()
+            if self.sweeper.refused:
+                description = (
+                    "No deleted files removed from the backup: "
+                    + self.sweeper.refused
+                    + "."
+                )
+                print(description)
+                self.result = ResultCodes.FILE_NOT_REMOVED
+                self.logger.add_log_entry(
+                    {
+                        "timestamp": int(time.time()),
+                        "result": ResultCodes.FILE_NOT_REMOVED,
+                        "description": description,
+                    }
+                )
+            for path in self.sweeper.failed:
+                self.result = ResultCodes.FILE_NOT_REMOVED
+                self.logger.add_file_event(ResultCodes.FILE_NOT_REMOVED, path)
+                self.logger.add_log_entry(
+                    {
+                        "timestamp": int(time.time()),
+                        "result": ResultCodes.FILE_NOT_REMOVED,
+                        "description": "Could not remove deleted file " + path + ".",
+                    }
+                )
+
+        if self.manifest:
+            if self.result == ResultCodes.SUCCESS:
+                # as for 'last_backup', only a complete backup counts
+                self.manifest.set_criteria(self.criteria_fingerprint())
+            self.manifest.flush()
+        if self.snapshots:
+            self.snapshots.finish()
+        if self.repository:
+            self.repository.finish()
+        if self.catalog:
+            self.catalog.finish_run(self.option("catalog_keep_runs"))
+            self.catalog.close()
+            self.catalog = None
+
+    def option(self, key: str) -> Any:
+        """
+        Get a configuration value that is not set in the Setup dialog.
+
+        See 'default_config.config_option'.
+
+        Parameters:
+            key (str): the configuration key.
+
+        Returns:
+            (Any) the configuration value.
+        """
+        return config_option(self.config, key)
+
+    def open_hasher(self) -> Hasher:
+        """
+        Open the hasher, if file contents are compared.
+
+        The hash cache is kept in the log directory, named after the log
+        database, or in memory if there is no log path.
+
+        Returns:
+            (Hasher) the hasher, or None if no hashes are needed.
+        """
+        if not self.checksum and self.option("detect_moves") != "content":
+            return None
+        log_path = self.config.value("log_path")
+        log_name = self.config.value("log_name")
+        cache_path = None
+        if log_path and log_name:
+            cache_path = os.path.join(
+                log_path, os.path.splitext(log_name)[0] + ".hashes"
+            )
+        try:
+            return Hasher(cache_path, self.option("hash_workers"))
+        except (OSError, sqlite3.Error):
+            if self.actions["verbose"]:
+                print("Could not open the hash cache", cache_path)
+            return Hasher(None, self.option("hash_workers"))
+
+    def open_compressor(self) -> Compressor:
+        """
+        Set up the compression of the files copied.
+
+        If "zstd" compression is not available, before Python 3.14,
+        "lzma" is used.
+
+        Returns:
+            (Compressor) the compressor, or None if the 'compression'
+                option is not set.
+        """
+        method = self.option("compression")
+        if not method:
+            return None
+        if not Compressor.available(method):
+            if self.actions["verbose"]:
+                print("Compression", method, "is not available, using lzma.")
+            method = "lzma"
+        return Compressor(
+            method,
+            self.option("compression_level"),
+            self.option("compression_workers"),
+        )
+
+    def since_last_backup(self) -> int:
+        """
+        Get the time to skip unchanged files from.
+
+        The 'last_backup' time is only used if the 'since_last_backup'
+        option is set and the manifest shows the source, backup location
+        and include and exclude criteria are the same as for the last
+        backup; a file newly included may be older than the last backup.
+
+        Returns:
+            (int) the last backup time, or 0 if all files must be
+                checked.
+        """
+        if not self.option("since_last_backup"):
+            return 0
+        if not self.manifest or self.manifest.reset:
+            return 0
+        if self.manifest.criteria() != self.criteria_fingerprint():
+            return 0
+        try:
+            return int(float(self.config.value("last_backup")))
+        except (TypeError, ValueError):
+            return 0
+
+    def criteria_fingerprint(self) -> str:
+        """
+        Get a fingerprint of the include and exclude criteria lists.
+
+        Returns:
+            (str) the hex hash of the lists.
+        """
+        lists = (
+            self.excluded_dir_list,
+            self.included_dir_list,
+            self.excluded_file_list,
+            self.included_file_list,
+        )
+        return hashlib.blake2b(repr(lists).encode(), digest_size=16).hexdigest()
+
+    def open_manifest(self) -> Manifest:
+        """
+        Open the manifest of backed up files.
+
+        The manifest is kept in the log directory, named after the log
+        database.
+
+        Returns:
+            (Manifest) the manifest, or None if there is no log path or
+                the manifest cannot be opened.
+        """
+        log_path = self.config.value("log_path")
+        log_name = self.config.value("log_name")
+        if not log_path or not log_name:
+            return None
+        manifest_path = os.path.join(
+            log_path, os.path.splitext(log_name)[0] + ".manifest"
+        )
+        try:
+            return Manifest(
+                manifest_path,
+                self.config.value("start_dir"),
+                self.config.value("backup_location"),
+                self.option("backup_layout"),
+            )
+        except (OSError, sqlite3.Error):
+            if self.actions["verbose"]:
+                print("Could not open the manifest", manifest_path)
+            return None
+
+    def open_catalog(self) -> Catalog:
+        """
+        Open the catalog and start recording this run.
+
+        The catalog is kept in the log directory, named after the log
+        database, so it can be searched without the backup drive.
+
+        Returns:
+            (Catalog) the catalog, or None if the 'catalog' option is not
+                set, there is no log path, or the catalog cannot be
+                opened.
+        """
+        catalog_path = Catalog.default_path(
+            self.config.value("log_path"), self.config.value("log_name")
+        )
+        if not self.option("catalog") or not catalog_path:
+            return None
+        snapshot = None
+        if self.snapshots:
+            snapshot = self.snapshots.name
+        elif self.repository:
+            snapshot = self.repository.name
+        try:
+            catalog = Catalog(catalog_path, self.config.value("start_dir"))
+            catalog.start_run(
+                int(time.time()),
+                self.option("backup_layout"),
+                self.config.value("backup_location"),
+                snapshot,
+            )
+        except (OSError, sqlite3.Error):
             if self.actions["verbose"]:
-                if self.directories_checked % 1000 == 0:
-                    print(self.directories_checked, "directories processed")
+                print("Could not open the catalog", catalog_path)
+            return None
+        return catalog
+
+    def dir_is_excluded(self, current_dir: str) -> bool:
+        """
+        Check if a directory is excluded from the backup.
 
-            # make sure the current destination directory exists
-            destination_dir = os.path.join(destination, current_dir[source_len:])
-            if not os.path.isdir(destination_dir):
-                os.mkdir(destination_dir)
+        A directory is excluded if it matches one of the excluded
+        directories and none of the specifically included directories.
 
-            # backup the included directories and files to the backup media
-            if not any(substring in current_dir for substring in self.excluded_dir_list) or any(substring in current_dir for substring in self.included_dir_list):
-                self.process_dir_files(current_dir, destination_dir, fileset)
-                self.directories_backed_up += 1
+        Parameters:
+            current_dir: (str) the directory to check.
+
+        Returns:
+            (bool) True if the directory is excluded, False otherwise.
+        """
+        return not self.path_filter().dir_included(current_dir)
+
+    def path_filter(self) -> PathFilter:
+        """
+        Get the PathFilter for the current criteria lists.
+
+        The filter is compiled once and only rebuilt if one of the
+        criteria lists has been changed.
+
+        Returns:
+            (PathFilter) the compiled criteria.
+        """
+        lists = (
+            self.excluded_dir_list,
+            self.included_dir_list,
+            self.excluded_file_list,
+            self.included_file_list,
+        )
+        if self.filter is None or self.filter.lists != lists:
+            self.filter = PathFilter(*lists)
+        return self.filter
+
+    def dir_include_roots(self) -> list[str]:
+        """
+        Find the specifically included directories under the source.
+
+        Each included directory is taken relative to 'start_dir' (or as
+        is, if absolute). Those that exist are used to seed the walk so
+        they are still backed up when inside an excluded directory.
+
+        Returns:
+            (list[str]) the included directory paths that exist.
+        """
+        source = str(self.config.value("start_dir"))
+        roots = []
+        for included_dir in self.included_dir_list:
+            root = os.path.join(source, included_dir.rstrip("/\\"))
+            if included_dir and os.path.isdir(root):
+                roots.append(root)
+        return roots
 
     def process_dir_files(
-        self, current_dir: str, destination_dir: str, fileset: list[str]
+        self,
+        current_dir: str,
+        destination_dir: str,
+        fileset: list[str | os.DirEntry],
     ) -> None:
         """
         Step through the the current directory.
 
-        Backup the new/changed files that are not otherwise excluded.
+        Backup the new/changed files that are not otherwise excluded,
+        and note the files deleted from the directory for the sweeper.
 
         Parameters:
             current_dir: (str) the directory being read
             destination_dir: (str) the backup destination for the
                 new/changed file .
-            fileset: (list[str]) the set of files to backup.
+            fileset: (list[str | os.DirEntry]) the set of files to
+                backup, either as names or as the directory entries
+                from the Scanner.
         """
-        for filename in fileset:
+        file_included = self.path_filter().file_included
+        bundled_files = []
+        for file_entry in fileset:
             self.files_files_checked += 1
-            if not any(substring in filename for substring in self.excluded_file_list) or any(substring in filename for substring in self.included_file_list):
-                self.process_file(current_dir, destination_dir, filename)
+            if isinstance(file_entry, os.DirEntry):
+                filename = file_entry.name
+            else:
+                filename = file_entry
+            if file_included(filename):
+                source_stat = None
+                if isinstance(file_entry, os.DirEntry):
+                    try:
+                        source_stat = file_entry.stat()
+                    except OSError:
+                        continue  # skip broken links
+                if self.catalog:
+                    self.add_to_catalog(current_dir, filename, source_stat)
+                if self.is_bundled(current_dir, file_entry, source_stat):
+                    bundled_files.append(
+                        (filename, os.path.join(current_dir, filename), source_stat)
+                    )
+                else:
+                    self.process_file(
+                        current_dir, destination_dir, filename, source_stat
+                    )
+        if bundled_files:
+            self.process_bundle(current_dir, destination_dir, bundled_files)
+        elif os.path.lexists(os.path.join(destination_dir, PACK_NAME)):
+            self.remove_bundle(destination_dir)
+        if self.sweeper:
+            names = [
+                entry.name if isinstance(entry, os.DirEntry) else entry
+                for entry in fileset
+            ]
+            if bundled_files:
+                names.append(PACK_NAME)
+            self.sweeper.check_dir(destination_dir, names)
+
+    def add_to_catalog(
+        self, current_dir: str, filename: str, source_stat: os.stat_result
+    ) -> None:
+        """
+        Record a file in the catalog for this run.
+
+        Parameters:
+            current_dir: (str) the directory being read
+            filename: (str) the file name.
+            source_stat: (os.stat_result) the status of the file, if
+                known.
+        """
+        current_path = os.path.join(current_dir, filename)
+        try:
+            if source_stat is None:
+                source_stat = os.stat(current_path)
+        except OSError:
+            return
+        self.catalog.add(current_path, source_stat)
+
+    def is_bundled(
+        self,
+        current_dir: str,
+        file_entry: str | os.DirEntry,
+        source_stat: os.stat_result,
+    ) -> bool:
+        """
+        Check if a file is backed up in the bundle of its directory.
+
+        Regular files smaller than 'bundle_max_size' are bundled, except
+        in the 'repository' layout. Symbolic links are not bundled.
+
+        Parameters:
+            current_dir: (str) the directory being read
+            file_entry: (str | os.DirEntry) the file name or directory
+                entry.
+            source_stat: (os.stat_result) the status of the file, if
+                known.
+
+        Returns:
+            (bool) True if the file is bundled.
+        """
+        if not self.bundle_max_size or source_stat is None:
+            return False
+        if (
+            not stat.S_ISREG(source_stat.st_mode)
+            or source_stat.st_size >= self.bundle_max_size
+        ):
+            return False
+        if isinstance(file_entry, os.DirEntry):
+            return not file_entry.is_symlink()
+        return not os.path.islink(os.path.join(current_dir, file_entry))
+
+    def process_bundle(
+        self,
+        current_dir: str,
+        destination_dir: str,
+        files: list[tuple[str, str, os.stat_result]],
+    ) -> None:
+        """
+        Backup the small files of a directory in a bundle if necessary.
+
+        The bundle is written again if any of its files has changed, has
+        been added or has gone. In a snapshot, an unchanged bundle is
+        linked to the bundle in the previous snapshot.
+
+        Parameters:
+            current_dir: (str) the directory being read
+            destination_dir: (str) the backup destination directory.
+            files: (list[tuple[str, str, os.stat_result]]) the name,
+                source path and status of each small file.
+        """
+        bundle = Bundle(destination_dir)
+        if bundle.is_current(files):
+            return
+        if self.snapshots:
+            previous_dir = self.snapshots.previous_path(destination_dir)
+            if previous_dir is not None:
+                previous = Bundle(previous_dir)
+                if previous.is_current(files) and bundle.link_from(previous):
+                    with self.counter_lock:
+                        self.files_linked += len(files)
+                    return
+        self.run_job(self.write_bundle, (bundle, files))
+
+    def remove_bundle(self, destination_dir: str) -> None:
+        """
+        Remove the bundle of a directory that has no small files left.
+
+        A file that grows past 'bundle_max_size' is copied on its own;
+        once no files are bundled, the old pack must go, or a restore
+        would write its old data over the copy.
+
+        Parameters:
+            destination_dir: (str) the backup destination directory.
+        """
+        try:
+            Bundle(destination_dir).remove()
+            if self.manifest:
+                self.manifest.remove(destination_dir, PACK_NAME)
+        except (OSError, sqlite3.Error):
+            if self.actions["verbose"]:
+                print("Could not remove the bundle in", destination_dir)
+
+    def write_bundle(
+        self, bundle: Bundle, files: list[tuple[str, str, os.stat_result]]
+    ) -> None:
+        """
+        Write the bundle of the small files of a directory.
+
+        Like copy_file(), this is run by the copy threads. Backup copies
+        of the files made before they were bundled are removed.
+
+        Parameters:
+            bundle: (Bundle) the bundle in the backup directory.
+            files: (list[tuple[str, str, os.stat_result]]) the name,
+                source path and status of each small file.
+        """
+        try:
+            changed = bundle.changed_files(files)
+            bundle.write(files)
+            if self.snapshots is None:
+                for filename, source_path, source_stat in files:
+                    self.remove_backup_copy(os.path.join(bundle.directory, filename))
+                    if self.manifest:
+                        self.manifest.remove(bundle.directory, filename)
+            if self.manifest:
+                # the pack is recorded so a deleted directory can be found
+                self.manifest.record(
+                    bundle.directory, PACK_NAME, os.stat(bundle.pack_path)
+                )
+            with self.counter_lock:
+                self.files_backed_up += changed
+                self.bytes_backed_up += sum(
+                    source_stat.st_size for filename, source_path, source_stat in files
+                )
+                self.files_bundled += changed
+                self.bundles_written += 1
+            if self.actions["verbose"]:
+                print("bundle backed up to:", bundle.pack_path)
+        except Exception as exc:
+            with self.counter_lock:
+                self.files_failed += len(files)
+            for filename, source_path, source_stat in files:
+                self.failed_files.put(source_path)
+            if self.actions["verbose"]:
+                print("Backup of bundle", bundle.pack_path, "failed.")
+
+    def remove_backup_copy(self, destination_path: str) -> None:
+        """
+        Remove the backup copy of a file, compressed or not, if there is one.
+
+        Parameters:
+            destination_path: (str) the backup copy, without the suffix
+                of a compressed copy.
+        """
+        paths = [destination_path]
+        if self.compressor:
+            paths.append(destination_path + self.compressor.suffix)
+        for path in paths:
+            if os.path.lexists(path) and not os.path.isdir(path):
+                os.unlink(path)
 
     def process_file(
-        self, current_dir: str, destination_dir: str, filename: str
+        self,
+        current_dir: str,
+        destination_dir: str,
+        filename: str,
+        source_stat: os.stat_result = None,
     ) -> None:
         """
         Backup the current file if necessary.
@@ -204,39 +1049,653 @@ class ExternalStorage:
             destination_dir: (str) the backupdestination for the
                 new/changed file .
             filename: (str) the file to backup.
+            source_stat: (os.stat_result) the status of the file to
+                backup, following links, if already known; default is
+                None, the file status is read here.
         """
         current_path = os.path.join(current_dir, filename)
         destination_path = os.path.join(destination_dir, filename)
 
-        # check for broken symlink os.path.islink(path)
-        # if broken, skip link and return
-        if os.path.islink(current_path) and not os.path.isfile(current_path):
-            return  # skip broken links
+        # a broken link has no status, skip link and return
+        if source_stat is None:
+            try:
+                source_stat = os.stat(current_path)
+            except OSError:
+                return  # skip broken links
+
+        # every file must be in a new snapshot or repository manifest,
+        # so files are only skipped for a mirror.
+        if self.snapshots is None and self.repository is None:
+            if self.checksum:
+                # the contents are compared whatever the file status
+                self.run_job(
+                    self.checksum_file,
+                    (current_dir, destination_dir, filename, source_stat),
+                )
+                return
+
+            # a file not changed or moved since the last backup is skipped.
+            if (
+                source_stat.st_mtime < self.since_time
+                and source_stat.st_ctime < self.since_time
+            ):
+                return
+
+            # a file unchanged since it was backed up needs no backup
+            # drive access at all.
+            if self.manifest and self.manifest.is_unchanged(
+                destination_dir, filename, source_stat
+            ):
+                return
 
         # if file not in backup or is newer than backup file, back it up
-        if (
-            not os.path.exists(destination_path)
-            or int(os.stat(destination_path).st_mtime) < int(os.stat(current_path).st_mtime)
+        try:
+            if self.repository is not None:
+                backup_mtime = None  # the repository finds unchanged files
+            else:
+                backup_mtime = int(self.backup_stat(destination_path).st_mtime)
+        except OSError:
+            backup_mtime = None
+        if backup_mtime is not None and backup_mtime >= int(source_stat.st_mtime):
+            # already in the backup, but not yet in the manifest
+            if self.manifest:
+                self.manifest.record(destination_dir, filename, source_stat)
+        else:
+            self.run_job(
+                self.copy_file, (current_dir, destination_dir, filename, source_stat)
+            )
+
+    def run_job(self, method: Callable, arguments: tuple) -> None:
+        """
+        Give a copy job to the copy threads, or run it now if there are none.
+
+        Parameters:
+            method: (Callable) the method run by the copy thread.
+            arguments: (tuple) the arguments of the method.
+        """
+        if self.copy_queue is not None:
+            # blocks while the queue is full, so the walk waits for the
+            # copy threads to catch up.
+            self.copy_queue.put((method, arguments))
+        else:
+            self.run_copy_job(method, arguments)
+            self.log_failed_files()
+
+    def run_copy_job(self, method: Callable, arguments: tuple) -> None:
+        """
+        Run a copy job, counting its files as failed if it raises an error.
+
+        An error must not end a copy thread; once they have all ended,
+        the walk would wait for ever to queue the next file.
+
+        Parameters:
+            method: (Callable) copy_file(), checksum_file() or
+                write_bundle().
+            arguments: (tuple) the arguments of the method.
+        """
+        try:
+            method(*arguments)
+        except Exception:
+            if method == self.write_bundle:
+                paths = [
+                    source_path for filename, source_path, source_stat in arguments[1]
+                ]
+            else:
+                paths = [os.path.join(arguments[0], arguments[2])]
+            with self.counter_lock:
+                self.files_failed += len(paths)
+            for path in paths:
+                self.failed_files.put(path)
+            if self.actions["verbose"]:
+                print("Backup of", ", ".join(paths), "failed.")
+
+    def checksum_file(
+        self,
+        current_dir: str,
+        destination_dir: str,
+        filename: str,
+        source_stat: os.stat_result,
+    ) -> None:
+        """
+        Compare a file with its backup copy by content, copy it if changed.
+
+        A compressed backup copy is not read; it is checked by its time,
+        as without '--checksum'. The small files packed in bundles do
+        not come here; a bundle is checked by the size and time of its
+        files, see Bundle.changed_files(). Like copy_file(), this is run
+        by the copy threads.
+
+        Parameters:
+            current_dir: (str) the directory being read
+            destination_dir: (str) the backup destination for the
+                new/changed file .
+            filename: (str) the file to backup.
+            source_stat: (os.stat_result) the status of the file.
+        """
+        if not stat.S_ISREG(source_stat.st_mode):
+            # not read; copy_file() copies a link and fails a named pipe
+            self.copy_file(current_dir, destination_dir, filename, source_stat)
+            return
+        current_path = os.path.join(current_dir, filename)
+        destination_path = os.path.join(destination_dir, filename)
+        digest = None
+        try:
+            backup_stat = os.stat(destination_path)
+            if not stat.S_ISREG(backup_stat.st_mode):
+                unchanged = False
+            else:
+                unchanged = backup_stat.st_size == source_stat.st_size
+                if unchanged:
+                    digest = self.hasher.digest(current_path, source_stat)
+                    unchanged = digest == self.hasher.digest(
+                        destination_path, backup_stat
+                    )
+        except OSError:
+            try:
+                unchanged = int(self.backup_stat(destination_path).st_mtime) >= int(
+                    source_stat.st_mtime
+                )
+                if unchanged and self.is_regular_file(current_path, source_stat):
+                    digest = self.hasher.digest(current_path, source_stat)
+            except OSError:
+                unchanged = False
+        if not unchanged:
+            self.copy_file(current_dir, destination_dir, filename, source_stat)
+            return
+        with self.counter_lock:
+            self.files_matched += 1
+        if self.manifest:
+            # keep the content hash of the file, for '--verify'
+            self.manifest.record(destination_dir, filename, source_stat, digest)
+
+    def copy_file(
+        self,
+        current_dir: str,
+        destination_dir: str,
+        filename: str,
+        source_stat: os.stat_result,
+    ) -> None:
+        """
+        Copy a file to the backup location.
+
+        This is run by the copy threads, so it does not write to the log
+        database; failed files are queued for log_failed_files().
+
+        Parameters:
+            current_dir: (str) the directory being read
+            destination_dir: (str) the backup destination for the
+                new/changed file .
+            filename: (str) the file to backup.
+            source_stat: (os.stat_result) the status of the file.
+        """
+        current_path = os.path.join(current_dir, filename)
+        destination_path = os.path.join(destination_dir, filename)
+        if self.snapshots and self.link_previous(
+            current_path, destination_path, source_stat
         ):
+            with self.counter_lock:
+                self.files_linked += 1
+            if self.manifest:
+                self.manifest.record(destination_dir, filename, source_stat)
+            return
+        if self.repository:
+            self.store_file(current_path, destination_path, source_stat)
+            return
+        digest = None
+        try:
+            if self.detect_moves and self.manifest:
+                if self.detect_moves == "content" and self.is_regular_file(
+                    current_path, source_stat
+                ):
+                    digest = self.hasher.digest(current_path, source_stat)
+                if self.relink_moved(
+                    current_path, destination_path, source_stat, digest
+                ):
+                    with self.counter_lock:
+                        self.files_moved += 1
+                    self.manifest.record(
+                        destination_dir, filename, source_stat, digest
+                    )
+                    return
+
+            # copy the file, then update the access time and modification
+            #  time by +1 second to account for differences between 
+            # ext type file systems and fat filesystems.
+            digests = None
+            copied_digest = None
+            backup_path = destination_path
+            compressed = self.compress_file(current_path, destination_path, source_stat)
+            if compressed is not None:
+                backup_path, copied_digest = compressed
+            elif self.hash_copies:
+                copied_digest = self.file_copier.copy_hashed(
+                    current_path, destination_path
+                )
+            elif self.use_delta_copy(current_path, source_stat):
+                digests = self.delta_copier.copy(current_path, destination_path)
+            elif self.append_copy and self.file_copier.append_tail(
+                current_path, destination_path
+            ):
+                with self.counter_lock:
+                    self.files_appended += 1
+            else:
+                self.file_copier.copy(current_path, destination_path)
+            os.utime(
+                backup_path,
+                (source_stat.st_atime + 2, source_stat.st_mtime + 2),
+            )
+            if digests is not None:
+                self.delta_copier.write_sidecar(destination_path, digests)
+            if copied_digest is not None:
+                if not self.verify_copy(
+                    current_path, backup_path, copied_digest, compressed is not None
+                ):
+                    return
+                digest = copied_digest
+                if self.hasher:
+                    self.hasher.remember(current_path, digest, source_stat)
+        except Exception as exc:
+            with self.counter_lock:
+                self.files_failed += 1
+            self.failed_files.put(current_path)
+            if self.actions["verbose"]:
+                print("Backup of file", current_path, "failed.")
+            return
+        with self.counter_lock:
+            self.files_backed_up += 1
+            self.bytes_backed_up += source_stat.st_size
+        if self.manifest:
             try:
-                # copy the file, then update the access time and modification
-                #  time by +1 second to account for differences between 
-                # ext type file systems and fat filesystems.
-                shutil.copy2(current_path, destination_path, follow_symlinks=False)
-                os.utime(destination_path, (os.path.getatime(current_path) + 2, os.path.getmtime(current_path) + 2))
-                self.files_backed_up += 1
+                self.manifest.record(destination_dir, filename, source_stat, digest)
+            except sqlite3.Error:
+                # the copy is good, the file is only checked again next time
                 if self.actions["verbose"]:
-                    print("file backed up to:", destination_path)
-            except Exception as exc:
-                self.logger.add_log_entry(
-                    {
-                        "timestamp": int(time.time()),
-                        "result": ResultCodes.FILE_NOT_COPIED,
-                        "description": "Backup of file " + current_path + " failed.",
-                    }
-                )
+                    print("Could not record", current_path, "in the manifest.")
+        if self.actions["verbose"]:
+            print("file backed up to:", backup_path)
+
+    def verify_copy(
+        self, current_path: str, backup_path: str, digest: str, compressed: bool
+    ) -> bool:
+        """
+        Read back a backup copy and check it against the data copied.
+
+        Only the backup copy is read; the hash of the file was found as
+        it was copied. A copy that does not match is removed, so it is
+        copied again by the next backup, and queued to be logged.
+
+        Parameters:
+            current_path: (str) the file backed up.
+            backup_path: (str) the backup copy.
+            digest: (str) the content hash of the data copied.
+            compressed: (bool) True if the backup copy is compressed.
+
+        Returns:
+            (bool) True if the copy is correct or is not checked.
+        """
+        if not self.verify_copies:
+            return True
+        opener = open_compressed if compressed else None
+        if read_back_digest(backup_path, opener) == digest:
+            with self.counter_lock:
+                self.files_verified += 1
+            if self.hasher and not compressed:
+                self.hasher.remember(backup_path, digest, os.stat(backup_path))
+            return True
+        os.unlink(backup_path)
+        with self.counter_lock:
+            self.files_failed += 1
+        self.unverified_files.put(current_path)
+        if self.actions["verbose"]:
+            print("Backup copy of file", current_path, "does not match.")
+        return False
+
+    def is_regular_file(self, current_path: str, source_stat: os.stat_result) -> bool:
+        """
+        Check if a file is a regular file with data, not a link.
+
+        Parameters:
+            current_path: (str) the file to backup.
+            source_stat: (os.stat_result) the status of the file.
+
+        Returns:
+            (bool) True for a regular file that is not empty.
+        """
+        return (
+            stat.S_ISREG(source_stat.st_mode)
+            and source_stat.st_size > 0
+            and not os.path.islink(current_path)
+        )
+
+    def relink_moved(
+        self,
+        current_path: str,
+        destination_path: str,
+        source_stat: os.stat_result,
+        digest: str = None,
+    ) -> bool:
+        """
+        Move or link the backup copy of a file that has been moved.
+
+        A new file, one with no backup copy, is looked for in the
+        manifest by its inode and, if given, its content hash. If a
+        backup copy of the file is found, it is renamed to the new path
+        in a mirror when the file is no longer at its old path, and
+        hard linked otherwise or in a snapshot.
+
+        Parameters:
+            current_path: (str) the file to backup.
+            destination_path: (str) the backup copy, without the suffix
+                of a compressed copy.
+            source_stat: (os.stat_result) the status of the file.
+            digest: (str) the content hash of the file, None to find the
+                file by its inode only.
+
+        Returns:
+            (bool) True if moved or linked, False if the file must be
+                copied.
+        """
+        if not self.is_regular_file(current_path, source_stat):
+            return False
+        suffixes = [""]
+        if self.compressor:
+            suffixes.append(self.compressor.suffix)
+        for suffix in suffixes:
+            if os.path.lexists(destination_path + suffix):
+                return False
+
+        found = self.manifest.find_moved(source_stat)
+        if digest:
+            found += self.manifest.find_copies(source_stat.st_size, digest)
+        roots = [self.manifest.root]
+        if self.snapshots and self.snapshots.previous_dir:
+            roots.append(self.snapshots.previous_dir)
+        for dir_key, filename in found:
+            if os.path.isabs(dir_key):
+                continue
+            for root in roots:
+                for suffix in suffixes:
+                    old_path = os.path.join(root, dir_key, filename)
+                    if self.move_backup_copy(
+                        old_path, destination_path, suffix, source_stat.st_size
+                    ):
+                        return True
+        return False
+
+    def move_backup_copy(
+        self, old_path: str, destination_path: str, suffix: str, size: int
+    ) -> bool:
+        """
+        Move or link a backup copy to the new path of its file.
+
+        Parameters:
+            old_path: (str) the old backup copy, without the suffix.
+            destination_path: (str) the new backup copy, without the
+                suffix.
+            suffix: (str) the suffix of a compressed copy, or "".
+            size: (int) the size of the file.
+
+        Returns:
+            (bool) True if moved or linked, False if there is no usable
+                backup copy at the old path.
+        """
+        try:
+            old_stat = os.stat(old_path + suffix, follow_symlinks=False)
+        except OSError:
+            return False
+        if not stat.S_ISREG(old_stat.st_mode) or (
+            not suffix and old_stat.st_size != size
+        ):
+            return False
+        backup_dir, filename = os.path.split(old_path)
+        relative = os.path.relpath(old_path, self.manifest.root)
+        old_source = os.path.join(self.config.value("start_dir"), relative)
+        try:
+            if (
+                self.snapshots is None
+                and not relative.startswith(os.pardir)
+                and not os.path.lexists(old_source)
+            ):
+                os.rename(old_path + suffix, destination_path + suffix)
+                self.manifest.remove(backup_dir, filename)
+                if self.delta_copier and not suffix:
+                    self.delta_copier.remove_sidecar(old_path)
+            else:
+                os.link(old_path + suffix, destination_path + suffix)
+        except OSError:
+            # gone, too many links or no links on this drive
+            return False
+        if self.actions["verbose"]:
+            print("moved file linked from:", old_path + suffix)
+        return True
+
+    def compress_file(
+        self, current_path: str, destination_path: str, source_stat: os.stat_result
+    ) -> tuple[str, str] | None:
+        """
+        Compress a file to the backup location, if it will compress.
+
+        A file is backed up either compressed, as '<name>.zst' or
+        '<name>.xz', or as it is, so the other backup copy is removed.
+        A file is copied as it is if another source file has its
+        compressed name, so the two backup copies are kept apart.
+
+        Parameters:
+            current_path: (str) the file to backup.
+            destination_path: (str) the backup copy, without the suffix.
+            source_stat: (os.stat_result) the status of the file.
+
+        Returns:
+            (tuple[str, str] | None) the compressed backup copy and the
+                content hash of the file, or None if the file must be
+                copied as it is.
+        """
+        if self.compressor is None:
+            return None
+        if os.path.lexists(current_path + self.compressor.suffix):
+            return None  # the compressed name is another source file
+        compressed_path = destination_path + self.compressor.suffix
+        digest = None
+        if stat.S_ISREG(source_stat.st_mode) and not os.path.islink(current_path):
+            digest = self.compressor.compress(current_path, destination_path)
+        stale_path = destination_path if digest else compressed_path
+        if os.path.lexists(stale_path) and not os.path.isdir(stale_path):
+            os.unlink(stale_path)
+        if digest is None:
+            return None
+        if self.delta_copier:
+            self.delta_copier.remove_sidecar(destination_path)
+        return compressed_path, digest
+
+    def backup_stat(self, destination_path: str) -> os.stat_result:
+        """
+        Get the status of the backup copy of a file.
+
+        Parameters:
+            destination_path: (str) the backup copy, without the suffix
+                of a compressed copy.
+
+        Returns:
+            (os.stat_result) the status of the backup copy, compressed
+                or not.
+
+        Raises:
+            OSError: if there is no backup copy.
+        """
+        try:
+            return os.stat(destination_path)
+        except OSError:
+            if self.compressor is None:
+                raise
+            return os.stat(destination_path + self.compressor.suffix)
+
+    def store_file(
+        self, current_path: str, path: str, source_stat: os.stat_result
+    ) -> None:
+        """
+        Store a file in the repository.
+
+        Like copy_file(), this is run by the copy threads.
+
+        Parameters:
+            current_path: (str) the file to backup.
+            path: (str) the file's path relative to the source.
+            source_stat: (os.stat_result) the status of the file.
+        """
+        try:
+            if self.repository.store(current_path, path, source_stat):
+                with self.counter_lock:
+                    self.files_backed_up += 1
+                    self.bytes_backed_up += source_stat.st_size
                 if self.actions["verbose"]:
-                    print("Backup of file", current_path, "failed.")
+                    print("file backed up to repository:", path)
+        except Exception as exc:
+            with self.counter_lock:
+                self.files_failed += 1
+            self.failed_files.put(current_path)
+            if self.actions["verbose"]:
+                print("Backup of file", current_path, "failed.")
+
+    def link_previous(
+        self, current_path: str, destination_path: str, source_stat: os.stat_result
+    ) -> bool:
+        """
+        Link a file to its copy in the previous snapshot, if unchanged.
+
+        The copy in the previous snapshot is used if it is the same size
+        and at least as new as the file, as for a file already in a
+        mirror; a compressed copy only if at least as new. Links are not
+        made for symbolic links.
+
+        Parameters:
+            current_path: (str) the file to backup.
+            destination_path: (str) the file in the new snapshot.
+            source_stat: (os.stat_result) the status of the file.
+
+        Returns:
+            (bool) True if linked, False if the file must be copied.
+        """
+        previous_path = self.snapshots.previous_path(destination_path)
+        if previous_path is None or os.path.islink(current_path):
+            return False
+        links = [(previous_path, destination_path, source_stat.st_size)]
+        if self.compressor:
+            # the size of a compressed copy is not known
+            suffix = self.compressor.suffix
+            links.append((previous_path + suffix, destination_path + suffix, None))
+        for previous_path, link_path, size in links:
+            try:
+                previous_stat = os.stat(previous_path, follow_symlinks=False)
+                if (
+                    not stat.S_ISREG(previous_stat.st_mode)
+                    or (size is not None and previous_stat.st_size != size)
+                    or int(previous_stat.st_mtime) < int(source_stat.st_mtime)
+                ):
+                    continue
+                os.link(previous_path, link_path, follow_symlinks=False)
+            except OSError:
+                # not there, too many links or no links on this drive
+                continue
+            return True
+        return False
+
+    def use_delta_copy(self, current_path: str, source_stat: os.stat_result) -> bool:
+        """
+        Check if a file is copied by the delta_copier.
+
+        Parameters:
+            current_path: (str) the file to backup.
+            source_stat: (os.stat_result) the status of the file.
+
+        Returns:
+            (bool) True for a large regular file when 'delta_copy' is
+                set, False otherwise.
+        """
+        return (
+            self.delta_copier is not None
+            and source_stat.st_size >= self.delta_min_size
+            and stat.S_ISREG(source_stat.st_mode)
+            and not os.path.islink(current_path)
+        )
+
+    def log_failed_files(self) -> None:
+        """
+        Log the files that have failed to copy or whose copy did not match.
+
+        This is called after each directory, so the log entries that
+        have waited 'Logger.FLUSH_INTERVAL' seconds are written here too.
+        """
+        while not self.unverified_files.empty():
+            current_path = self.unverified_files.get()
+            if self.catalog:
+                self.catalog.discard(current_path)
+            self.result = ResultCodes.FILE_NOT_VERIFIED
+            self.logger.add_file_event(ResultCodes.FILE_NOT_VERIFIED, current_path)
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.FILE_NOT_VERIFIED,
+                    "description": "Backup copy of file "
+                    + current_path
+                    + " does not match the file; removed.",
+                }
+            )
+        while not self.failed_files.empty():
+            current_path = self.failed_files.get()
+            if self.catalog:
+                self.catalog.discard(current_path)
+            self.result = ResultCodes.FILE_NOT_COPIED
+            self.logger.add_file_event(ResultCodes.FILE_NOT_COPIED, current_path)
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.FILE_NOT_COPIED,
+                    "description": "Backup of file " + current_path + " failed.",
+                }
+            )
+        self.logger.flush_if_due()
+
+    def start_copiers(self, workers: int) -> None:
+        """
+        Start the copy threads.
+
+        The walk puts the files to copy in a bounded queue; when the
+        queue is full, the walk waits, so memory use stays flat however
+        large the tree.
+
+        Parameters:
+            workers (int): the number of copy threads, if 0 the files
+                are copied by the walk directly.
+        """
+        if workers < 1:
+            return
+        self.copy_queue = queue.Queue(maxsize=workers * 64)
+        self.copiers = [
+            threading.Thread(target=self.copier, name="copier", daemon=True)
+            for worker in range(workers)
+        ]
+        for thread in self.copiers:
+            thread.start()
+
+    def copier(self) -> None:
+        """Run the queued copy jobs, a method and its arguments, until given None."""
+        while True:
+            job = self.copy_queue.get()
+            if job is None:
+                break
+            method, arguments = job
+            self.run_copy_job(method, arguments)
+
+    def stop_copiers(self) -> None:
+        """Wait for the queued files to be copied and end the copy threads."""
+        if self.copy_queue is None:
+            return
+        for thread in self.copiers:
+            self.copy_queue.put(None)
+        for thread in self.copiers:
+            thread.join()
+        self.copy_queue = None
+        self.copiers = []
 
     def dir_exclude_list(self) -> list[str]:
         """
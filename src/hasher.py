@@ -0,0 +1,383 @@
+"""
+Hash file contents, keeping the hashes of unchanged files.
+
+File:       hasher.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.1.1
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import sqlite3
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+file_name = "hasher.py"
+file_version = "1.1.1"
+changes = {
+    "1.0.0": "Initial release",
+    "1.1.0": "Added StreamDigest to hash data as it is copied, read_back_digest()"
+    + " and Hasher.remember().",
+    "1.1.1": "Hasher.digest() refuses a file that is not a regular file.",
+}
+
+DIGEST_SIZE = 32
+""" The size of a content hash in bytes. """
+
+LEAF_SIZE = 16 * 1024 * 1024
+""" Files larger than this are hashed in leaves of this size. """
+
+TREE_PERSON = b"lbk-tree"
+""" Marks the hash of the leaf hashes of a large file. """
+
+
+def leaf_digest(data) -> bytes:
+    """
+    Hash one leaf of a file.
+
+    Parameters:
+        data (bytes-like): the leaf data.
+
+    Returns:
+        (bytes) the leaf hash.
+    """
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def tree_digest(leaves: list[bytes]) -> str:
+    """
+    Combine the leaf hashes of a large file into the file's hash.
+
+    Parameters:
+        leaves (list[bytes]): the hashes of each leaf, in order.
+
+    Returns:
+        (str) the hex content hash.
+    """
+    return hashlib.blake2b(
+        b"".join(leaves), digest_size=DIGEST_SIZE, person=TREE_PERSON
+    ).hexdigest()
+
+
+def file_digest(path: str, pool: ThreadPoolExecutor = None) -> str:
+    """
+    Get the content hash of a file.
+
+    A file of up to LEAF_SIZE bytes is hashed with BLAKE2b. A larger
+    file is mapped into memory and each LEAF_SIZE leaf is hashed, by the
+    threads of the pool if given, as 'hashlib' releases the GIL while
+    hashing; the file's hash is the hash of the leaf hashes. The hash of
+    a file is the same whether or not a pool is used.
+
+    Parameters:
+        path (str): the file.
+        pool (ThreadPoolExecutor): the threads hashing the leaves of a
+            large file, default is None, hash them here.
+
+    Returns:
+        (str) the hex content hash.
+    """
+    with open(path, "rb") as a_file:
+        size = os.fstat(a_file.fileno()).st_size
+        if size <= LEAF_SIZE:
+            return hashlib.blake2b(a_file.read(), digest_size=DIGEST_SIZE).hexdigest()
+        with mmap.mmap(a_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            leaves = []
+            try:
+                leaves = [
+                    view[offset : offset + LEAF_SIZE]
+                    for offset in range(0, len(view), LEAF_SIZE)
+                ]
+                if pool is None:
+                    digests = [leaf_digest(leaf) for leaf in leaves]
+                else:
+                    digests = list(pool.map(leaf_digest, leaves))
+            finally:
+                # the map cannot be closed while views of it are held
+                for leaf in leaves:
+                    leaf.release()
+                view.release()
+    return tree_digest(digests)
+
+
+def read_back_digest(path: str, opener: Callable = None) -> str:
+    """
+    Get the content hash of a file just written, reading it from the drive.
+
+    The file is flushed to the drive and, where the system allows, its
+    pages are dropped from the cache, so the hash is of the data on the
+    drive rather than of the data still in memory.
+
+    Parameters:
+        path (str): the file.
+        opener (Callable): opens the file for reading the data to hash,
+            such as 'compressor.open_compressed'; default is None, hash
+            the file as it is.
+
+    Returns:
+        (str) the hex content hash.
+    """
+    with open(path, "rb") as a_file:
+        os.fsync(a_file.fileno())
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(a_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    if opener is None:
+        return file_digest(path)
+    digest = StreamDigest()
+    with opener(path) as a_file:
+        while data := a_file.read(1024 * 1024):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class StreamDigest:
+    """
+    Hash data as it is read, giving the same hash as file_digest().
+
+    Data is hashed in LEAF_SIZE leaves as it arrives, so a file can be
+    hashed while it is copied, without reading it again.
+    """
+
+    def __init__(self) -> None:
+        """Start an empty hash."""
+        self.leaves: list[bytes] = []
+        """ The hashes of the complete leaves """
+        self.leaf = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        """ The hash of the leaf being filled """
+        self.leaf_bytes: int = 0
+        """ The bytes in the leaf being filled """
+        self.size: int = 0
+        """ The bytes hashed """
+
+    def update(self, data) -> None:
+        """
+        Add data to the hash.
+
+        Parameters:
+            data (bytes-like): the next data of the file.
+        """
+        data = memoryview(data)
+        while len(data):
+            count = min(len(data), LEAF_SIZE - self.leaf_bytes)
+            self.leaf.update(data[:count])
+            self.leaf_bytes += count
+            self.size += count
+            data = data[count:]
+            if self.leaf_bytes == LEAF_SIZE:
+                self.leaves.append(self.leaf.digest())
+                self.leaf = hashlib.blake2b(digest_size=DIGEST_SIZE)
+                self.leaf_bytes = 0
+
+    def hexdigest(self) -> str:
+        """
+        Get the content hash of the data.
+
+        Returns:
+            (str) the hex content hash.
+        """
+        if self.size <= LEAF_SIZE:
+            if self.leaves:
+                return self.leaves[0].hex()
+            return self.leaf.hexdigest()
+        leaves = list(self.leaves)
+        if self.leaf_bytes:
+            leaves.append(self.leaf.digest())
+        return tree_digest(leaves)
+
+
+class Hasher:
+    """
+    Hash file contents, keeping the hashes in a cache database.
+
+    The hash of each file is kept with the file's device, inode, size,
+    modification time and status change time. A file is only read
+    again if one of these has changed, so the hashes of a large tree
+    that changes little cost almost nothing after the first time.
+
+    The leaves of large files are hashed by a pool of threads, and
+    several files may be hashed at once from different threads.
+
+    Parameters:
+        cache_path (str): the path to the hash cache database, None to
+            keep the hashes in memory only.
+        workers (int): the number of threads hashing leaves.
+    """
+
+    BATCH_SIZE = 1000
+    """ The number of hashes held before they are written. """
+
+    def __init__(self, cache_path: str = None, workers: int = 4) -> None:
+        """
+        Open the hash cache, creating it if needed.
+
+        Parameters:
+            cache_path (str): the path to the hash cache database, None
+                to keep the hashes in memory only.
+            workers (int): the number of threads hashing leaves.
+        """
+        self.pool: ThreadPoolExecutor = ThreadPoolExecutor(
+            max(1, workers), thread_name_prefix="hasher"
+        )
+        """ The threads hashing the leaves of large files """
+        self.pending: list[tuple] = []
+        """ Hashes waiting to be written to the database """
+        self.lock: threading.RLock = threading.RLock()
+        """ Guards the database, the pending hashes and the counts """
+        self.files_hashed: int = 0
+        """ The count of the files read and hashed """
+        self.bytes_hashed: int = 0
+        """ The bytes read and hashed """
+        self.cache_hits: int = 0
+        """ The count of the hashes taken from the cache """
+
+        if cache_path:
+            directory_path = os.path.dirname(cache_path)
+            if directory_path and not os.path.exists(directory_path):
+                os.makedirs(directory_path)
+        self.db: sqlite3.Connection = sqlite3.connect(
+            cache_path or ":memory:", check_same_thread=False
+        )
+        """ The hash cache database connection """
+        # the cache can be rebuilt, so trade durability for speed
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "device INTEGER NOT NULL, inode INTEGER NOT NULL, "
+            "size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "ctime_ns INTEGER NOT NULL, digest TEXT NOT NULL, "
+            "PRIMARY KEY (device, inode)) WITHOUT ROWID"
+        )
+        self.db.commit()
+
+    @staticmethod
+    def cache_key(file_stat: os.stat_result) -> tuple[int, int, int, int, int]:
+        """
+        Get the values a cached hash is kept under.
+
+        Parameters:
+            file_stat (os.stat_result): the file status.
+
+        Returns:
+            (tuple[int, int, int, int, int]) the device, inode, size,
+                modification time and status change time.
+        """
+        return (
+            file_stat.st_dev,
+            file_stat.st_ino,
+            file_stat.st_size,
+            file_stat.st_mtime_ns,
+            file_stat.st_ctime_ns,
+        )
+
+    def cached(self, file_stat: os.stat_result) -> str | None:
+        """
+        Get the cached hash of a file, if it has not changed.
+
+        Parameters:
+            file_stat (os.stat_result): the file status.
+
+        Returns:
+            (str | None) the hex content hash, or None if not cached.
+        """
+        key = self.cache_key(file_stat)
+        with self.lock:
+            for row in reversed(self.pending):
+                if row[:2] == key[:2]:
+                    return row[5] if row[:5] == key else None
+            row = self.db.execute(
+                "SELECT size, mtime_ns, ctime_ns, digest FROM hashes "
+                "WHERE device = ? AND inode = ?",
+                key[:2],
+            ).fetchone()
+        if row is None or tuple(row[:3]) != key[2:]:
+            return None
+        return row[3]
+
+    def digest(self, path: str, file_stat: os.stat_result = None) -> str:
+        """
+        Get the content hash of a file, from the cache if unchanged.
+
+        Parameters:
+            path (str): the file.
+            file_stat (os.stat_result): the file status, if known;
+                default is None, the status is read here.
+
+        Returns:
+            (str) the hex content hash.
+
+        Raises:
+            shutil.SpecialFileError: if the file is not a regular file.
+        """
+        if file_stat is None:
+            file_stat = os.stat(path)
+        if not stat.S_ISREG(file_stat.st_mode):
+            # a named pipe would block the read
+            raise shutil.SpecialFileError("`" + str(path) + "` is not a regular file")
+        digest = self.cached(file_stat)
+        if digest is not None:
+            with self.lock:
+                self.cache_hits += 1
+            return digest
+
+        digest = file_digest(path, self.pool)
+        # a file changed while it was read is not cached
+        after = os.stat(path)
+        with self.lock:
+            self.files_hashed += 1
+            self.bytes_hashed += after.st_size
+            if self.cache_key(after) == self.cache_key(file_stat):
+                self.pending.append(self.cache_key(file_stat) + (digest,))
+                if len(self.pending) >= self.BATCH_SIZE:
+                    self.flush()
+        return digest
+
+    def remember(self, path: str, digest: str, file_stat: os.stat_result) -> None:
+        """
+        Cache the hash of a file found as it was copied.
+
+        The hash is only kept if the file has not changed since
+        'file_stat' was read.
+
+        Parameters:
+            path (str): the file.
+            digest (str): the hex content hash.
+            file_stat (os.stat_result): the file status when hashed.
+        """
+        try:
+            current = os.stat(path)
+        except OSError:
+            return
+        key = self.cache_key(file_stat)
+        if self.cache_key(current) == key:
+            with self.lock:
+                self.pending.append(key + (digest,))
+                if len(self.pending) >= self.BATCH_SIZE:
+                    self.flush()
+
+    def flush(self) -> None:
+        """Write the pending hashes to the database."""
+        with self.lock:
+            if self.pending:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO hashes "
+                    "(device, inode, size, mtime_ns, ctime_ns, digest) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    self.pending,
+                )
+                self.db.commit()
+                self.pending = []
+
+    def close(self) -> None:
+        """Write any pending hashes, close the database and stop the threads."""
+        with self.lock:
+            self.flush()
+            self.db.close()
+        self.pool.shutdown()
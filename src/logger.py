@@ -8,10 +8,12 @@ File:       logger.py
 Author:     Lorn B Kerr
 Copyright:  (c) 2022, 2025; Lorn B Kerr
 License:    MIT, see file LICENSE
-Version:    1.0.1
+Version:    1.2.1
 """
 
 import os
+import threading
+import time
 from typing import Any
 
 from lbk_library import DataFile
@@ -21,10 +23,31 @@ class Logger:
     """
     Manage the database log of backup actions.
 
+    The entries are held and written together, in one statement and so
+    one transaction, when 'BATCH_SIZE' entries are waiting, when the
+    oldest has waited 'FLUSH_INTERVAL' seconds, and when the log is
+    closed. The wait is checked as each entry is added and whenever
+    flush_if_due() is called, so a program that logs rarely calls it as
+    it works. The database uses the WAL journal, so reading the log
+    does not hold up a backup writing to it.
+
+    Besides the 'Backup_Log' table of messages, each run of the program
+    is recorded in the 'runs' table, with its start and end times, the
+    files and bytes copied and the errors logged, and each file that
+    could not be backed up in the 'file_events' table. The tables are
+    kept from run to run.
+
     Parameters:
         log_path (str): the path to the log database
     """
 
+    BATCH_SIZE = 200
+    """ The number of entries held before they are written """
+    FLUSH_INTERVAL = 5.0
+    """ The seconds an entry is held before the next check writes it """
+    BUSY_TIMEOUT = 10000
+    """ The milliseconds to wait for another connection to the log """
+
     def __init__(self, log_path: str, log_name: str) -> None:
         """
         Set the path to the log file and open the log database.
@@ -44,18 +67,42 @@ class Logger:
             {"name": "result", "type": "INTEGER"},
             {"name": "description", "type": "TEXT"},
         ]
+        self.event_columns = ["run_id", "timestamp", "result", "path"]
+        """ The columns of the 'file_events' table """
+        self.run_id: int = None
+        """ The id of the run in the 'runs' table, None if not started """
+        self.errors: int = 0
+        """ The count of the entries logged that are not a success """
+        self.pending: list[dict[str, Any]] = []
+        """ The entries waiting to be written """
+        self.pending_events: list[dict[str, Any]] = []
+        """ The file events waiting to be written """
+        self.pending_since: float = 0.0
+        """ The time the oldest waiting entry was added """
+        self.lock: threading.RLock = threading.RLock()
+        """ Guards the waiting entries """
 
-        if log_path and os.path.isfile(log_path):
+        if log_path and os.path.isfile(self.log_path):
             self.log_db.sql_connect(self.log_path)
+            self.create_tables()
         elif log_path:
             # if database file doesn't exist, create it.
             self.create_log_database(self.log_path)
+        if log_path:
+            self.set_journal_mode()
+
+    def set_journal_mode(self) -> None:
+        """Use the WAL journal and wait for other connections to the log."""
+        self.log_db.sql_query("PRAGMA busy_timeout = " + str(self.BUSY_TIMEOUT), [])
+        self.log_db.sql_query("PRAGMA journal_mode = WAL", [])
+        self.log_db.sql_query("PRAGMA synchronous = NORMAL", [])
 
     def add_log_entry(self, entry: dict[str, Any]) -> None:
         """
         Add an entry to the log database.
 
-        All column values must be present. No Error handling.
+        The entry is held until the waiting entries are written, see
+        flush(). All column values must be present. No Error handling.
 
         Parameters:
             entry (dict[str, Any]): Contains the values to be inserted.
@@ -63,24 +110,160 @@ class Logger:
                 "result" (int): result code from ResultCodes
                 "description" (str) description of the action.
         """
-        query = {"type": "INSERT", "table": self.table}
-        sql = self.log_db.sql_query_from_array(query, entry)
-        self.log_db.sql_query(sql, entry)
+        with self.lock:
+            if entry["result"]:
+                self.errors += 1
+            self.pending.append(entry)
+            self.entry_added()
+
+    def add_file_event(self, result: int, path: str, timestamp: int = None) -> None:
+        """
+        Record a file that could not be backed up, in the 'file_events' table.
+
+        The event is held until the waiting entries are written, see
+        flush().
+
+        Parameters:
+            result (int): result code from ResultCodes.
+            path (str): the path of the file.
+            timestamp (int): when it happened; default is now.
+        """
+        with self.lock:
+            self.pending_events.append(
+                {
+                    "run_id": self.run_id,
+                    "timestamp": int(time.time()) if timestamp is None else timestamp,
+                    "result": result,
+                    "path": str(path),
+                }
+            )
+            self.entry_added()
+
+    def entry_added(self) -> None:
+        """Write the waiting entries if there are enough or they are old."""
+        waiting = len(self.pending) + len(self.pending_events)
+        if waiting == 1:
+            self.pending_since = time.monotonic()
+        if waiting >= self.BATCH_SIZE:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """Write the waiting entries if the oldest has waited long enough."""
+        with self.lock:
+            if (self.pending or self.pending_events) and (
+                time.monotonic() - self.pending_since >= self.FLUSH_INTERVAL
+            ):
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the waiting entries and file events to the log database.
+
+        The entries of each table are inserted by one statement, so they
+        are written in one transaction.
+        """
+        with self.lock:
+            columns = [row_def["name"] for row_def in self.table_def]
+            self.insert_rows(self.table, columns, self.pending)
+            self.pending = []
+            self.insert_rows("file_events", self.event_columns, self.pending_events)
+            self.pending_events = []
+
+    def insert_rows(
+        self, table: str, columns: list[str], rows: list[dict[str, Any]]
+    ) -> None:
+        """
+        Insert rows into a table with one statement.
+
+        Parameters:
+            table (str): the table.
+            columns (list[str]): the columns to set.
+            rows (list[dict[str, Any]]): the value of each column, for
+                each row.
+        """
+        if not rows:
+            return
+        values = []
+        for row in rows:
+            values.extend(row[column] for column in columns)
+        sql = (
+            "INSERT INTO "
+            + table
+            + " ("
+            + ", ".join(columns)
+            + ") VALUES "
+            + ", ".join(["(" + ", ".join("?" * len(columns)) + ")"] * len(rows))
+        )
+        self.log_db.sql_query(sql, values)
+
+    def start_run(self, start: int) -> int:
+        """
+        Record the start of a run in the 'runs' table.
+
+        Parameters:
+            start (int): the start time.
+
+        Returns:
+            (int) the run id.
+        """
+        with self.lock:
+            self.flush()
+            self.log_db.sql_query("INSERT INTO runs (start) VALUES (?)", [start])
+            result = self.log_db.sql_query("SELECT MAX(run_id) AS run_id FROM runs", [])
+            self.run_id = self.log_db.sql_fetchrow(result)["run_id"]
+            self.errors = 0
+            return self.run_id
+
+    def finish_run(self, end: int, files_copied: int, bytes_copied: int) -> None:
+        """
+        Record the end of the run in the 'runs' table.
+
+        Parameters:
+            end (int): the end time.
+            files_copied (int): the number of files backed up.
+            bytes_copied (int): the number of bytes backed up.
+        """
+        with self.lock:
+            self.flush()
+            self.log_db.sql_query(
+                "UPDATE runs SET end = ?, files_copied = ?, bytes_copied = ?,"
+                " errors = ? WHERE run_id = ?",
+                [end, files_copied, bytes_copied, self.errors, self.run_id],
+            )
+
+    def runs(self) -> list[dict[str, Any]]:
+        """
+        Get the recorded runs, oldest first.
+
+        Returns:
+            (list[dict[str, Any]]) the 'run_id', 'start', 'end',
+                'files_copied', 'bytes_copied' and 'errors' of each run.
+        """
+        with self.lock:
+            self.flush()
+            result = self.log_db.sql_query("SELECT * FROM runs ORDER BY run_id", [])
+            return self.log_db.sql_fetchrowset(result)
 
     def close_log(self) -> None:
-        """Close connection to the log database if open."""
+        """Write the waiting entries and close the log database if open."""
         if self.log_db:
+            if self.log_db.sql_is_connected():
+                self.flush()
             self.log_db.sql_close()
 
     def create_log_database(self, log_path: str) -> DataFile:
         """
         Create a new Log Database.
 
-        The database has one table with 3 fields:
+        The 'Backup_Log' table has 3 fields:
             timestamp (int): When the logged event happened
             result (int): the result of the event by one of the result codes
                 found in the file 'result_codes.py',
             description (str): What was the event
+        The 'runs' and 'file_events' tables are also created, see
+        create_tables(). Existing tables and their history are kept.
 
         If no path to the new Log Database is given, a "FileNotFoundError"
         is raised.
@@ -103,11 +286,53 @@ class Logger:
             os.makedirs(directory_path)
 
         self.log_db.sql_connect(log_path)
-        self.log_db.sql_query("DROP TABLE IF EXISTS " + self.table)
+        self.create_tables()
+        return self.log_db
+
+    def create_tables(self) -> None:
+        """
+        Create the log tables that do not exist yet.
+
+        The 'runs' table has one row for each run:
+            run_id (int): the run id
+            start (int), end (int): when the run started and ended, end
+                is NULL if the run did not finish
+            bytes_copied (int), files_copied (int): the data backed up
+            errors (int): the count of the entries logged that are not a
+                success
+        The 'file_events' table has one row for each file that could not
+        be backed up, indexed by run, result and path:
+            run_id (int): the run, NULL if not known
+            timestamp (int): when it happened
+            result (int): the result code
+            path (str): the file
+        """
         create_table = "CREATE TABLE IF NOT EXISTS " + self.table + " ("
         for row_def in self.table_def:
             create_table += row_def["name"] + " " + row_def["type"] + " NOT NULL, "
         create_table = create_table[:-2]
         create_table += ")"
         self.log_db.sql_query(create_table, [])
-        return self.log_db
+        self.log_db.sql_query(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id INTEGER PRIMARY KEY, start INTEGER NOT NULL, end INTEGER, "
+            "bytes_copied INTEGER NOT NULL DEFAULT 0, "
+            "files_copied INTEGER NOT NULL DEFAULT 0, "
+            "errors INTEGER NOT NULL DEFAULT 0)",
+            [],
+        )
+        self.log_db.sql_query(
+            "CREATE TABLE IF NOT EXISTS file_events ("
+            "event_id INTEGER PRIMARY KEY, run_id INTEGER, "
+            "timestamp INTEGER NOT NULL, result INTEGER NOT NULL, "
+            "path TEXT NOT NULL)",
+            [],
+        )
+        self.log_db.sql_query(
+            "CREATE INDEX IF NOT EXISTS file_events_run"
+            " ON file_events (run_id, result)",
+            [],
+        )
+        self.log_db.sql_query(
+            "CREATE INDEX IF NOT EXISTS file_events_path ON file_events (path)", []
+        )
@@ -7,27 +7,42 @@ File:       main.py
 Author:     Lorn B Kerr
 Copyright:  (c) 2022, 2023 Lorn B Kerr
 License:    MIT, see file LICENSE
-Version:    1.1.0
+Version:    1.9.0
 """
 
 import datetime
+import os
 import re
 import sys
 import time
 
+from catalog import Catalog
 from external_storage import ExternalStorage
 from lbk_library.gui import Settings
 from logger import Logger
+from pruner import Pruner
 from PySide6.QtWidgets import QApplication
+from restorer import Restorer
 from result_codes import ResultCodes
 from setup import Setup
+from verifier import Verifier
 
 file_name = "main.py"
-file_version = "1.1.0"
+file_version = "1.9.0"
 changes = {
     "1.0.0": "Initial release",
     "1.0.1": "Changed library 'PyQt5' to 'PySide6' and code cleanup",
     "1.1.0": "Changed from ini file to lbkLibrary/Settings",
+    "1.2.0": "Only update 'last_backup' after a successful backup.",
+    "1.3.0": "Added the '--prune' action to remove old snapshots.",
+    "1.4.0": "Added the '--checksum' action to compare files by content.",
+    "1.5.0": "Added the '--verify' action to check the backup copies.",
+    "1.6.0": "Added the '--restore' action to restore files from the backup.",
+    "1.7.0": "Added the '--find' action to search the catalog of backed up"
+    + " files.",
+    "1.8.0": "Added the '--diff' action to compare two backup runs.",
+    "1.9.0": "Record each run, with the files and bytes backed up, in the"
+    + " log 'runs' table.",
 }
 
 
@@ -61,12 +76,40 @@ class Backup:
                     is included, required if other options are used.
                 -v, --verbose
                     Show the steps being accomplished.
+                --checksum
+                    Run the backup, comparing each file with its backup
+                    copy by content rather than by time.
+                --prune
+                    Remove the old snapshots not kept by the retention
+                    options, and the chunks they no longer need.
+                --verify
+                    Read back the backup copies and check them against
+                    their hashes.
+                --restore[=PATH]
+                    Restore the files under PATH, in or relative to the
+                    source directory, or all of the source, from the
+                    backup.
+                --at=TIME
+                    Restore from the backup taken at or before the local
+                    TIME, such as "2025-06-01 14:30", rather than the
+                    latest; a mirror has only the latest backup.
+                --restore-to=DIR
+                    Restore the files under DIR rather than to where
+                    they were.
+                --find PATTERN, --find=PATTERN
+                    List the backed up files whose path contains
+                    PATTERN, or matches it if it has a wildcard, in
+                    each backup run, from the catalog.
+                --diff RUN_A RUN_B
+                    List the files added, removed and modified between
+                    two backup runs, as numbered by --find, from the
+                    catalog.
                 --version
                     Show the version of the program.
            config_name (str) -: The name of the system configuration file,
                  defaults to 'Backup'.
         """
-        self.actions: dict[str, bool] = self.set_required_actions(action_list)
+        self.actions: dict[str, bool | str] = self.set_required_actions(action_list)
         """The set requested actions from the action list."""
         self.config = Settings("UnnamedBranch", config_name)
         """The configuration setup."""
@@ -74,6 +117,12 @@ class Backup:
         """Handle the backup to the external storage drive."""
         self.logger: Logger
         """The results log driver."""
+        self.pruner: Pruner
+        """Remove the old backups."""
+        self.verifier: Verifier
+        """Check the backup copies against their hashes."""
+        self.restorer: Restorer
+        """Restore files from the backup."""
 
         start_time = time.time()  # Get the starting timestamp
 
@@ -87,6 +136,9 @@ class Backup:
         self.logger = Logger(
             self.config.value("log_path"), self.config.value("log_name")
         )
+        self.logger.start_run(int(start_time))
+        files_copied = 0
+        bytes_copied = 0
         self.logger.add_log_entry(
             {
                 "timestamp": int(start_time),
@@ -108,12 +160,32 @@ class Backup:
             )
 
         if self.actions["backup"]:
-           self.external_storage = ExternalStorage(
+            self.external_storage = ExternalStorage(
                 self.config, self.logger, self.actions
             )
+            files_copied = self.external_storage.files_backed_up
+            bytes_copied = self.external_storage.bytes_backed_up
 
-        # update the config file 'last backup' time
-        self.config.setValue("last_backup", int(start_time))
+            # update the config file 'last backup' time. Only a backup
+            # that completed without errors moves the time forward, as
+            # it marks the files that can be skipped by the next backup.
+            if self.external_storage.result == ResultCodes.SUCCESS:
+                self.config.setValue("last_backup", int(start_time))
+
+        if self.actions["prune"]:
+            self.pruner = Pruner(self.config, self.logger, self.actions)
+
+        if self.actions["verify"]:
+            self.verifier = Verifier(self.config, self.logger, self.actions)
+
+        if self.actions["restore"]:
+            self.restorer = Restorer(self.config, self.logger, self.actions)
+
+        if self.actions["find"]:
+            self.find_files(self.actions["find"])
+
+        if self.actions["diff"]:
+            self.diff_runs(self.actions["diff_from"], self.actions["diff_to"])
 
         end_time = time.time()  # Get the ending timestamp
         elapsed = int(end_time - start_time)  # how long did backup take.
@@ -139,16 +211,21 @@ class Backup:
                 "ended:", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(end_time))
             )
             print("Elapsed time: " + str(datetime.timedelta(seconds=elapsed)))
+        self.logger.finish_run(int(end_time), files_copied, bytes_copied)
         self.logger.close_log()
 
-    def set_required_actions(self, args: list[str]) -> dict[str, bool]:
+    def set_required_actions(self, args: list[str]) -> dict[str, bool | str]:
         """
         Set the required actions from the command line arguments.
 
         Valid arguments are in the group
-            -b, --backup, -s, --setup, -v, --verbose, --version
+            -b, --backup, -s, --setup, -v, --verbose, --checksum, --prune,
+            --verify, --restore[=PATH], --at=TIME, --restore-to=DIR,
+            --find PATTERN, --diff RUN_A RUN_B, --version
         The single letter arguments can be combined into a group
-        (i.e.: -bv will be decoded as --backup -- verbose).
+        (i.e.: -bv will be decoded as --backup -- verbose). The value of
+        an argument is given after '=' or, for --find, as the next
+        argument; --diff takes the next two arguments.
 
         If no arguments are supplied, then set for backup only.
 
@@ -156,7 +233,8 @@ class Backup:
             args (list[str]): the set of requested actions
 
         Returns:
-            (dict[str, bool]) the requested actions
+            (dict[str, bool | str]) the requested actions, and the
+                values given with them
         """
         # initialize requested actions
         actions = {
@@ -164,6 +242,17 @@ class Backup:
             "setup": False,  # Do the setup?
             "verbose": False,  # show progress on terminal
             "version": False,  # show program version and exit
+            "prune": False,  # remove old snapshots
+            "checksum": False,  # compare files by content
+            "verify": False,  # check the backup copies
+            "restore": False,  # restore files from the backup
+            "restore_path": "",  # the subtree to restore, "" for all
+            "restore_time": "",  # restore as at this time, "" for latest
+            "restore_to": "",  # restore under this directory
+            "find": "",  # search the catalog for this pattern
+            "diff": False,  # compare two backup runs
+            "diff_from": "",  # the earlier run to compare
+            "diff_to": "",  # the later run to compare
         }
 
         # validate/simplify grouped single letter actions
@@ -180,7 +269,8 @@ class Backup:
             actions["backup"] = True
         else:
             # some set of arguments are requested
-            for action in args:
+            remaining = iter(args)
+            for action in remaining:
                 if action == "-b" or action == "--backup":
                     actions["backup"] = True
                 elif action == "-s" or action == "--setup":
@@ -189,8 +279,99 @@ class Backup:
                     actions["verbose"] = True
                 elif action == "--version":
                     actions["version"] = True
+                elif action == "--prune":
+                    actions["prune"] = True
+                elif action == "--verify":
+                    actions["verify"] = True
+                elif action == "--restore" or action.startswith("--restore="):
+                    actions["restore"] = True
+                    actions["restore_path"] = action.partition("=")[2]
+                elif action.startswith("--at="):
+                    actions["restore_time"] = action.partition("=")[2]
+                elif action.startswith("--restore-to="):
+                    actions["restore_to"] = action.partition("=")[2]
+                elif action == "--find":
+                    actions["find"] = next(remaining, "")
+                elif action.startswith("--find="):
+                    actions["find"] = action.partition("=")[2]
+                elif action == "--diff":
+                    actions["diff"] = True
+                    actions["diff_from"] = next(remaining, "")
+                    actions["diff_to"] = next(remaining, "")
+                elif action == "--checksum":
+                    actions["backup"] = True
+                    actions["checksum"] = True
         return actions
 
+    def find_files(self, pattern: str) -> None:
+        """
+        List the backed up files matching a pattern, from the catalog.
+
+        The catalog is kept in the log directory, so the backup drive is
+        not needed.
+
+        Parameters:
+            pattern (str): the pattern to find, see Catalog.find().
+        """
+        catalog_path = Catalog.default_path(
+            self.config.value("log_path"), self.config.value("log_name")
+        )
+        if not catalog_path or not os.path.isfile(catalog_path):
+            print("There is no catalog of backed up files.")
+            return
+        catalog = Catalog(catalog_path)
+        matches = catalog.find(pattern)
+        catalog.close()
+        if not matches:
+            print("No backed up files match", pattern)
+        for match in matches:
+            print(Catalog.describe(match))
+
+    def diff_runs(self, run_a: str, run_b: str) -> None:
+        """
+        List the files added, removed and modified between two runs.
+
+        The runs are compared from the catalog, so neither the source
+        nor the backup drive is read.
+
+        Parameters:
+            run_a (str): the earlier run id.
+            run_b (str): the later run id.
+        """
+        catalog_path = Catalog.default_path(
+            self.config.value("log_path"), self.config.value("log_name")
+        )
+        if not catalog_path or not os.path.isfile(catalog_path):
+            print("There is no catalog of backed up files.")
+            return
+        catalog = Catalog(catalog_path)
+        run_ids = [run[0] for run in catalog.runs()]
+        if not (
+            run_a.isdigit()
+            and run_b.isdigit()
+            and int(run_a) in run_ids
+            and int(run_b) in run_ids
+        ):
+            print("Both runs must be among the catalog runs", run_ids)
+            catalog.close()
+            return
+        added, removed, modified = catalog.diff(int(run_a), int(run_b))
+        catalog.close()
+        for mark, paths in (("+", added), ("-", removed), ("M", modified)):
+            for path in paths:
+                print(mark, path)
+        print(
+            len(added),
+            "added,",
+            len(removed),
+            "removed,",
+            len(modified),
+            "modified between runs",
+            run_a,
+            "and",
+            run_b,
+        )
+
     def do_setup(self) -> int:
         """
         Set up initial configuration file.
@@ -0,0 +1,436 @@
+"""
+Keep a record of the files held in the backup.
+
+The manifest is a SQLite database stored beside the log database. It
+holds the size, modification time, inode and device of each source
+file as it was when the file was last backed up, so an unchanged file
+can be recognized from the source file status alone, and a file that
+has been moved or renamed can be found in the backup by its inode or
+its content hash.
+
+File:       manifest.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.9.0
+"""
+
+import os
+import sqlite3
+import threading
+
+file_name = "manifest.py"
+file_version = "1.9.0"
+changes = {
+    "1.0.0": "Initial release",
+    "1.1.0": "Added 'reset' to flag a manifest started over.",
+    "1.2.0": "Allow records to be added from the copy threads.",
+    "1.3.0": "Added 'root' so records can be kept relative to a snapshot;"
+    + " drop the records if the backup layout changes.",
+    "1.4.0": "Added the content 'digest' and find_moved(), find_copies() and"
+    + " remove() to follow files that have moved.",
+    "1.5.0": "Added names() and dir_keys() to find the files deleted from"
+    + " the source.",
+    "1.6.0": "Moved file_digest() to the hasher.",
+    "1.7.0": "Added hashed_files() for checking the backup copies.",
+    "1.8.0": "Added criteria() and set_criteria() to find a change of the"
+    + " include and exclude criteria.",
+    "1.9.0": "Added count().",
+}
+
+
+class Manifest:
+    """
+    Record the status of each backed up source file.
+
+    Files are keyed by their place in the backup: the backup directory,
+    relative to the backup location, and the file name. The manifest is
+    only valid for one source, destination and backup layout; if any
+    of them changes, the stored records are dropped and the manifest is
+    rebuilt as files are backed up.
+
+    The manifest may be used from several threads; each call holds the
+    manifest lock.
+
+    Parameters:
+        manifest_path (str): the path to the manifest database.
+        source (str): the source directory being backed up.
+        destination (str): the backup location.
+        layout (str): the backup layout, default is "mirror".
+    """
+
+    BATCH_SIZE = 1000
+    """ The number of records held before they are written. """
+
+    def __init__(
+        self, manifest_path: str, source: str, destination: str, layout: str = "mirror"
+    ) -> None:
+        """
+        Open the manifest database, creating it if needed.
+
+        Parameters:
+            manifest_path (str): the path to the manifest database.
+            source (str): the source directory being backed up.
+            destination (str): the backup location.
+            layout (str): the backup layout, default is "mirror".
+        """
+        self.manifest_path: str = manifest_path
+        """ The path to the manifest database """
+        self.destination: str = str(destination)
+        """ The backup location """
+        self.root: str = self.destination
+        """ The records are relative to this, the backup or the snapshot """
+        self.pending: list[tuple] = []
+        """ Records waiting to be written to the database """
+        self.removed: set[tuple[str, str]] = set()
+        """ The directory and name of records waiting to be deleted """
+        self.cached_dir: str = None
+        """ The directory whose records are in 'cached_files' """
+        self.cached_files: dict[str, tuple[int, int, int, int]] = {}
+        """ The records for the files in 'cached_dir' by file name """
+        self.reset: bool = False
+        """ True if the manifest is new or the records have been dropped """
+        self.lock: threading.RLock = threading.RLock()
+        """ Guards the database, the cache and the pending records """
+
+        directory_path = os.path.dirname(manifest_path)
+        if directory_path and not os.path.exists(directory_path):
+            os.makedirs(directory_path)
+
+        self.db: sqlite3.Connection = sqlite3.connect(
+            manifest_path, check_same_thread=False
+        )
+        """ The manifest database connection """
+        # the manifest can be rebuilt, so trade durability for speed
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "dir TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, inode INTEGER NOT NULL, "
+            "device INTEGER NOT NULL, digest TEXT, PRIMARY KEY (dir, name)) "
+            "WITHOUT ROWID"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(files)")]
+        if "digest" not in columns:
+            self.db.execute("ALTER TABLE files ADD COLUMN digest TEXT")
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS files_inode ON files (device, inode)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS files_digest ON files (digest) "
+            "WHERE digest IS NOT NULL"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self.check_locations(str(source), str(destination), layout)
+        self.db.commit()
+
+    def check_locations(self, source: str, destination: str, layout: str) -> None:
+        """
+        Drop the records if the source, backup location or layout has
+        changed.
+
+        Parameters:
+            source (str): the source directory being backed up.
+            destination (str): the backup location.
+            layout (str): the backup layout.
+        """
+        stored = dict(self.db.execute("SELECT key, value FROM meta"))
+        if (
+            stored.get("source") != source
+            or stored.get("destination") != destination
+            or stored.get("layout", "mirror") != layout
+        ):
+            self.reset = True
+            self.db.execute("DELETE FROM files")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("source", source), ("destination", destination), ("layout", layout)],
+            )
+
+    def criteria(self) -> str | None:
+        """
+        Get the fingerprint of the criteria of the last complete backup.
+
+        Returns:
+            (str | None) the fingerprint, None if not recorded.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value FROM meta WHERE key = 'criteria'"
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def set_criteria(self, fingerprint: str) -> None:
+        """
+        Record the fingerprint of the criteria of a complete backup.
+
+        Parameters:
+            fingerprint (str): the fingerprint of the criteria lists.
+        """
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('criteria', ?)",
+                (fingerprint,),
+            )
+            self.db.commit()
+
+    def dir_key(self, backup_dir: str) -> str:
+        """
+        Get the key for a backup directory.
+
+        Parameters:
+            backup_dir (str): the backup directory.
+
+        Returns:
+            (str) the directory relative to the root, or the full path
+                if it is not in the root.
+        """
+        backup_dir = str(backup_dir).rstrip(os.sep)
+        if backup_dir == self.root:
+            return ""
+        if backup_dir.startswith(self.root + os.sep):
+            return backup_dir[len(self.root) + 1 :]
+        return backup_dir
+
+    def lookup(self, backup_dir: str, filename: str) -> tuple[int, int, int, int]:
+        """
+        Get the record for a file.
+
+        The records of one directory are read together, files are
+        normally looked up a directory at a time.
+
+        Parameters:
+            backup_dir (str): the backup directory of the file.
+            filename (str): the file name.
+
+        Returns:
+            (tuple[int, int, int, int]) the size, mtime_ns, inode and
+                device of the file when backed up, or None if the file
+                is not in the manifest.
+        """
+        dir_key = self.dir_key(backup_dir)
+        with self.lock:
+            if dir_key != self.cached_dir:
+                self.cached_dir = dir_key
+                self.cached_files = {
+                    row[0]: row[1:]
+                    for row in self.db.execute(
+                        "SELECT name, size, mtime_ns, inode, device FROM files "
+                        "WHERE dir = ?",
+                        (dir_key,),
+                    )
+                }
+                # records not yet written are newer than the database
+                for row in self.pending:
+                    if row[0] == dir_key:
+                        self.cached_files[row[1]] = row[2:6]
+                for removed_dir, removed_name in self.removed:
+                    if removed_dir == dir_key:
+                        self.cached_files.pop(removed_name, None)
+            return self.cached_files.get(filename)
+
+    def is_unchanged(
+        self, backup_dir: str, filename: str, source_stat: os.stat_result
+    ) -> bool:
+        """
+        Check if a file is unchanged since it was backed up.
+
+        Parameters:
+            backup_dir (str): the backup directory of the file.
+            filename (str): the file name.
+            source_stat (os.stat_result): the current file status.
+
+        Returns:
+            (bool) True if the size, modification time, inode and device
+                all match the manifest, False otherwise.
+        """
+        return self.lookup(backup_dir, filename) == (
+            source_stat.st_size,
+            source_stat.st_mtime_ns,
+            source_stat.st_ino,
+            source_stat.st_dev,
+        )
+
+    def names(self, backup_dir: str) -> list[str]:
+        """
+        Get the names of the files recorded in a backup directory.
+
+        Parameters:
+            backup_dir (str): the backup directory.
+
+        Returns:
+            (list[str]) the file names.
+        """
+        with self.lock:
+            self.lookup(backup_dir, "")
+            return list(self.cached_files)
+
+    def count(self) -> int:
+        """
+        Get the number of files recorded.
+
+        Returns:
+            (int) the count of the records.
+        """
+        with self.lock:
+            self.flush()
+            return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def dir_keys(self) -> list[str]:
+        """
+        Get the keys of all the backup directories with records.
+
+        Returns:
+            (list[str]) the directory keys, see dir_key().
+        """
+        with self.lock:
+            self.flush()
+            return [row[0] for row in self.db.execute("SELECT DISTINCT dir FROM files")]
+
+    def hashed_files(self) -> list[tuple[str, str, str]]:
+        """
+        Get the records of the files with a content hash.
+
+        Returns:
+            (list[tuple[str, str, str]]) the directory key, name and
+                content hash of each file.
+        """
+        with self.lock:
+            self.flush()
+            return [
+                tuple(row)
+                for row in self.db.execute(
+                    "SELECT dir, name, digest FROM files WHERE digest IS NOT NULL"
+                )
+            ]
+
+    def find_moved(self, source_stat: os.stat_result) -> list[tuple[str, str]]:
+        """
+        Find the records of a file by its inode, wherever it was backed up.
+
+        Parameters:
+            source_stat (os.stat_result): the current file status.
+
+        Returns:
+            (list[tuple[str, str]]) the directory key and name of each
+                record with the same size, modification time, inode and
+                device.
+        """
+        values = (
+            source_stat.st_size,
+            source_stat.st_mtime_ns,
+            source_stat.st_ino,
+            source_stat.st_dev,
+        )
+        with self.lock:
+            found = [
+                tuple(row)
+                for row in self.db.execute(
+                    "SELECT dir, name FROM files WHERE device = ? AND inode = ? "
+                    "AND size = ? AND mtime_ns = ?",
+                    (values[3], values[2], values[0], values[1]),
+                )
+            ]
+            found += [row[:2] for row in self.pending if row[2:6] == values]
+            return [key for key in found if key not in self.removed]
+
+    def find_copies(self, size: int, digest: str) -> list[tuple[str, str]]:
+        """
+        Find the records of the files with the same content.
+
+        Parameters:
+            size (int): the file size.
+            digest (str): the content hash, see 'hasher.file_digest'.
+
+        Returns:
+            (list[tuple[str, str]]) the directory key and name of each
+                record with the same size and content hash.
+        """
+        with self.lock:
+            found = [
+                tuple(row)
+                for row in self.db.execute(
+                    "SELECT dir, name FROM files WHERE digest = ? AND size = ?",
+                    (digest, size),
+                )
+            ]
+            found += [
+                row[:2] for row in self.pending if row[6] == digest and row[2] == size
+            ]
+            return [key for key in found if key not in self.removed]
+
+    def remove(self, backup_dir: str, filename: str) -> None:
+        """
+        Remove the record of a file no longer in the backup.
+
+        Parameters:
+            backup_dir (str): the backup directory of the file.
+            filename (str): the file name.
+        """
+        key = (self.dir_key(backup_dir), filename)
+        with self.lock:
+            if key[0] == self.cached_dir:
+                self.cached_files.pop(filename, None)
+            self.pending = [row for row in self.pending if row[:2] != key]
+            self.removed.add(key)
+
+    def record(
+        self,
+        backup_dir: str,
+        filename: str,
+        source_stat: os.stat_result,
+        digest: str = None,
+    ) -> None:
+        """
+        Record a file as backed up.
+
+        Parameters:
+            backup_dir (str): the backup directory of the file.
+            filename (str): the file name.
+            source_stat (os.stat_result): the file status when backed up.
+            digest (str): the content hash of the file, if known;
+                default is None.
+        """
+        dir_key = self.dir_key(backup_dir)
+        values = (
+            source_stat.st_size,
+            source_stat.st_mtime_ns,
+            source_stat.st_ino,
+            source_stat.st_dev,
+        )
+        with self.lock:
+            if dir_key == self.cached_dir:
+                self.cached_files[filename] = values
+            self.removed.discard((dir_key, filename))
+            self.pending.append((dir_key, filename) + values + (digest,))
+            if len(self.pending) + len(self.removed) >= self.BATCH_SIZE:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write the pending records to the database."""
+        with self.lock:
+            if self.removed:
+                self.db.executemany(
+                    "DELETE FROM files WHERE dir = ? AND name = ?", self.removed
+                )
+            if self.pending:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO files "
+                    "(dir, name, size, mtime_ns, inode, device, digest) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self.pending,
+                )
+            if self.removed or self.pending:
+                self.db.commit()
+                self.pending = []
+                self.removed = set()
+
+    def close(self) -> None:
+        """Write any pending records and close the database."""
+        with self.lock:
+            self.flush()
+            self.db.close()
@@ -0,0 +1,192 @@
+"""
+Decide which directories and files are included in the backup.
+
+File:       path_filter.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import re
+
+file_name = "path_filter.py"
+file_version = "1.0.0"
+changes = {
+    "1.0.0": "Initial release",
+}
+
+
+class PathFilter:
+    """
+    Match directory paths and file names against the backup criteria.
+
+    A directory or file is included if it does not contain any of the
+    excluded strings or if it contains any of the included strings. The
+    string lists are compiled once into a single regular expression for
+    directories and one for files, so each name is checked in one call
+    however many strings are in the lists.
+
+    Parameters:
+        excluded_dirs (list[str]): the excluded directory strings.
+        included_dirs (list[str]): the included directory strings.
+        excluded_files (list[str]): the excluded file strings.
+        included_files (list[str]): the included file strings.
+    """
+
+    def __init__(
+        self,
+        excluded_dirs: list[str],
+        included_dirs: list[str],
+        excluded_files: list[str],
+        included_files: list[str],
+    ) -> None:
+        """
+        Compile the directory and file criteria.
+
+        Parameters:
+            excluded_dirs (list[str]): the excluded directory strings.
+            included_dirs (list[str]): the included directory strings.
+            excluded_files (list[str]): the excluded file strings.
+            included_files (list[str]): the included file strings.
+        """
+        self.lists: tuple[list[str], ...] = (
+            list(excluded_dirs),
+            list(included_dirs),
+            list(excluded_files),
+            list(included_files),
+        )
+        """ Copies of the lists the filter was built from """
+        self.dir_match = self.compile_criteria(excluded_dirs, included_dirs)
+        """ Match an included directory path """
+        self.file_match = self.compile_criteria(excluded_files, included_files)
+        """ Match an included file name """
+
+    def dir_included(self, path: str) -> bool:
+        """
+        Check if a directory is included in the backup.
+
+        Parameters:
+            path (str): the directory path.
+
+        Returns:
+            (bool) True if included, False if excluded.
+        """
+        return self.dir_match(path) is not None
+
+    def file_included(self, filename: str) -> bool:
+        """
+        Check if a file is included in the backup.
+
+        Parameters:
+            filename (str): the file name.
+
+        Returns:
+            (bool) True if included, False if excluded.
+        """
+        return self.file_match(filename) is not None
+
+    @classmethod
+    def compile_criteria(cls, excluded: list[str], included: list[str]):
+        """
+        Build the match function for one pair of criteria lists.
+
+        The expression matches at the start of the name when an
+        included string is found anywhere in it, or when no excluded
+        string is found anywhere in it.
+
+        Parameters:
+            excluded (list[str]): the excluded strings.
+            included (list[str]): the included strings.
+
+        Returns:
+            the 'match' method of the compiled expression.
+        """
+        alternatives = []
+        if included:
+            alternatives.append(".*?" + cls.strings_regex(included))
+        if excluded:
+            alternatives.append("(?!.*?" + cls.strings_regex(excluded) + ")")
+        else:
+            alternatives.append("")
+        return re.compile("(?s)(?:" + "|".join(alternatives) + ")").match
+
+    @classmethod
+    def strings_regex(cls, strings: list[str]) -> str:
+        """
+        Build a regular expression matching any of a set of strings.
+
+        The strings are merged into a prefix tree first, so strings
+        with a common start share one branch of the expression rather
+        than each being tried in turn.
+
+        Parameters:
+            strings (list[str]): the strings to match.
+
+        Returns:
+            (str) the regular expression.
+        """
+        tree: dict = {}
+        for string in strings:
+            node = tree
+            for char in string:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        return "(?:" + cls.tree_regex(tree) + ")"
+
+    @classmethod
+    def tree_regex(cls, node: dict) -> str:
+        """
+        Build the regular expression for one branch of a prefix tree.
+
+        Once a complete string is matched, the rest of the branch is
+        not needed; the longer strings can only match where it does.
+        Runs of single characters are joined without recursing so long
+        strings do not nest deeply.
+
+        Parameters:
+            node (dict): the branch of the prefix tree.
+
+        Returns:
+            (str) the regular expression.
+        """
+        prefix = ""
+        while len(node) == 1 and "" not in node:
+            char, node = next(iter(node.items()))
+            prefix += re.escape(char)
+        if "" in node:
+            return prefix
+        single_chars = []
+        branches = []
+        for char in sorted(node):
+            child = node[char]
+            tail = cls.tree_regex(child)
+            if tail:
+                branches.append(re.escape(char) + tail)
+            else:
+                single_chars.append(char)
+
+        if len(single_chars) == 1:
+            branches.append(re.escape(single_chars[0]))
+        elif single_chars:
+            branches.append(
+                "[" + "".join(cls.class_escape(char) for char in single_chars) + "]"
+            )
+        if len(branches) == 1:
+            return prefix + branches[0]
+        return prefix + "(?:" + "|".join(branches) + ")"
+
+    @staticmethod
+    def class_escape(char: str) -> str:
+        """
+        Escape a character for use inside a character class.
+
+        Parameters:
+            char (str): the character.
+
+        Returns:
+            (str) the escaped character.
+        """
+        if char in "\\]^-[":
+            return "\\" + char
+        return char
@@ -0,0 +1,431 @@
+"""
+Remove the old backups no longer kept by the retention rules.
+
+File:       pruner.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.1
+"""
+
+import datetime
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from default_config import config_option
+from lbk_library.gui import Settings
+from logger import Logger
+from repository import MANIFEST_SUFFIX, ChunkRepository
+from result_codes import ResultCodes
+from scanner import Scanner
+from snapshots import PARTIAL_SUFFIX, SNAPSHOT_FORMAT, SNAPSHOT_PATTERN, Snapshots
+
+file_name = "pruner.py"
+file_version = "1.0.1"
+changes = {
+    "1.0.0": "Initial release",
+    "1.0.1": "Hold the repository lock while removing chunks.",
+}
+
+DELETING_SUFFIX = ".deleting"
+""" Added to the name of a snapshot directory while it is removed. """
+
+
+class Pruner:
+    """
+    Remove the old backups no longer kept by the retention rules.
+
+    The latest snapshot of each of the last 'keep_daily' days,
+    'keep_weekly' weeks and 'keep_monthly' months is kept, as is the
+    latest snapshot.
+
+    For the "snapshot" layout, each snapshot directory not kept is
+    renamed to '<name>.deleting' and then removed, so a prune that
+    does not finish never leaves part of a snapshot that looks
+    complete; the next prune removes it. The files are removed by a
+    pool of threads, a directory at a time. Only files with no other
+    hard link free any space.
+
+    For the "repository" layout, the snapshot manifests not kept are
+    removed, then every chunk not listed in a kept manifest is removed
+    by a pool of threads, a chunk directory at a time. Chunks are not
+    removed while a backup may be running, that is, while there is a
+    partial manifest newer than the latest snapshot.
+
+    A mirror keeps no history, so there is nothing to prune.
+
+    Parameters:
+        config (Settings): the configuration.
+        logger (Logger): the result logger for the database.
+        actions (dict[str, bool]): the required actions.
+    """
+
+    PENDING_PER_WORKER = 4
+    """ The directories waiting to be emptied for each worker. """
+
+    def __init__(
+        self, config: Settings, logger: Logger, actions: dict[str, bool]
+    ) -> None:
+        """
+        Prune the backups in the backup location.
+
+        Parameters:
+            config (Settings): the configuration.
+            logger (Logger): the result logger for the database.
+            actions (dict[str, bool]): the required actions.
+        """
+        self.config: Settings = config
+        """ The configuration holding the retention rules """
+        self.logger: Logger = logger
+        """ The result logger for the database """
+        self.actions: dict[str, bool] = actions
+        """ The list of actions directed """
+        self.workers: int = max(1, config_option(config, "prune_workers"))
+        """ The number of threads removing files """
+        self.result: int = ResultCodes.SUCCESS
+        """ The overall result of the prune, from ResultCodes """
+        self.snapshots_kept: int = 0
+        """ The count of the snapshots kept """
+        self.snapshots_removed: int = 0
+        """ The count of the snapshots removed """
+        self.items_removed: int = 0
+        """ The count of the files or chunks removed """
+        self.bytes_reclaimed: int = 0
+        """ The space freed on the backup drive """
+        self.failed: list[str] = []
+        """ The files and directories that could not be removed """
+        self.lock: threading.Lock = threading.Lock()
+        """ Guards the counts and failures updated by the threads """
+
+        location = config.value("backup_location")
+        layout = config_option(config, "backup_layout")
+        if not location or not os.path.isdir(location):
+            print(" Could not access the Extrernal Storage Drive ")
+            self.result = ResultCodes.NO_EXTERNAL_STORAGE
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.NO_EXTERNAL_STORAGE,
+                    "description": " Could not access the Extrernal Storage Drive ",
+                }
+            )
+            return
+        if layout == "snapshot":
+            self.prune_snapshots(location)
+        elif layout == "repository":
+            self.prune_repository(location)
+        elif self.actions["verbose"]:
+            print("A mirror has no old backups to prune.")
+        self.log_results()
+
+    def kept_snapshots(self, names: list[str]) -> set[str]:
+        """
+        Get the snapshots kept by the retention rules.
+
+        Parameters:
+            names (list[str]): the snapshot names.
+
+        Returns:
+            (set[str]) the names of the snapshots to keep.
+        """
+        return self.select_kept(
+            names,
+            config_option(self.config, "keep_daily"),
+            config_option(self.config, "keep_weekly"),
+            config_option(self.config, "keep_monthly"),
+        )
+
+    @staticmethod
+    def select_kept(
+        names: list[str], daily: int, weekly: int, monthly: int
+    ) -> set[str]:
+        """
+        Select the snapshots to keep.
+
+        The latest snapshot in each of the last 'daily' days, 'weekly'
+        weeks and 'monthly' months that have a snapshot is kept, as is
+        the latest snapshot. The periods are in UTC, as are the names.
+
+        Parameters:
+            names (list[str]): the snapshot names.
+            daily (int): the number of days to keep.
+            weekly (int): the number of weeks to keep.
+            monthly (int): the number of months to keep.
+
+        Returns:
+            (set[str]) the names of the snapshots to keep.
+        """
+        newest_first = sorted(names, reverse=True)
+        kept = set(newest_first[:1])
+        times = [
+            datetime.datetime.strptime(name, SNAPSHOT_FORMAT) for name in newest_first
+        ]
+        rules = (
+            (daily, lambda stamp: stamp.date()),
+            (weekly, lambda stamp: stamp.isocalendar()[:2]),
+            (monthly, lambda stamp: (stamp.year, stamp.month)),
+        )
+        for count, period_of in rules:
+            periods = set()
+            for name, stamp in zip(newest_first, times):
+                if len(periods) >= count:
+                    break
+                period = period_of(stamp)
+                if period not in periods:
+                    periods.add(period)
+                    kept.add(name)
+        return kept
+
+    def prune_snapshots(self, location: str) -> None:
+        """
+        Remove the snapshot directories not kept.
+
+        Parameters:
+            location (str): the backup location.
+        """
+        snapshots = Snapshots(location)
+        names = snapshots.names()
+        kept = self.kept_snapshots(names)
+        self.snapshots_kept = len(kept)
+
+        # removals left by a prune that did not finish
+        doomed = [
+            os.path.join(location, name)
+            for name in snapshots.matching_dirs(DELETING_SUFFIX)
+        ]
+        for name in names:
+            if name in kept:
+                continue
+            path = os.path.join(location, name)
+            try:
+                os.rename(path, path + DELETING_SUFFIX)
+            except OSError:
+                self.failed.append(path)
+                continue
+            doomed.append(path + DELETING_SUFFIX)
+            self.snapshots_removed += 1
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="pruner") as pool:
+            for path in doomed:
+                self.remove_tree(pool, path)
+
+    def remove_tree(self, pool: ThreadPoolExecutor, path: str) -> None:
+        """
+        Remove a directory tree, emptying the directories in parallel.
+
+        Parameters:
+            pool (ThreadPoolExecutor): the threads removing the files.
+            path (str): the top of the tree.
+        """
+        directories = []
+        pending: deque[Future] = deque()
+        for current_dir, subdirs, files in Scanner(path, workers=self.workers).scan():
+            directories.append(current_dir)
+            paths = [entry.path for entry in files]
+            # links to directories are listed with the subdirectories
+            for subdir in subdirs:
+                subdir_path = os.path.join(current_dir, subdir)
+                if os.path.islink(subdir_path):
+                    paths.append(subdir_path)
+            pending.append(pool.submit(self.remove_files, paths))
+            while len(pending) > self.workers * self.PENDING_PER_WORKER:
+                pending.popleft().result()
+        for future in pending:
+            future.result()
+
+        # the walk is top down, so remove the deepest directories first
+        for directory in reversed(directories):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                with self.lock:
+                    self.failed.append(directory)
+
+    def remove_files(self, paths: list[str]) -> None:
+        """
+        Remove a set of files, counting the space freed.
+
+        Parameters:
+            paths (list[str]): the files to remove.
+        """
+        removed = 0
+        reclaimed = 0
+        failed = []
+        for path in paths:
+            try:
+                file_stat = os.lstat(path)
+                os.unlink(path)
+            except OSError:
+                failed.append(path)
+                continue
+            removed += 1
+            if file_stat.st_nlink == 1:
+                reclaimed += self.disk_size(file_stat)
+        with self.lock:
+            self.items_removed += removed
+            self.bytes_reclaimed += reclaimed
+            self.failed.extend(failed)
+
+    @staticmethod
+    def disk_size(file_stat: os.stat_result) -> int:
+        """
+        Get the space a file takes on the drive.
+
+        Parameters:
+            file_stat (os.stat_result): the file status.
+
+        Returns:
+            (int) the allocated size if known, else the file size.
+        """
+        blocks = getattr(file_stat, "st_blocks", None)
+        if blocks is None:
+            return file_stat.st_size
+        return blocks * 512
+
+    def prune_repository(self, location: str) -> None:
+        """
+        Remove the snapshot manifests not kept and the unused chunks.
+
+        The chunks are only removed while the repository lock is held,
+        so not while a backup is running.
+
+        Parameters:
+            location (str): the backup location.
+        """
+        repository = ChunkRepository(location)
+        names = repository.snapshot_names()
+        kept = sorted(self.kept_snapshots(names))
+        self.snapshots_kept = len(kept)
+
+        # a backup holds the repository lock while it runs; without the
+        # lock, a chunk the backup has just found could be removed.
+        running = not repository.acquire(wait=False)
+        try:
+            # with the lock held, a partial manifest is left by a backup
+            # that did not finish.
+            partial_suffix = MANIFEST_SUFFIX + PARTIAL_SUFFIX
+            stale = []
+            try:
+                filenames = os.listdir(repository.snapshots_dir)
+            except OSError:
+                filenames = []
+            for filename in filenames:
+                name = filename[: -len(partial_suffix)]
+                if (
+                    not running
+                    and filename.endswith(partial_suffix)
+                    and SNAPSHOT_PATTERN.fullmatch(name)
+                ):
+                    stale.append(os.path.join(repository.snapshots_dir, filename))
+            self.remove_files(stale)
+
+            for name in names:
+                if name not in kept:
+                    self.remove_files([repository.manifest_path(name)])
+                    self.snapshots_removed += 1
+
+            if running:
+                print("A backup is running; chunks not removed.")
+                self.logger.add_log_entry(
+                    {
+                        "timestamp": int(time.time()),
+                        "result": ResultCodes.SUCCESS,
+                        "description": "A backup is running;"
+                        + " unused chunks were not removed.",
+                    }
+                )
+                return
+
+            reachable = set()
+            try:
+                for name in kept:
+                    for entry in repository.read_manifest(name):
+                        reachable.update(entry.get("chunks", ()))
+            except (OSError, EOFError, ValueError):
+                # without every kept manifest, a chunk in use could be removed
+                self.failed.append(repository.manifest_path(name))
+                return
+
+            try:
+                chunk_dirs = [
+                    entry.path
+                    for entry in os.scandir(repository.chunks_dir)
+                    if entry.is_dir(follow_symlinks=False)
+                ]
+            except OSError:
+                chunk_dirs = []
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="pruner") as pool:
+                for future in [
+                    pool.submit(self.sweep_chunks, chunk_dir, reachable)
+                    for chunk_dir in chunk_dirs
+                ]:
+                    future.result()
+        finally:
+            repository.release()
+
+    def sweep_chunks(self, chunk_dir: str, reachable: set[str]) -> None:
+        """
+        Remove the unused chunks in one chunk directory.
+
+        Parameters:
+            chunk_dir (str): the chunk directory.
+            reachable (set[str]): the chunks listed in the kept manifests.
+        """
+        try:
+            with os.scandir(chunk_dir) as entries:
+                unused = [
+                    entry.path for entry in entries if entry.name not in reachable
+                ]
+        except OSError:
+            with self.lock:
+                self.failed.append(chunk_dir)
+            return
+        self.remove_files(unused)
+
+    def log_results(self) -> None:
+        """Log the files that could not be removed and the space freed."""
+        for path in self.failed:
+            self.result = ResultCodes.FILE_NOT_REMOVED
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.FILE_NOT_REMOVED,
+                    "description": "Could not remove " + path + " while pruning.",
+                }
+            )
+        self.logger.add_log_entry(
+            {
+                "timestamp": int(time.time()),
+                "result": ResultCodes.SUCCESS,
+                "description": str(self.snapshots_removed)
+                + " snapshots pruned, "
+                + str(self.snapshots_kept)
+                + " kept.",
+            }
+        )
+        self.logger.add_log_entry(
+            {
+                "timestamp": int(time.time()),
+                "result": ResultCodes.SUCCESS,
+                "description": str(self.bytes_reclaimed)
+                + " bytes reclaimed by removing "
+                + str(self.items_removed)
+                + " files.",
+            }
+        )
+        if self.actions["verbose"]:
+            print(
+                self.snapshots_removed,
+                "snapshots pruned,",
+                self.snapshots_kept,
+                "kept.",
+            )
+            print(
+                self.bytes_reclaimed,
+                "bytes reclaimed by removing",
+                self.items_removed,
+                "files.",
+            )
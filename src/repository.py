@@ -0,0 +1,420 @@
+"""
+Keep the backup as a deduplicating repository of file chunks.
+
+File:       repository.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.1.2
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+from typing import Any, BinaryIO, Iterator
+
+from snapshots import PARTIAL_SUFFIX, SNAPSHOT_FORMAT, SNAPSHOT_PATTERN
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+file_name = "repository.py"
+file_version = "1.1.2"
+changes = {
+    "1.0.0": "Initial release",
+    "1.1.0": "Added the repository lock, held by a backup and a prune.",
+    "1.1.1": "Refuse to read a file that is not a regular file or a link.",
+    "1.1.2": "Name a snapshot started in the same second the next free second.",
+}
+
+MANIFEST_SUFFIX = ".manifest"
+""" Added to the snapshot name for the snapshot manifest file. """
+
+LOCK_NAME = "lock"
+""" The lock file in the repository. """
+
+ANCHOR_TABLE = bytes(
+    hashlib.blake2b(bytes([value]), digest_size=1).digest()[0] >> 7
+    for value in range(256)
+)
+""" Maps each byte value to 0 or 1 for finding the chunk boundaries. """
+
+
+class ChunkRepository:
+    """
+    A content addressed store of file chunks with a manifest per backup.
+
+    Files are split into chunks at boundaries set by their content, so
+    an insert or delete only changes the chunks around it. Each chunk
+    is stored once, named by its BLAKE2 hash, in 'chunks/<ab>/<hash>',
+    however many files or backups hold it. Each backup writes a
+    snapshot manifest, 'snapshots/<name>.manifest', a gzip file with a
+    line of JSON for each file giving its path, mode, size, modification
+    time and chunk hashes, or the target of a symbolic link.
+
+    A chunk boundary is set after the first run of RUN_LENGTH bytes
+    that all map to 1 in the ANCHOR_TABLE, at least MIN_CHUNK and at
+    most MAX_CHUNK bytes after the last boundary. The run is found with
+    'bytes.translate' and 'bytes.find', so the data is never looked at
+    a byte at a time in Python. The run depends only on the bytes
+    before the boundary, so the boundaries move with the data.
+
+    A file the same size and modification time as in the previous
+    snapshot is not read again; its chunks are taken from the previous
+    snapshot manifest.
+
+    Files may be stored by several threads at once.
+
+    A backup holds the repository lock from start() to finish(), and a
+    prune holds it while it removes chunks, so a prune never removes a
+    chunk a backup has just found, or is writing. The lock is released
+    by the system if the program ends.
+
+    Parameters:
+        location (str): the directory holding the repository.
+    """
+
+    MIN_CHUNK = 256 * 1024
+    """ The smallest chunk, except at the end of a file. """
+
+    MAX_CHUNK = 4 * 1024 * 1024
+    """ The largest chunk. """
+
+    RUN_LENGTH = 19
+    """ The run length marking a boundary, about 1 MiB between runs. """
+
+    def __init__(self, location: str) -> None:
+        """
+        Set the directory holding the repository.
+
+        Parameters:
+            location (str): the directory holding the repository.
+        """
+        self.location: str = str(location)
+        """ The directory holding the repository """
+        self.chunks_dir: str = os.path.join(self.location, "chunks")
+        """ The directory holding the chunks """
+        self.snapshots_dir: str = os.path.join(self.location, "snapshots")
+        """ The directory holding the snapshot manifests """
+        self.name: str = None
+        """ The name of the snapshot being written """
+        self.previous: dict[str, tuple[int, int, list[str]]] = {}
+        """ The size, mtime_ns and chunks by path, from the previous snapshot """
+        self.known_chunks: set[str] = set()
+        """ The chunks known to be in the repository """
+        self.manifest_file = None
+        """ The snapshot manifest being written """
+        self.lock_file = None
+        """ The open lock file while the repository lock is held """
+        self.lock: threading.Lock = threading.Lock()
+        """ Guards the manifest being written, the known chunks and counts """
+        self.files_unchanged: int = 0
+        """ The count of files taken from the previous snapshot """
+        self.chunks_written: int = 0
+        """ The count of new chunks written """
+        self.bytes_written: int = 0
+        """ The bytes in the new chunks """
+        self.chunks_reused: int = 0
+        """ The count of chunks read that were already in the repository """
+        self.bytes_reused: int = 0
+        """ The bytes in the chunks that were already in the repository """
+
+    def snapshot_names(self) -> list[str]:
+        """
+        Get the names of the complete snapshots.
+
+        Returns:
+            (list[str]) the snapshot names, oldest first.
+        """
+        try:
+            filenames = os.listdir(self.snapshots_dir)
+        except OSError:
+            return []
+        return sorted(
+            filename[: -len(MANIFEST_SUFFIX)]
+            for filename in filenames
+            if filename.endswith(MANIFEST_SUFFIX)
+            and SNAPSHOT_PATTERN.fullmatch(filename[: -len(MANIFEST_SUFFIX)])
+        )
+
+    def manifest_path(self, name: str) -> str:
+        """
+        Get the path of a snapshot manifest.
+
+        Parameters:
+            name (str): the snapshot name.
+
+        Returns:
+            (str) the manifest path.
+        """
+        return os.path.join(self.snapshots_dir, name + MANIFEST_SUFFIX)
+
+    def read_manifest(self, name: str) -> Iterator[dict[str, Any]]:
+        """
+        Read the entries of a snapshot manifest.
+
+        Parameters:
+            name (str): the snapshot name.
+
+        Yields:
+            (dict[str, Any]) the entry for each file.
+        """
+        with gzip.open(self.manifest_path(name), "rt", encoding="utf-8") as manifest:
+            for line in manifest:
+                yield json.loads(line)
+
+    def chunk_path(self, chunk_id: str) -> str:
+        """
+        Get the path of a chunk.
+
+        Parameters:
+            chunk_id (str): the chunk hash.
+
+        Returns:
+            (str) the chunk path.
+        """
+        return os.path.join(self.chunks_dir, chunk_id[:2], chunk_id)
+
+    def acquire(self, wait: bool = True) -> bool:
+        """
+        Take the repository lock.
+
+        Parameters:
+            wait (bool): wait for the lock if it is held, default is
+                True.
+
+        Returns:
+            (bool) True if the lock was taken, False if another program
+                holds it and 'wait' is False.
+        """
+        lock_file = open(os.path.join(self.location, LOCK_NAME), "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(
+                    lock_file.fileno(),
+                    fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB,
+                )
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(
+                    lock_file.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1
+                )
+        except OSError:
+            lock_file.close()
+            if wait:
+                raise
+            return False
+        self.lock_file = lock_file
+        return True
+
+    def release(self) -> None:
+        """Release the repository lock, if held."""
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def start(self, timestamp: int) -> None:
+        """
+        Start a new snapshot, holding the repository lock.
+
+        As for the snapshots of a copy, a snapshot that would not be named
+        after the latest one is named for the next free second.
+
+        Parameters:
+            timestamp (int): the time the backup started.
+        """
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        self.acquire()
+        names = self.snapshot_names()
+        if names:
+            for entry in self.read_manifest(names[-1]):
+                if "chunks" in entry:
+                    self.previous[entry["path"]] = (
+                        entry["size"],
+                        entry["mtime_ns"],
+                        entry["chunks"],
+                    )
+        self.name = time.strftime(SNAPSHOT_FORMAT, time.gmtime(timestamp))
+        while names and self.name <= names[-1]:
+            timestamp += 1
+            self.name = time.strftime(SNAPSHOT_FORMAT, time.gmtime(timestamp))
+        self.manifest_file = gzip.open(
+            self.manifest_path(self.name) + PARTIAL_SUFFIX, "wt", encoding="utf-8"
+        )
+
+    def finish(self) -> str:
+        """
+        Complete the snapshot being written and release the lock.
+
+        Returns:
+            (str) the snapshot name.
+        """
+        partial_path = self.manifest_path(self.name) + PARTIAL_SUFFIX
+        with self.lock:
+            self.manifest_file.close()
+            self.manifest_file = None
+        with open(partial_path, "rb") as manifest:
+            os.fsync(manifest.fileno())
+        os.replace(partial_path, self.manifest_path(self.name))
+        self.release()
+        return self.name
+
+    def add_entry(self, entry: dict[str, Any]) -> None:
+        """
+        Add a file to the snapshot manifest being written.
+
+        Parameters:
+            entry (dict[str, Any]): the manifest entry.
+        """
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self.lock:
+            self.manifest_file.write(line)
+
+    def store(self, source_path: str, path: str, source_stat: os.stat_result) -> bool:
+        """
+        Store a file in the snapshot being written.
+
+        Parameters:
+            source_path (str): the file to store.
+            path (str): the file's path in the snapshot.
+            source_stat (os.stat_result): the status of the file.
+
+        Returns:
+            (bool) True if the file was read, False if it was unchanged
+                since the previous snapshot.
+
+        Raises:
+            shutil.SpecialFileError: if the file is not a regular file
+                or a symbolic link.
+        """
+        source_mode = os.lstat(source_path).st_mode
+        if stat.S_ISLNK(source_mode):
+            self.add_entry(
+                {
+                    "path": path,
+                    "mode": os.lstat(source_path).st_mode,
+                    "target": os.readlink(source_path),
+                }
+            )
+            return True
+        if not stat.S_ISREG(source_mode):
+            raise shutil.SpecialFileError(
+                "`" + str(source_path) + "` is not a regular file"
+            )
+
+        previous = self.previous.get(path)
+        if (
+            previous is not None
+            and previous[0] == source_stat.st_size
+            and previous[1] == source_stat.st_mtime_ns
+        ):
+            chunk_ids = previous[2]
+            size = source_stat.st_size
+            with self.lock:
+                self.files_unchanged += 1
+            changed = False
+        else:
+            chunk_ids = []
+            size = 0
+            with open(source_path, "rb") as source:
+                for chunk in self.chunks(source):
+                    chunk_ids.append(self.store_chunk(chunk))
+                    size += len(chunk)
+            changed = True
+
+        self.add_entry(
+            {
+                "path": path,
+                "mode": stat.S_IMODE(source_stat.st_mode) | stat.S_IFREG,
+                "size": size,
+                "mtime_ns": source_stat.st_mtime_ns,
+                "chunks": chunk_ids,
+            }
+        )
+        return changed
+
+    def store_chunk(self, data: bytes) -> str:
+        """
+        Store a chunk, unless it is already in the repository.
+
+        Parameters:
+            data (bytes): the chunk data.
+
+        Returns:
+            (str) the chunk hash.
+        """
+        chunk_id = hashlib.blake2b(data, digest_size=32).hexdigest()
+        chunk_path = self.chunk_path(chunk_id)
+        with self.lock:
+            known = chunk_id in self.known_chunks
+        if known or os.path.exists(chunk_path):
+            with self.lock:
+                self.known_chunks.add(chunk_id)
+                self.chunks_reused += 1
+                self.bytes_reused += len(data)
+            return chunk_id
+
+        # write under a name of its own, another thread may be writing
+        # the same chunk.
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        temp_path = chunk_path + "." + str(threading.get_ident()) + ".tmp"
+        with open(temp_path, "wb") as chunk_file:
+            chunk_file.write(data)
+            chunk_file.flush()
+            os.fsync(chunk_file.fileno())
+        os.replace(temp_path, chunk_path)
+        with self.lock:
+            self.known_chunks.add(chunk_id)
+            self.chunks_written += 1
+            self.bytes_written += len(data)
+        return chunk_id
+
+    def chunks(self, source: BinaryIO) -> Iterator[bytes]:
+        """
+        Split a file into chunks at content defined boundaries.
+
+        Parameters:
+            source (BinaryIO): the open file.
+
+        Yields:
+            (bytes) each chunk of the file.
+        """
+        buffer = bytearray()
+        at_end = False
+        while not at_end:
+            data = source.read(self.MAX_CHUNK)
+            at_end = not data
+            buffer += data
+            while len(buffer) >= self.MAX_CHUNK or (at_end and buffer):
+                cut = self.find_boundary(buffer)
+                yield bytes(buffer[:cut])
+                del buffer[:cut]
+
+    def find_boundary(self, buffer: bytearray) -> int:
+        """
+        Find the end of the next chunk.
+
+        Parameters:
+            buffer (bytearray): the data from the start of the chunk.
+
+        Returns:
+            (int) the chunk length.
+        """
+        end = min(len(buffer), self.MAX_CHUNK)
+        if end <= self.MIN_CHUNK:
+            return end
+        start = self.MIN_CHUNK - self.RUN_LENGTH
+        mapped = buffer[start:end].translate(ANCHOR_TABLE)
+        position = mapped.find(b"\x01" * self.RUN_LENGTH)
+        if position < 0:
+            return end
+        return start + position + self.RUN_LENGTH
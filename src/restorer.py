@@ -0,0 +1,811 @@
+"""
+Restore files from the backup as they were at a point in time.
+
+File:       restorer.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.6
+"""
+
+import datetime
+import os
+import sqlite3
+import stat
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterable, Iterator
+
+from bundle import INDEX_NAME, PACK_NAME, Bundle
+from compressor import SUFFIXES, open_compressed
+from default_config import config_option
+from delta_copier import DeltaCopier
+from lbk_library.gui import Settings
+from logger import Logger
+from manifest import Manifest
+from repository import ChunkRepository
+from result_codes import ResultCodes
+from scanner import Scanner
+from snapshots import SNAPSHOT_FORMAT, Snapshots
+from sweeper import TOMBSTONE_DIR
+
+file_name = "restorer.py"
+file_version = "1.0.6"
+changes = {
+    "1.0.0": "Initial release",
+    "1.0.1": "Restore a file as it is when the name without its compression"
+    + " suffix is also a backup copy.",
+    "1.0.2": "Restore the files ending in '.tmp' that are not the backup's own"
+    + " temporary files.",
+    "1.0.3": "Fail a bundled file that the pack holds only part of, and a"
+    + " bundle whose index does not match its pack.",
+    "1.0.4": "Log a restore path that is not in the backup as not restored.",
+    "1.0.5": "Restore a file copied on its own rather than its copy in a bundle.",
+    "1.0.6": "Refuse a full restore path outside the source, and note that a"
+    + " restore time has no effect on a mirror.",
+}
+
+BUFFER_SIZE = 1024 * 1024
+""" The size of each read of a backup copy. """
+
+SPARSE_BLOCK = 64 * 1024
+""" Blocks of zeros this size are left as holes in a restored file. """
+
+ZERO_BLOCK = bytes(SPARSE_BLOCK)
+""" A block of zeros to compare the data with. """
+
+MTIME_OFFSET_NS = 2_000_000_000
+""" The backup copies are dated 2 seconds after their files. """
+
+TEMP_SUFFIX = ".restoring"
+""" Added to the name of a file while it is restored. """
+
+
+def write_sparse(blocks: Iterable[bytes], path: str) -> int:
+    """
+    Write data to a new file, leaving the blocks of zeros as holes.
+
+    Each SPARSE_BLOCK of zeros is skipped over rather than written, and
+    the file is then set to its full size, so the parts of a sparse
+    file that were holes take no space once restored.
+
+    Parameters:
+        blocks (Iterable[bytes]): the file data, in order.
+        path (str): the file to write; it is created or emptied.
+
+    Returns:
+        (int) the size of the file written.
+    """
+    offset = 0
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        for block in blocks:
+            view = memoryview(block)
+            for start in range(0, len(view), SPARSE_BLOCK):
+                piece = view[start : start + SPARSE_BLOCK]
+                if piece != ZERO_BLOCK[: len(piece)]:
+                    written = 0
+                    while written < len(piece):
+                        written += os.pwrite(
+                            fd, piece[written:], offset + start + written
+                        )
+            offset += len(view)
+        os.ftruncate(fd, offset)
+    finally:
+        os.close(fd)
+    return offset
+
+
+def read_blocks(a_file: BinaryIO) -> Iterator[bytes]:
+    """
+    Read a file in blocks.
+
+    Parameters:
+        a_file (BinaryIO): the open file.
+
+    Yields:
+        (bytes) each block of the file.
+    """
+    while data := a_file.read(BUFFER_SIZE):
+        yield data
+
+
+class Restorer:
+    """
+    Restore files from the backup as they were at a point in time.
+
+    A subtree of the source, or all of it, is restored from the backup
+    taken at or before the point in time: the snapshot or repository
+    snapshot of that time, or the mirror, which only holds the latest
+    backup. The files are restored to where they were, or under another
+    directory.
+
+    The files are read back and written by a pool of threads while the
+    backup is walked. Compressed copies are expanded and the files
+    packed in bundles are taken from the pack. Blocks of zeros are left
+    as holes, so sparse files stay sparse, and each file gets back its
+    modification time and permissions. A file is written to a temporary
+    name and renamed into place when complete; a file already the same
+    size and time as its backup copy is left as it is.
+
+    Parameters:
+        config (Settings): the configuration.
+        logger (Logger): the result logger for the database.
+        actions (dict[str, bool]): the required actions, with the
+            "restore_path", "restore_time" and "restore_to" values.
+    """
+
+    PENDING_PER_WORKER = 4
+    """ The files waiting to be restored for each worker. """
+
+    def __init__(
+        self, config: Settings, logger: Logger, actions: dict[str, bool]
+    ) -> None:
+        """
+        Restore the files selected by the actions.
+
+        Parameters:
+            config (Settings): the configuration.
+            logger (Logger): the result logger for the database.
+            actions (dict[str, bool]): the required actions.
+        """
+        self.config: Settings = config
+        """ The configuration """
+        self.logger: Logger = logger
+        """ The result logger for the database """
+        self.actions: dict[str, bool] = actions
+        """ The list of actions directed """
+        self.workers: int = max(1, config_option(config, "restore_workers"))
+        """ The number of threads restoring files """
+        self.result: int = ResultCodes.SUCCESS
+        """ The overall result of the restore, from ResultCodes """
+        self.lock: threading.Lock = threading.Lock()
+        """ Guards the counts and failures updated by the threads """
+        self.pending: deque[Future] = deque()
+        """ The files being restored by the threads """
+        self.files_restored: int = 0
+        """ The count of the files restored """
+        self.bytes_restored: int = 0
+        """ The bytes written to the files restored """
+        self.files_current: int = 0
+        """ The count of the files already the same as their backup copy """
+        self.failed: list[str] = []
+        """ The files that could not be restored """
+        self.elapsed: float = 0.0
+        """ The seconds taken to restore the files """
+        self.snapshot: str = None
+        """ The snapshot restored from, None for a mirror """
+
+        source = str(config.value("start_dir") or "")
+        self.subtree: str = self.relative_path(actions.get("restore_path"), source)
+        """ The part of the source to restore, relative to the source """
+        self.target: str = os.path.join(
+            actions.get("restore_to") or source, self.subtree
+        ).rstrip(os.sep)
+        """ Where the subtree is restored to """
+        self.suffixes: list[str] = []
+        """ The suffixes of compressed backup copies """
+        if config_option(config, "compression"):
+            self.suffixes = list(SUFFIXES.values())
+        self.manifest: Manifest = None
+        """ The record of the files backed up, None if not available """
+
+        location = config.value("backup_location")
+        layout = config_option(config, "backup_layout")
+        if not location or not os.path.isdir(location):
+            print(" Could not access the Extrernal Storage Drive ")
+            self.log_problem(
+                ResultCodes.NO_EXTERNAL_STORAGE,
+                " Could not access the Extrernal Storage Drive ",
+            )
+            return
+        try:
+            point = self.parse_time(actions.get("restore_time"))
+        except ValueError:
+            self.log_problem(
+                ResultCodes.NO_SNAPSHOT,
+                "Cannot read the restore time " + str(actions.get("restore_time")),
+            )
+            return
+        if self.subtree == os.pardir or self.subtree.startswith(os.pardir + os.sep):
+            self.log_problem(
+                ResultCodes.FILE_NOT_RESTORED,
+                "Cannot restore "
+                + str(actions.get("restore_path"))
+                + ", it is not in the backup.",
+            )
+            return
+        if layout == "mirror" and point is not None:
+            # a mirror holds only the files as at the latest backup
+            description = (
+                "The restore time "
+                + str(actions.get("restore_time"))
+                + " has no effect on a mirror; the latest backup is restored."
+            )
+            print(description)
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.SUCCESS,
+                    "description": description,
+                }
+            )
+
+        start = time.monotonic()
+        found = False
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="restorer") as pool:
+            if layout == "repository":
+                repository = ChunkRepository(location)
+                self.snapshot = self.select_snapshot(repository.snapshot_names(), point)
+                if self.snapshot is not None:
+                    found = self.restore_repository(pool, repository)
+            elif layout == "snapshot":
+                self.snapshot = self.select_snapshot(Snapshots(location).names(), point)
+                if self.snapshot is not None:
+                    found = self.restore_tree(
+                        pool, os.path.join(location, self.snapshot)
+                    )
+            else:
+                found = self.restore_tree(pool, location)
+            for future in self.pending:
+                future.result()
+        if self.manifest is not None:
+            self.manifest.close()
+        self.elapsed = time.monotonic() - start
+        if layout != "mirror" and self.snapshot is None:
+            self.log_problem(
+                ResultCodes.NO_SNAPSHOT,
+                "No backup found at or before the restore time.",
+            )
+            return
+        if not found:
+            self.log_problem(
+                ResultCodes.FILE_NOT_RESTORED,
+                "Cannot restore "
+                + str(actions.get("restore_path"))
+                + ", it is not in the backup.",
+            )
+            return
+        self.log_results()
+
+    @staticmethod
+    def relative_path(path: str, source: str) -> str:
+        """
+        Get the path of the subtree to restore, relative to the source.
+
+        Parameters:
+            path (str): the subtree, relative to the source or a full
+                path in it; empty for the whole source.
+            source (str): the source directory backed up.
+
+        Returns:
+            (str) the relative path, "" for the whole source; a path
+                outside the source starts with os.pardir.
+        """
+        if not path:
+            return ""
+        path = os.path.normpath(str(path))
+        if os.path.isabs(path):
+            try:
+                path = os.path.relpath(path, os.path.normpath(source))
+            except ValueError:
+                return os.pardir  # no source, or on another drive
+        return "" if path == os.curdir else path
+
+    @staticmethod
+    def parse_time(text: str) -> float | None:
+        """
+        Read the point in time to restore.
+
+        Parameters:
+            text (str): a local date and time such as "2025-06-01" or
+                "2025-06-01 14:30"; empty for the latest backup.
+
+        Returns:
+            (float | None) the time, None for the latest backup.
+
+        Raises:
+            ValueError: if the time cannot be read.
+        """
+        if not text:
+            return None
+        when = datetime.datetime.fromisoformat(str(text))
+        if len(str(text)) <= len("YYYY-MM-DD"):
+            when += datetime.timedelta(days=1, microseconds=-1)  # the whole day
+        return when.timestamp()
+
+    @staticmethod
+    def select_snapshot(names: list[str], point: float | None) -> str | None:
+        """
+        Select the latest snapshot taken at or before a time.
+
+        Parameters:
+            names (list[str]): the snapshot names, oldest first.
+            point (float | None): the time, None for the latest.
+
+        Returns:
+            (str | None) the snapshot name, None if there is none.
+        """
+        if point is not None:
+            latest = time.strftime(SNAPSHOT_FORMAT, time.gmtime(point))
+            names = [name for name in names if name <= latest]
+        return names[-1] if names else None
+
+    def submit(self, pool: ThreadPoolExecutor, method: Callable, *arguments) -> None:
+        """
+        Hand a file to the threads, waiting if too many are waiting.
+
+        Parameters:
+            pool (ThreadPoolExecutor): the threads restoring files.
+            method (Callable): the method restoring the file.
+            arguments: the arguments for the method.
+        """
+        self.pending.append(pool.submit(method, *arguments))
+        while len(self.pending) > self.workers * self.PENDING_PER_WORKER:
+            self.pending.popleft().result()
+
+    def restore_tree(self, pool: ThreadPoolExecutor, tree: str) -> bool:
+        """
+        Restore the subtree from a mirror or snapshot directory.
+
+        Parameters:
+            pool (ThreadPoolExecutor): the threads restoring files.
+            tree (str): the mirror or snapshot directory.
+
+        Returns:
+            (bool) True if the subtree is in the backup.
+        """
+        top = os.path.join(tree, self.subtree).rstrip(os.sep)
+        self.manifest = self.open_manifest(tree)
+        if not os.path.isdir(top) or os.path.islink(top):
+            # a single file, perhaps compressed or in a bundle
+            backup_dir = os.path.dirname(top)
+            try:
+                with os.scandir(backup_dir) as entries:
+                    files = [entry for entry in entries if not entry.is_dir()]
+            except OSError:
+                files = []
+            if files:
+                os.makedirs(os.path.dirname(self.target), exist_ok=True)
+            return (
+                self.restore_files(
+                    pool,
+                    backup_dir,
+                    os.path.dirname(self.target),
+                    files,
+                    os.path.basename(top),
+                )
+                > 0
+            )
+
+        tombstones = os.path.join(tree, TOMBSTONE_DIR)
+        scanner = Scanner(top, lambda path: path == tombstones, workers=1)
+        for current_dir, subdirs, files in scanner.scan():
+            target_dir = os.path.join(self.target, os.path.relpath(current_dir, top))
+            target_dir = os.path.normpath(target_dir)
+            try:
+                os.makedirs(target_dir, exist_ok=True)
+            except OSError:
+                self.failed.append(target_dir)
+                continue
+            # links to directories are listed with the subdirectories
+            links = []
+            if subdirs:
+                with os.scandir(current_dir) as entries:
+                    links = [
+                        entry
+                        for entry in entries
+                        if entry.name in subdirs and entry.is_symlink()
+                    ]
+            self.restore_files(pool, current_dir, target_dir, files + links)
+        return True
+
+    def restore_files(
+        self,
+        pool: ThreadPoolExecutor,
+        backup_dir: str,
+        target_dir: str,
+        files: list[os.DirEntry],
+        wanted: str = None,
+    ) -> int:
+        """
+        Restore the files of one backup directory.
+
+        Parameters:
+            pool (ThreadPoolExecutor): the threads restoring files.
+            backup_dir (str): the backup directory.
+            target_dir (str): the directory to restore the files to.
+            files (list[os.DirEntry]): the entries of the backup copies.
+            wanted (str): the name of the only file to restore, default
+                is None, restore them all.
+
+        Returns:
+            (int) the count of the files restored or already current.
+        """
+        names = {entry.name for entry in files}
+        count = 0
+        recorded = set()
+        if self.manifest is not None:
+            recorded = set(self.manifest.names(backup_dir))
+        copied = set()
+        for entry in files:
+            name = entry.name
+            if name in (PACK_NAME, INDEX_NAME) or DeltaCopier.is_sidecar(name):
+                continue
+            if self.is_temp_name(name, recorded):
+                continue
+            restored_name, opener = self.restored_name(name, recorded, names)
+            copied.add(restored_name)
+            if wanted is None or restored_name == wanted:
+                count += 1
+                self.submit(
+                    pool,
+                    self.restore_copy,
+                    entry.path,
+                    os.path.join(target_dir, restored_name),
+                    opener,
+                )
+        if PACK_NAME in names:
+            bundle = Bundle(backup_dir)
+            if not bundle.entries and wanted is None:
+                # the index is missing or does not match the pack
+                with self.lock:
+                    self.failed.append(os.path.join(target_dir, PACK_NAME))
+            for member in sorted(bundle.entries):
+                # a file copied on its own is newer than its bundled copy
+                if member not in copied and (wanted is None or member == wanted):
+                    count += 1
+                    self.submit(
+                        pool,
+                        self.restore_bundled,
+                        bundle,
+                        member,
+                        os.path.join(target_dir, member),
+                    )
+        return count
+
+    def is_temp_name(self, name: str, recorded: set[str]) -> bool:
+        """
+        Check if a name is one of the files the backup writes for a time.
+
+        These are a file being restored, the temporary pack and index of
+        a bundle, the temporary block checksums of a copy and a copy
+        being compressed. Other files ending in '.tmp' are backup copies.
+
+        Parameters:
+            name (str): the name of the file in the backup directory.
+            recorded (set[str]): the file names the manifest records in
+                the directory, empty if not known.
+
+        Returns:
+            (bool) True if the file is not a backup copy.
+        """
+        if name.endswith(TEMP_SUFFIX):
+            return True
+        if not name.endswith(".tmp") or name in recorded:
+            return False
+        base_name = name[: -len(".tmp")]
+        return (
+            base_name in (PACK_NAME, INDEX_NAME)
+            or DeltaCopier.is_sidecar(base_name)
+            or any(base_name.endswith(suffix) for suffix in SUFFIXES.values())
+        )
+
+    def restored_name(
+        self, name: str, recorded: set[str], names: set[str] = frozenset()
+    ) -> tuple[str, Callable | None]:
+        """
+        Get the name of the file a backup copy restores.
+
+        A name with a compression suffix is a compressed copy unless the
+        manifest records a file of that name, as a file that was already
+        compressed is copied as it is, or the name without the suffix is
+        also a backup copy, as a file whose compressed name is another
+        file is copied as it is.
+
+        Parameters:
+            name (str): the name of the backup copy.
+            recorded (set[str]): the file names the manifest records in
+                the directory, empty if not known.
+            names (set[str]): the names of the backup copies in the
+                directory, default is none.
+
+        Returns:
+            (tuple[str, Callable | None]) the file name, and the opener
+                for a compressed copy or None.
+        """
+        if name in recorded:
+            return name, None
+        for suffix in self.suffixes:
+            if (
+                name.endswith(suffix)
+                and len(name) > len(suffix)
+                and name[: -len(suffix)] not in names
+            ):
+                return name[: -len(suffix)], open_compressed
+        return name, None
+
+    def open_manifest(self, tree: str) -> Manifest:
+        """
+        Open the manifest of the files backed up, if it describes the tree.
+
+        Parameters:
+            tree (str): the mirror or snapshot directory restored from.
+
+        Returns:
+            (Manifest) the manifest with its records relative to the tree,
+                or None if there is none.
+        """
+        log_path = self.config.value("log_path")
+        log_name = self.config.value("log_name")
+        if not log_path or not log_name:
+            return None
+        manifest_path = os.path.join(
+            log_path, os.path.splitext(log_name)[0] + ".manifest"
+        )
+        if not os.path.isfile(manifest_path):
+            return None
+        try:
+            manifest = Manifest(
+                manifest_path,
+                self.config.value("start_dir"),
+                self.config.value("backup_location"),
+                config_option(self.config, "backup_layout"),
+            )
+        except (OSError, sqlite3.Error):
+            return None
+        manifest.root = tree
+        return manifest
+
+    def restore_copy(
+        self, backup_path: str, target_path: str, opener: Callable = None
+    ) -> None:
+        """
+        Restore a file from its backup copy in a mirror or snapshot.
+
+        Parameters:
+            backup_path (str): the backup copy.
+            target_path (str): the file to restore.
+            opener (Callable): opens a compressed copy; default is None,
+                the copy is not compressed.
+        """
+        temp_path = target_path + TEMP_SUFFIX
+        try:
+            copy_stat = os.lstat(backup_path)
+            if stat.S_ISLNK(copy_stat.st_mode):
+                if os.path.lexists(temp_path):
+                    os.unlink(temp_path)
+                os.symlink(os.readlink(backup_path), temp_path)
+                os.replace(temp_path, target_path)
+                self.count_restored(0)
+                return
+            mtime_ns = copy_stat.st_mtime_ns - MTIME_OFFSET_NS
+            size = None if opener else copy_stat.st_size
+            if self.is_current(target_path, size, mtime_ns):
+                return
+            a_file = open(backup_path, "rb") if opener is None else opener(backup_path)
+            with a_file:
+                size = write_sparse(read_blocks(a_file), temp_path)
+            self.finish_file(temp_path, target_path, copy_stat.st_mode, mtime_ns)
+            self.count_restored(size)
+        except Exception:
+            self.restore_failed(temp_path, target_path)
+
+    def restore_bundled(self, bundle: Bundle, name: str, target_path: str) -> None:
+        """
+        Restore a file packed in a bundle.
+
+        Parameters:
+            bundle (Bundle): the bundle holding the file.
+            name (str): the name of the file.
+            target_path (str): the file to restore.
+        """
+        temp_path = target_path + TEMP_SUFFIX
+        entry = bundle.entries[name]
+        try:
+            if self.is_current(target_path, entry["size"], entry["mtime_ns"]):
+                return
+            if bundle.extract(name, temp_path) != entry["size"]:
+                raise OSError("The pack is shorter than its index.")
+            os.replace(temp_path, target_path)
+            self.count_restored(entry["size"])
+        except Exception:
+            self.restore_failed(temp_path, target_path)
+
+    def restore_repository(
+        self, pool: ThreadPoolExecutor, repository: ChunkRepository
+    ) -> bool:
+        """
+        Restore the subtree from a repository snapshot.
+
+        Parameters:
+            pool (ThreadPoolExecutor): the threads restoring files.
+            repository (ChunkRepository): the repository.
+
+        Returns:
+            (bool) True if the subtree is in the snapshot.
+        """
+        prefix = self.subtree + os.sep if self.subtree else ""
+        made_dirs = set()
+        found = not self.subtree
+        for entry in repository.read_manifest(self.snapshot):
+            path = entry["path"]
+            if self.subtree and path != self.subtree and not path.startswith(prefix):
+                continue
+            found = True
+            target_path = os.path.join(self.target, path[len(prefix) :])
+            if path == self.subtree:
+                target_path = self.target
+            target_dir = os.path.dirname(target_path)
+            if target_dir not in made_dirs:
+                try:
+                    os.makedirs(target_dir, exist_ok=True)
+                except OSError:
+                    self.failed.append(target_dir)
+                    continue
+                made_dirs.add(target_dir)
+            self.submit(pool, self.restore_chunks, repository, entry, target_path)
+        return found
+
+    def restore_chunks(
+        self, repository: ChunkRepository, entry: dict, target_path: str
+    ) -> None:
+        """
+        Restore a file from its chunks in the repository.
+
+        Parameters:
+            repository (ChunkRepository): the repository.
+            entry (dict): the snapshot manifest entry for the file.
+            target_path (str): the file to restore.
+        """
+        temp_path = target_path + TEMP_SUFFIX
+        try:
+            if "target" in entry:
+                if os.path.lexists(temp_path):
+                    os.unlink(temp_path)
+                os.symlink(entry["target"], temp_path)
+                os.replace(temp_path, target_path)
+                self.count_restored(0)
+                return
+            if self.is_current(target_path, entry["size"], entry["mtime_ns"]):
+                return
+
+            def chunks() -> Iterator[bytes]:
+                for chunk_id in entry["chunks"]:
+                    with open(repository.chunk_path(chunk_id), "rb") as chunk:
+                        yield chunk.read()
+
+            size = write_sparse(chunks(), temp_path)
+            self.finish_file(temp_path, target_path, entry["mode"], entry["mtime_ns"])
+            self.count_restored(size)
+        except Exception:
+            self.restore_failed(temp_path, target_path)
+
+    def is_current(self, target_path: str, size: int | None, mtime_ns: int) -> bool:
+        """
+        Check if a file is already the same as its backup copy, counting it.
+
+        Parameters:
+            target_path (str): the file to restore.
+            size (int | None): the size of the file backed up, None if
+                not known.
+            mtime_ns (int): the modification time of the file backed up.
+
+        Returns:
+            (bool) True if the file need not be restored.
+        """
+        try:
+            target_stat = os.lstat(target_path)
+        except OSError:
+            return False
+        current = (
+            stat.S_ISREG(target_stat.st_mode)
+            and target_stat.st_mtime_ns == mtime_ns
+            and size is not None
+            and target_stat.st_size == size
+        )
+        if current:
+            with self.lock:
+                self.files_current += 1
+        return current
+
+    @staticmethod
+    def finish_file(temp_path: str, target_path: str, mode: int, mtime_ns: int) -> None:
+        """
+        Set the permissions and time of a restored file and put it in place.
+
+        Parameters:
+            temp_path (str): the file written.
+            target_path (str): the file restored.
+            mode (int): the file mode of the file backed up.
+            mtime_ns (int): the modification time of the file backed up.
+        """
+        os.chmod(temp_path, stat.S_IMODE(mode))
+        os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+        os.replace(temp_path, target_path)
+
+    def count_restored(self, size: int) -> None:
+        """
+        Count a file restored.
+
+        Parameters:
+            size (int): the bytes written.
+        """
+        with self.lock:
+            self.files_restored += 1
+            self.bytes_restored += size
+
+    def restore_failed(self, temp_path: str, target_path: str) -> None:
+        """
+        Record a file that could not be restored, removing what was written.
+
+        Parameters:
+            temp_path (str): the file being written.
+            target_path (str): the file restored.
+        """
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        with self.lock:
+            self.failed.append(target_path)
+        if self.actions["verbose"]:
+            print("Restore of file", target_path, "failed.")
+
+    def log_problem(self, result: int, description: str) -> None:
+        """
+        Log a problem that stops the restore.
+
+        Parameters:
+            result (int): the result code, from ResultCodes.
+            description (str): the problem.
+        """
+        self.result = result
+        self.logger.add_log_entry(
+            {
+                "timestamp": int(time.time()),
+                "result": result,
+                "description": description,
+            }
+        )
+        if self.actions["verbose"]:
+            print(description)
+
+    def log_results(self) -> None:
+        """Log the files that could not be restored and the throughput."""
+        for path in self.failed:
+            self.result = ResultCodes.FILE_NOT_RESTORED
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.FILE_NOT_RESTORED,
+                    "description": "Restore of file " + path + " failed.",
+                }
+            )
+        rate = self.bytes_restored / max(self.elapsed, 0.001) / (1024 * 1024)
+        description = (
+            str(self.files_restored)
+            + " files, "
+            + str(self.bytes_restored)
+            + " bytes, restored to "
+            + self.target
+            + (" from " + self.snapshot if self.snapshot else "")
+            + " in "
+            + "{:.1f}".format(self.elapsed)
+            + " seconds, "
+            + "{:.1f}".format(rate)
+            + " MiB/s; "
+            + str(self.files_current)
+            + " files already current."
+        )
+        self.logger.add_log_entry(
+            {
+                "timestamp": int(time.time()),
+                "result": ResultCodes.SUCCESS,
+                "description": description,
+            }
+        )
+        if self.actions["verbose"]:
+            print(description)
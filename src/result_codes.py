@@ -31,3 +31,24 @@ class ResultCodes:
 
     NO_EXTERNAL_STORAGE = 6
     """Could not access the External Storage Drive."""
+
+    FILE_NOT_REMOVED = 7
+    """File or directory could not be removed while pruning old backups."""
+
+    FILE_NOT_VERIFIED = 8
+    """The backup copy of a file did not match the data copied."""
+
+    FILE_CORRUPTED = 9
+    """A backup copy no longer matches its hash when checked (--verify)."""
+
+    FILE_MISSING = 10
+    """A backup copy recorded in the manifest is missing (--verify)."""
+
+    FILE_NOT_READ = 11
+    """A backup copy could not be read when checked (--verify)."""
+
+    FILE_NOT_RESTORED = 12
+    """A file could not be restored from the backup (--restore)."""
+
+    NO_SNAPSHOT = 13
+    """No backup was found at or before the restore time (--restore)."""
@@ -0,0 +1,250 @@
+"""
+Scan a directory tree for the files to be backed up.
+
+File:       scanner.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.2.1
+"""
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator
+
+file_name = "scanner.py"
+file_version = "1.2.1"
+changes = {
+    "1.0.0": "Initial release",
+    "1.1.0": "Prune excluded directories during the walk; seed the walk"
+    + " with the included directories inside pruned subtrees.",
+    "1.2.0": "Read directories ahead of the walk with a pool of threads.",
+    "1.2.1": "Walk a seed inside another seed only through the outer seed.",
+}
+
+
+class Scanner:
+    """
+    Walk a directory tree using 'os.scandir'.
+
+    This is a replacement for 'os.walk' that hands back the directory
+    entries for the files rather than just their names. The entries
+    carry the file type and, once asked for, the file status from the
+    directory read, so the rest of the backup does not need to query
+    the file system again for each file.
+
+    Excluded directories are cut out of the walk as soon as they are
+    seen, so nothing below them is read. Directories that must be
+    backed up even though they sit inside an excluded directory are
+    given as seeds and are walked when their excluded parent is cut.
+
+    With more than one worker, the directories next in line to be
+    walked are read, and their files' status fetched, by a pool of
+    threads while the caller handles the current directory. The
+    directories are still handed back one at a time in the same order
+    as a single threaded walk, and all counting is done by the caller's
+    thread.
+
+    Parameters:
+        source (str): the top of the directory tree to scan.
+        is_excluded (Callable[[str], bool]): tests if a directory path
+            is excluded, default is None, nothing is excluded.
+        seeds (list[str]): the directories to walk even if they are
+            inside an excluded directory, default is None.
+        workers (int): the number of threads reading directories,
+            default is 1, no extra threads.
+    """
+
+    READ_AHEAD = 4
+    """ The number of directories read ahead for each worker. """
+
+    def __init__(
+        self,
+        source: str,
+        is_excluded: Callable[[str], bool] = None,
+        seeds: list[str] = None,
+        workers: int = 1,
+    ) -> None:
+        """
+        Set the top of the directory tree to scan.
+
+        Parameters:
+            source (str): the top of the directory tree to scan.
+            is_excluded (Callable[[str], bool]): tests if a directory
+                path is excluded, default is None.
+            seeds (list[str]): the directories to walk even if they are
+                inside an excluded directory, default is None.
+            workers (int): the number of threads reading directories,
+                default is 1.
+        """
+        self.source: str = str(source)
+        """ The top of the directory tree """
+        self.is_excluded: Callable[[str], bool] = is_excluded
+        """ Test if a directory is excluded from the walk """
+        self.seeds: list[str] = sorted({os.path.normpath(seed) for seed in seeds or []})
+        """ The included directories to walk inside excluded directories """
+        self.workers: int = workers
+        """ The number of threads reading directories """
+        self.directories_pruned: int = 0
+        """ The count of the excluded directories cut from the walk """
+
+    def scan(self) -> Iterator[tuple[str, list[str], list[os.DirEntry]]]:
+        """
+        Walk the directory tree, top down.
+
+        Like 'os.walk', symbolic links to directories are listed with
+        the subdirectories but are not followed, and directories that
+        cannot be read are skipped. Excluded directories are left out
+        of the subdirectories.
+
+        Yields:
+            (tuple[str, list[str], list[os.DirEntry]]) the current
+                directory, the names of its subdirectories and the
+                directory entries of its files.
+        """
+        if self.workers > 1:
+            yield from self.scan_parallel()
+            return
+
+        stack = [self.source]
+        while stack:
+            current_dir = stack.pop()
+            listing = self.read_dir(current_dir)
+            if listing is None:
+                continue
+            subdirs, walk_dirs, files, pruned = listing
+            self.directories_pruned += pruned
+            yield current_dir, subdirs, files
+
+            # push in reverse so the subdirectories come off in order.
+            for subdir in reversed(walk_dirs):
+                stack.append(subdir)
+
+    def scan_parallel(self) -> Iterator[tuple[str, list[str], list[os.DirEntry]]]:
+        """
+        Walk the directory tree, top down, reading ahead with threads.
+
+        The walk order is kept by a stack as for the single threaded
+        walk. The directories nearest the top of the stack, the next to
+        be walked, are handed to the thread pool to be read, up to
+        READ_AHEAD directories per worker so memory use stays bounded.
+
+        Yields:
+            (tuple[str, list[str], list[os.DirEntry]]) the current
+                directory, the names of its subdirectories and the
+                directory entries of its files.
+        """
+        pool = ThreadPoolExecutor(self.workers, thread_name_prefix="scanner")
+        read_ahead = self.workers * self.READ_AHEAD
+        stack: list[list[str | Future]] = [[self.source, None]]
+        in_progress = 0
+        try:
+            while stack:
+                # queue the next directories to walk for reading
+                index = len(stack) - 1
+                while index >= 0 and in_progress < read_ahead:
+                    if stack[index][1] is None:
+                        stack[index][1] = pool.submit(
+                            self.read_dir, stack[index][0], True
+                        )
+                        in_progress += 1
+                    index -= 1
+
+                current_dir, future = stack.pop()
+                if future is None:
+                    listing = self.read_dir(current_dir, True)
+                else:
+                    in_progress -= 1
+                    listing = future.result()
+                if listing is None:
+                    continue
+                subdirs, walk_dirs, files, pruned = listing
+                self.directories_pruned += pruned
+                yield current_dir, subdirs, files
+
+                # push in reverse so the subdirectories come off in order.
+                for subdir in reversed(walk_dirs):
+                    stack.append([subdir, None])
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def prune_dir(self, path: str) -> list[str]:
+        """
+        Cut an excluded directory from the walk.
+
+        Parameters:
+            path (str): the excluded directory.
+
+        A seed inside another of these seeds is left out, as it is
+        walked with the outer seed, or handed back when the walk of the
+        outer seed cuts the directory holding it.
+
+        Returns:
+            (list[str]) the seed directories at or below the excluded
+                directory; these still need to be walked.
+        """
+        path = os.path.normpath(path)
+        prefix = path + os.sep
+        seeds = [seed for seed in self.seeds if seed == path or seed.startswith(prefix)]
+        return [
+            seed
+            for seed in seeds
+            if not any(seed.startswith(outer + os.sep) for outer in seeds)
+        ]
+
+    def read_dir(
+        self, current_dir: str, fetch_status: bool = False
+    ) -> tuple[list[str], list[str], list[os.DirEntry], int] | None:
+        """
+        Read one directory and sort the entries into dirs and files.
+
+        This may be run by the worker threads, so it changes nothing
+        in the Scanner.
+
+        Parameters:
+            current_dir (str): the directory to read.
+            fetch_status (bool): read the status of each file now, so it
+                is held by the entry, default is False.
+
+        Returns:
+            (tuple[list[str], list[str], list[os.DirEntry], int] | None)
+                the subdirectory names, the paths of the subdirectories
+                and seeds to walk into, the file entries and the count
+                of directories pruned, or None if the directory cannot
+                be read.
+        """
+        subdirs = []
+        walk_dirs = []
+        files = []
+        pruned = 0
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+
+                    if is_dir and self.is_excluded and self.is_excluded(entry.path):
+                        walk_dirs.extend(self.prune_dir(entry.path))
+                        pruned += 1
+                    elif is_dir:
+                        subdirs.append(entry.name)
+                        try:
+                            is_symlink = entry.is_symlink()
+                        except OSError:
+                            is_symlink = False
+                        if not is_symlink:
+                            walk_dirs.append(entry.path)
+                    else:
+                        files.append(entry)
+        except OSError:
+            return None
+
+        if fetch_status:
+            for entry in files:
+                try:
+                    entry.stat()
+                except OSError:
+                    pass  # broken links are skipped by the caller
+        return subdirs, walk_dirs, files, pruned
@@ -13,14 +13,13 @@ File:       setup.py
 Author:     Lorn B Kerr
 Copyright:  (c) 2022, 2025 Lorn B Kerr
 License:    MIT see file LICENSE
-Version:    1.1.0
+Version:    1.2.0
 """
 
 import base64
 import os
 from copy import deepcopy
 from datetime import datetime
-from time import time
 from typing import Any
 
 from default_config import default_config
@@ -37,10 +36,11 @@ from PySide6.QtWidgets import (
 from setup_form import Ui_Setup
 
 filename = "setup.py"
-file_version = "1.0.0"
+file_version = "1.2.0"
 changes = {
     "1.0.0": "Initial release",
     "1.1.0": "Revised extensively with full functionality.",
+    "1.2.0": "Saving changes resets 'last_backup' rather than setting it.",
 }
 
 
@@ -261,7 +261,10 @@ class Setup(Dialog, Ui_Setup):
         self.config.setValue("backup_location", self.backup_location.text())
         self.config.setValue("log_path", self.log_path.text())
         self.config.setValue("log_name", self.log_name.text())
-        self.config.setValue("last_backup", time())
+        # A saved change may add files to the backup that have not
+        # changed since the last backup, so check all files next time.
+        if self.change_made:
+            self.config.setValue("last_backup", 0)
         self.config.set_bool_value(
             "exclude_cache_dir", self.exclude_cache_dir.isChecked()
         )
@@ -0,0 +1,162 @@
+"""
+Keep the backup as a series of dated snapshot directories.
+
+File:       snapshots.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.1
+"""
+
+import os
+import re
+import time
+
+file_name = "snapshots.py"
+file_version = "1.0.1"
+changes = {
+    "1.0.0": "Initial release",
+    "1.0.1": "Name a snapshot started in the same second as the latest one"
+    + " for the next second.",
+}
+
+SNAPSHOT_FORMAT = "%Y-%m-%dT%H%M%SZ"
+""" The name of a snapshot, the UTC time the backup started. """
+
+SNAPSHOT_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}T\d{6}Z")
+""" Matches the name of a snapshot. """
+
+PARTIAL_SUFFIX = ".partial"
+""" Added to the name of a snapshot until it is complete. """
+
+
+class Snapshots:
+    """
+    The snapshot directories in a backup location.
+
+    Each backup writes a complete tree into a new snapshot directory
+    named for the time the backup started. Files that have not changed
+    are hard linked to the copy in the previous snapshot, so each
+    snapshot looks like a full backup but only costs the space of the
+    files that changed.
+
+    A snapshot is written under its name with '.partial' added and
+    renamed when the backup is complete, so an incomplete snapshot is
+    never taken as the previous one. An incomplete snapshot left by a
+    backup that did not finish is picked up and completed by the next
+    backup.
+
+    Parameters:
+        backup_location (str): the directory holding the snapshots.
+    """
+
+    def __init__(self, backup_location: str) -> None:
+        """
+        Set the directory holding the snapshots.
+
+        Parameters:
+            backup_location (str): the directory holding the snapshots.
+        """
+        self.backup_location: str = str(backup_location)
+        """ The directory holding the snapshots """
+        self.name: str = None
+        """ The name of the snapshot being written """
+        self.working_dir: str = None
+        """ The directory the snapshot is being written to """
+        self.previous_dir: str = None
+        """ The latest complete snapshot, None if there is none """
+
+    def names(self) -> list[str]:
+        """
+        Get the names of the complete snapshots.
+
+        Returns:
+            (list[str]) the snapshot names, oldest first.
+        """
+        return self.matching_dirs("")
+
+    def matching_dirs(self, suffix: str) -> list[str]:
+        """
+        Get the snapshot directory names with a given suffix.
+
+        Parameters:
+            suffix (str): the suffix after the snapshot name.
+
+        Returns:
+            (list[str]) the directory names, oldest first.
+        """
+        try:
+            entries = list(os.scandir(self.backup_location))
+        except OSError:
+            return []
+        names = []
+        for entry in entries:
+            if not entry.name.endswith(suffix):
+                continue
+            name = entry.name[: len(entry.name) - len(suffix)]
+            if SNAPSHOT_PATTERN.fullmatch(name) and entry.is_dir(follow_symlinks=False):
+                names.append(entry.name)
+        return sorted(names)
+
+    def start(self, timestamp: int) -> str:
+        """
+        Start a new snapshot.
+
+        The snapshot is named for the time the backup started; if that
+        name is not after the latest snapshot, as for two backups in the
+        same second, the next free second is used so the names stay in
+        order.
+
+        Parameters:
+            timestamp (int): the time the backup started.
+
+        Returns:
+            (str) the directory to write the snapshot to.
+        """
+        names = self.names()
+        self.previous_dir = (
+            os.path.join(self.backup_location, names[-1]) if names else None
+        )
+        self.name = time.strftime(SNAPSHOT_FORMAT, time.gmtime(timestamp))
+        while names and self.name <= names[-1]:
+            timestamp += 1
+            self.name = time.strftime(SNAPSHOT_FORMAT, time.gmtime(timestamp))
+
+        partials = self.matching_dirs(PARTIAL_SUFFIX)
+        if partials:
+            # carry on with the snapshot a backup did not finish
+            self.working_dir = os.path.join(self.backup_location, partials[-1])
+        else:
+            self.working_dir = os.path.join(
+                self.backup_location, self.name + PARTIAL_SUFFIX
+            )
+            os.makedirs(self.working_dir)
+        return self.working_dir
+
+    def finish(self) -> str:
+        """
+        Mark the snapshot being written as complete.
+
+        Returns:
+            (str) the directory of the complete snapshot.
+        """
+        snapshot_dir = os.path.join(self.backup_location, self.name)
+        os.rename(self.working_dir, snapshot_dir)
+        self.working_dir = snapshot_dir
+        return snapshot_dir
+
+    def previous_path(self, path: str) -> str | None:
+        """
+        Get the path in the previous snapshot matching a new path.
+
+        Parameters:
+            path (str): a path in the snapshot being written.
+
+        Returns:
+            (str | None) the same path in the previous snapshot, or
+                None if there is no previous snapshot.
+        """
+        if self.previous_dir is None:
+            return None
+        relative = os.path.relpath(path, self.working_dir)
+        return os.path.join(self.previous_dir, relative)
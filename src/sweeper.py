@@ -0,0 +1,295 @@
+"""
+Remove the files deleted from the source from a mirror backup.
+
+File:       sweeper.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.1.0
+"""
+
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bundle import INDEX_NAME, PACK_NAME
+from delta_copier import DeltaCopier
+from manifest import Manifest
+from snapshots import SNAPSHOT_FORMAT, SNAPSHOT_PATTERN
+
+file_name = "sweeper.py"
+file_version = "1.1.0"
+changes = {
+    "1.0.0": "Initial release",
+    "1.0.1": "Keep the copy of a file named as the compressed copy of a"
+    + " deleted file.",
+    "1.1.0": "Remove nothing if the source is empty or too many files would"
+    + " be removed.",
+}
+
+TOMBSTONE_DIR = ".backup-deleted"
+""" The directory in the backup location holding the deleted files. """
+
+
+class MirrorSweeper:
+    """
+    Remove the backup copies of the files deleted from the source.
+
+    The backup drive is not walked. As the backup walks each source
+    directory, the manifest records for the directory are checked
+    against the files in it; a recorded file that is no longer there
+    has been deleted. Once the walk is complete, the recorded
+    directories the walk did not reach are checked, and those no
+    longer in the source are removed with their files. A directory
+    that is still in the source but was not walked or backed up, such
+    as one that is excluded or cannot be read, is left as it is. A
+    bundle is recorded as its pack file and is removed when the
+    directory no longer has small files to bundle.
+
+    Nothing is removed until the files have been copied, so the backup
+    copy of a file that was moved can still be renamed. The files are
+    then removed a directory at a time by a pool of threads.
+    If 'keep_days' is set, the deleted files are moved to a tombstone
+    directory, '.backup-deleted/<time>' in the backup location, with
+    their paths kept, rather than removed; tombstone directories older
+    than 'keep_days' are removed.
+
+    As a source that cannot be seen, such as an unmounted drive, looks
+    like a source whose files have all been deleted, nothing is removed
+    if the walk found no files, or if more than 'max_percent' of the
+    files recorded would be removed; 'refused' then gives the reason.
+
+    Parameters:
+        source (str): the source directory being backed up.
+        destination (str): the backup location.
+        manifest (Manifest): the record of the files backed up.
+        workers (int): the number of threads removing files.
+        keep_days (int): the days deleted files are kept, 0 to remove
+            them at once.
+        suffixes (list[str]): the suffixes of compressed backup copies.
+        max_percent (int): the most of the files recorded that may be
+            removed in one backup, 100 for no limit.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        destination: str,
+        manifest: Manifest,
+        workers: int,
+        keep_days: int = 0,
+        suffixes: list[str] = None,
+        max_percent: int = 100,
+    ) -> None:
+        """
+        Set the backup to sweep.
+
+        Parameters:
+            source (str): the source directory being backed up.
+            destination (str): the backup location.
+            manifest (Manifest): the record of the files backed up.
+            workers (int): the number of threads removing files.
+            keep_days (int): the days deleted files are kept, 0 to
+                remove them at once.
+            suffixes (list[str]): the suffixes of compressed backup
+                copies, default is None.
+            max_percent (int): the most of the files recorded that may
+                be removed in one backup, default is 100, no limit.
+        """
+        self.source: str = str(source).rstrip(os.sep)
+        """ The source directory being backed up """
+        self.destination: str = str(destination).rstrip(os.sep)
+        """ The backup location """
+        self.manifest: Manifest = manifest
+        """ The record of the files backed up """
+        self.workers: int = max(1, workers)
+        """ The number of threads removing files """
+        self.keep_days: int = keep_days
+        """ The days deleted files are kept, 0 to remove them at once """
+        self.suffixes: list[str] = [""] + list(suffixes or [])
+        """ The suffixes a backup copy may have """
+        self.max_percent: int = max_percent
+        """ The most of the files recorded that may be removed at once """
+        self.tombstone: str = None
+        """ The tombstone directory for this backup, None to remove files """
+        if keep_days:
+            self.tombstone = os.path.join(
+                self.destination,
+                TOMBSTONE_DIR,
+                time.strftime(SNAPSHOT_FORMAT, time.gmtime()),
+            )
+        self.visited: set[str] = set()
+        """ The keys of the backup directories walked """
+        self.files_seen: int = 0
+        """ The count of the files found in the source by the walk """
+        self.deleted: list[tuple[str, list[str]]] = []
+        """ The backup directories and names of the files deleted """
+        self.lock: threading.Lock = threading.Lock()
+        """ Guards the counts and failures updated by the threads """
+        self.files_deleted: int = 0
+        """ The count of the backup copies removed """
+        self.bytes_deleted: int = 0
+        """ The size of the backup copies removed """
+        self.dirs_deleted: int = 0
+        """ The count of the backup directories removed """
+        self.failed: list[str] = []
+        """ The backup copies that could not be removed """
+        self.refused: str = None
+        """ Why nothing was removed, None if the sweep was done """
+
+    def check_dir(self, backup_dir: str, filenames: list[str]) -> None:
+        """
+        Find the recorded files no longer in a source directory.
+
+        Parameters:
+            backup_dir (str): the backup directory.
+            filenames (list[str]): the names of the files now in the
+                source directory.
+        """
+        self.visited.add(self.manifest.dir_key(backup_dir))
+        self.files_seen += len(filenames)
+        deleted = set(self.manifest.names(backup_dir)).difference(filenames)
+        if deleted:
+            self.deleted.append((backup_dir, sorted(deleted)))
+
+    def remove_files(self, backup_dir: str, filenames: list[str]) -> None:
+        """
+        Remove the backup copies of deleted files from one directory.
+
+        Parameters:
+            backup_dir (str): the backup directory.
+            filenames (list[str]): the names of the deleted files.
+        """
+        removed = 0
+        removed_bytes = 0
+        failed = []
+        # a file named as a compressed copy of a deleted file keeps its copy
+        kept = set(self.manifest.names(backup_dir)).difference(filenames)
+        for filename in filenames:
+            path = os.path.join(backup_dir, filename)
+            copy_paths = [
+                path + suffix
+                for suffix in self.suffixes
+                if not suffix or filename + suffix not in kept
+            ]
+            if filename == PACK_NAME:
+                copy_paths = [path, os.path.join(backup_dir, INDEX_NAME)]
+            for copy_path in copy_paths:
+                try:
+                    copy_stat = os.lstat(copy_path)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(copy_stat.st_mode):
+                    continue  # now a directory in the source
+                try:
+                    self.discard(copy_path)
+                except OSError:
+                    failed.append(copy_path)
+                    continue
+                removed += 1
+                removed_bytes += copy_stat.st_size
+            try:
+                os.unlink(DeltaCopier.sidecar_path(path))
+            except OSError:
+                pass
+            self.manifest.remove(backup_dir, filename)
+        with self.lock:
+            self.files_deleted += removed
+            self.bytes_deleted += removed_bytes
+            self.failed.extend(failed)
+
+    def discard(self, path: str) -> None:
+        """
+        Remove a backup copy, or move it to the tombstone directory.
+
+        Parameters:
+            path (str): the backup copy.
+        """
+        if self.tombstone is None:
+            os.unlink(path)
+            return
+        tombstone_path = os.path.join(
+            self.tombstone, os.path.relpath(path, self.destination)
+        )
+        os.makedirs(os.path.dirname(tombstone_path), exist_ok=True)
+        os.replace(path, tombstone_path)
+
+    def finish(self) -> None:
+        """
+        Remove the files and directories deleted from the source.
+
+        This is called once the walk is complete and the files have been
+        copied. The expired tombstone directories are also removed.
+        """
+        if "" not in self.visited:
+            return  # the source was not read, so nothing can be removed
+        if self.files_seen == 0 and len(self.visited) == 1:
+            self.deleted = []
+            self.refused = "the source directory " + self.source + " is empty"
+            return
+        deleted_dirs = []
+        for dir_key in self.manifest.dir_keys():
+            if dir_key in self.visited or os.path.isabs(dir_key):
+                continue
+            if os.path.lexists(os.path.join(self.source, dir_key)):
+                continue  # not walked, but still there
+            backup_dir = os.path.join(self.destination, dir_key)
+            deleted_dirs.append(backup_dir)
+            self.deleted.append((backup_dir, self.manifest.names(backup_dir)))
+        to_remove = sum(len(filenames) for backup_dir, filenames in self.deleted)
+        recorded = self.manifest.count()
+        if self.max_percent < 100 and to_remove * 100 > recorded * self.max_percent:
+            self.deleted = []
+            self.refused = (
+                str(to_remove)
+                + " of the "
+                + str(recorded)
+                + " files backed up would be removed, more than "
+                + str(self.max_percent)
+                + "%"
+            )
+            return
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="sweeper") as pool:
+            for future in [
+                pool.submit(self.remove_files, backup_dir, filenames)
+                for backup_dir, filenames in self.deleted
+            ]:
+                future.result()
+        self.deleted = []
+        self.manifest.flush()
+
+        # the deepest directories first, then their empty parents
+        for backup_dir in sorted(deleted_dirs, key=len, reverse=True):
+            while backup_dir != self.destination:
+                relative = os.path.relpath(backup_dir, self.destination)
+                if os.path.lexists(os.path.join(self.source, relative)):
+                    break
+                try:
+                    os.rmdir(backup_dir)
+                except OSError:
+                    break  # not empty, or already removed
+                self.dirs_deleted += 1
+                backup_dir = os.path.dirname(backup_dir)
+        if self.keep_days:
+            self.expire_tombstones()
+
+    def expire_tombstones(self) -> None:
+        """Remove the tombstone directories older than 'keep_days'."""
+        tombstones = os.path.join(self.destination, TOMBSTONE_DIR)
+        oldest = time.strftime(
+            SNAPSHOT_FORMAT, time.gmtime(time.time() - self.keep_days * 86400)
+        )
+        try:
+            names = os.listdir(tombstones)
+        except OSError:
+            return
+        for name in names:
+            if SNAPSHOT_PATTERN.fullmatch(name) and name < oldest:
+                path = os.path.join(tombstones, name)
+                try:
+                    shutil.rmtree(path)
+                except OSError:
+                    self.failed.append(path)
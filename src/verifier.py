@@ -0,0 +1,424 @@
+"""
+Check the backup copies on the backup drive against their hashes.
+
+File:       verifier.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022, 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from compressor import SUFFIXES, open_compressed
+from default_config import config_option
+from hasher import StreamDigest
+from lbk_library.gui import Settings
+from logger import Logger
+from manifest import Manifest
+from repository import ChunkRepository
+from result_codes import ResultCodes
+from snapshots import Snapshots
+
+file_name = "verifier.py"
+file_version = "1.0.0"
+changes = {
+    "1.0.0": "Initial release",
+}
+
+BLOCK_SIZE = 1024 * 1024
+""" The size of each read of a backup copy. """
+
+
+class Verifier:
+    """
+    Check the backup copies on the backup drive against their hashes.
+
+    Each backup copy is read back and hashed, and the hash compared with
+    the one kept when the file was copied, so a copy that has decayed on
+    the drive is found before it is needed. For the "mirror" and
+    "snapshot" layouts the hashes are those in the manifest, kept with
+    the 'hash_copies' option; files with no hash are not checked. The
+    "snapshot" layout checks the latest snapshot. For the "repository"
+    layout each chunk is checked against its name, its hash.
+
+    The reads are held to 'verify_rate' MiB a second, so the machine
+    stays usable while the drive is checked. With 'verify_sample' less
+    than 1, only that part of the files is checked each run; the files
+    not checked for longest, in a random order, are checked first, so
+    the runs cover the whole drive in turn. The time each file was last
+    checked is kept in a database beside the log database.
+
+    Files that do not match, are missing or cannot be read are logged.
+
+    Parameters:
+        config (Settings): the configuration.
+        logger (Logger): the result logger for the database.
+        actions (dict[str, bool]): the required actions.
+    """
+
+    def __init__(
+        self, config: Settings, logger: Logger, actions: dict[str, bool]
+    ) -> None:
+        """
+        Check the backup copies in the backup location.
+
+        Parameters:
+            config (Settings): the configuration.
+            logger (Logger): the result logger for the database.
+            actions (dict[str, bool]): the required actions.
+        """
+        self.config: Settings = config
+        """ The configuration """
+        self.logger: Logger = logger
+        """ The result logger for the database """
+        self.actions: dict[str, bool] = actions
+        """ The list of actions directed """
+        self.workers: int = max(1, config_option(config, "verify_workers"))
+        """ The number of threads reading the backup copies """
+        self.rate: float = config_option(config, "verify_rate") * 1024 * 1024
+        """ The most bytes read a second, 0 for no limit """
+        self.sample: float = config_option(config, "verify_sample")
+        """ The part of the files checked each run """
+        self.result: int = ResultCodes.SUCCESS
+        """ The overall result of the check, from ResultCodes """
+        self.lock: threading.Lock = threading.Lock()
+        """ Guards the counts, findings and the read rate """
+        self.next_read: float = 0.0
+        """ The time the bytes read so far are allowed for """
+        self.files_total: int = 0
+        """ The count of the files with a hash to check against """
+        self.files_verified: int = 0
+        """ The count of the files read and found correct """
+        self.bytes_read: int = 0
+        """ The bytes read from the backup drive """
+        self.findings: list[tuple[int, str]] = []
+        """ The result code and description of each problem found """
+        self.checked: list[tuple[str, int]] = []
+        """ The items found correct and the time they were checked """
+        self.state: sqlite3.Connection = None
+        """ The database of the times the items were last checked """
+
+        location = config.value("backup_location")
+        layout = config_option(config, "backup_layout")
+        if not location or not os.path.isdir(location):
+            print(" Could not access the Extrernal Storage Drive ")
+            self.result = ResultCodes.NO_EXTERNAL_STORAGE
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": ResultCodes.NO_EXTERNAL_STORAGE,
+                    "description": " Could not access the Extrernal Storage Drive ",
+                }
+            )
+            return
+        if layout == "repository":
+            items = self.repository_items(location)
+        else:
+            items = self.manifest_items(location, layout)
+        self.files_total = len(items)
+        self.open_state()
+        try:
+            self.check_items(self.select_items(items))
+            self.save_state(items)
+        finally:
+            if self.state is not None:
+                self.state.close()
+        self.log_results()
+
+    def manifest_items(
+        self, location: str, layout: str
+    ) -> list[tuple[str, list[str], str]]:
+        """
+        Get the backup copies with a hash in the manifest.
+
+        Parameters:
+            location (str): the backup location.
+            layout (str): the backup layout, "mirror" or "snapshot".
+
+        Returns:
+            (list[tuple[str, list[str], str]]) the item name, the paths
+                the backup copy may have, plain or compressed, and the
+                content hash of each backup copy.
+        """
+        log_path = self.config.value("log_path")
+        log_name = self.config.value("log_name")
+        if not log_path or not log_name:
+            return []
+        root = location
+        if layout == "snapshot":
+            names = Snapshots(location).names()
+            if not names:
+                return []
+            root = os.path.join(location, names[-1])
+        manifest_path = os.path.join(
+            log_path, os.path.splitext(log_name)[0] + ".manifest"
+        )
+        if not os.path.isfile(manifest_path):
+            return []
+        try:
+            manifest = Manifest(
+                manifest_path, self.config.value("start_dir"), location, layout
+            )
+        except (OSError, sqlite3.Error):
+            if self.actions["verbose"]:
+                print("Could not open the manifest", manifest_path)
+            return []
+        items = []
+        try:
+            for dir_key, filename, digest in manifest.hashed_files():
+                item = os.path.join(dir_key, filename)
+                path = os.path.join(root, item)
+                paths = [path] + [path + suffix for suffix in SUFFIXES.values()]
+                items.append((item, paths, digest))
+        finally:
+            manifest.close()
+        return items
+
+    def repository_items(self, location: str) -> list[tuple[str, list[str], str]]:
+        """
+        Get the chunks in the repository; each is named by its hash.
+
+        Parameters:
+            location (str): the backup location.
+
+        Returns:
+            (list[tuple[str, list[str], str]]) the item name, the path
+                and the hash of each chunk.
+        """
+        repository = ChunkRepository(location)
+        items = []
+        try:
+            chunk_dirs = sorted(os.listdir(repository.chunks_dir))
+        except OSError:
+            return []
+        for chunk_dir in chunk_dirs:
+            try:
+                names = os.listdir(os.path.join(repository.chunks_dir, chunk_dir))
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue  # a chunk still being written
+                path = repository.chunk_path(name)
+                items.append((os.path.relpath(path, location), [path], name))
+        return items
+
+    def open_state(self) -> None:
+        """Open the database of the times the items were last checked."""
+        log_path = self.config.value("log_path")
+        log_name = self.config.value("log_name")
+        state_path = ":memory:"
+        if log_path and log_name:
+            state_path = os.path.join(
+                log_path, os.path.splitext(log_name)[0] + ".verify"
+            )
+        try:
+            self.state = sqlite3.connect(state_path)
+        except sqlite3.Error:
+            self.state = sqlite3.connect(":memory:")
+        self.state.execute(
+            "CREATE TABLE IF NOT EXISTS verified ("
+            "item TEXT PRIMARY KEY, time INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self.state.commit()
+
+    def select_items(
+        self, items: list[tuple[str, list[str], str]]
+    ) -> list[tuple[str, list[str], str]]:
+        """
+        Select the items to check this run.
+
+        All the items are checked if 'verify_sample' is 1 or more;
+        otherwise that part of them, those not checked for longest
+        first, in a random order.
+
+        Parameters:
+            items (list[tuple[str, list[str], str]]): all the items.
+
+        Returns:
+            (list[tuple[str, list[str], str]]) the items to check.
+        """
+        if self.sample >= 1 or not items:
+            return items
+        last_checked = dict(self.state.execute("SELECT item, time FROM verified"))
+        ordered = sorted(
+            items, key=lambda item: (last_checked.get(item[0], 0), random.random())
+        )
+        return ordered[: max(1, math.ceil(len(items) * self.sample))]
+
+    def save_state(self, items: list[tuple[str, list[str], str]]) -> None:
+        """
+        Keep the times the items were checked, dropping items now gone.
+
+        Parameters:
+            items (list[tuple[str, list[str], str]]): all the items.
+        """
+        self.state.executemany(
+            "INSERT OR REPLACE INTO verified (item, time) VALUES (?, ?)",
+            self.checked,
+        )
+        (count,) = self.state.execute("SELECT COUNT(*) FROM verified").fetchone()
+        if count > len(items):
+            current = {item[0] for item in items}
+            self.state.executemany(
+                "DELETE FROM verified WHERE item = ?",
+                [
+                    (item,)
+                    for (item,) in self.state.execute("SELECT item FROM verified")
+                    if item not in current
+                ],
+            )
+        self.state.commit()
+
+    def check_items(self, items: list[tuple[str, list[str], str]]) -> None:
+        """
+        Check the items, with a pool of threads if more than one worker.
+
+        Parameters:
+            items (list[tuple[str, list[str], str]]): the items to check.
+        """
+        if self.workers == 1:
+            for item in items:
+                self.check_item(*item)
+            return
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="verifier") as pool:
+            for future in [pool.submit(self.check_item, *item) for item in items]:
+                future.result()
+
+    def check_item(self, item: str, paths: list[str], digest: str) -> None:
+        """
+        Read back one backup copy and compare it with its hash.
+
+        Parameters:
+            item (str): the item name, its path in the backup.
+            paths (list[str]): the paths the backup copy may have; the
+                first is the plain copy, the others compressed.
+            digest (str): the content hash of the backup copy.
+        """
+        path = next((path for path in paths if os.path.isfile(path)), None)
+        if path is None:
+            self.add_finding(
+                ResultCodes.FILE_MISSING,
+                "Backup copy of " + item + " is missing.",
+            )
+            return
+        opener = None if path == paths[0] else open_compressed
+        try:
+            found = self.read_digest(path, opener)
+        except (OSError, ValueError):
+            self.add_finding(
+                ResultCodes.FILE_NOT_READ,
+                "Backup copy " + path + " could not be read.",
+            )
+            return
+        except Exception:
+            found = None  # the compressed data is damaged
+        if found != digest:
+            self.add_finding(
+                ResultCodes.FILE_CORRUPTED,
+                "Backup copy " + path + " does not match its hash.",
+            )
+            return
+        with self.lock:
+            self.files_verified += 1
+            self.checked.append((item, int(time.time())))
+
+    def read_digest(self, path: str, opener: Callable = None) -> str:
+        """
+        Hash a backup copy, at no more than the read rate.
+
+        A plain copy is dropped from the system cache once read, so the
+        check does not push out the data in use.
+
+        Parameters:
+            path (str): the backup copy.
+            opener (Callable): opens a compressed copy to read the data;
+                default is None, read the copy as it is.
+
+        Returns:
+            (str) the hex content hash.
+        """
+        digest = StreamDigest()
+        a_file = open(path, "rb") if opener is None else opener(path)
+        with a_file:
+            while data := a_file.read(BLOCK_SIZE):
+                digest.update(data)
+                self.throttle(len(data))
+            if opener is None and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(a_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        return digest.hexdigest()
+
+    def throttle(self, size: int) -> None:
+        """
+        Count the bytes read, and wait if reading faster than the rate.
+
+        Parameters:
+            size (int): the bytes just read.
+        """
+        with self.lock:
+            self.bytes_read += size
+            if not self.rate:
+                return
+            now = time.monotonic()
+            self.next_read = max(self.next_read, now) + size / self.rate
+            delay = self.next_read - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def add_finding(self, result: int, description: str) -> None:
+        """
+        Keep a problem found, to be logged when the check is complete.
+
+        Parameters:
+            result (int): the result code, from ResultCodes.
+            description (str): the problem found.
+        """
+        with self.lock:
+            self.findings.append((result, description))
+        if self.actions["verbose"]:
+            print(description)
+
+    def log_results(self) -> None:
+        """Log the problems found and the counts."""
+        for result, description in self.findings:
+            self.result = result
+            self.logger.add_log_entry(
+                {
+                    "timestamp": int(time.time()),
+                    "result": result,
+                    "description": description,
+                }
+            )
+        self.logger.add_log_entry(
+            {
+                "timestamp": int(time.time()),
+                "result": ResultCodes.SUCCESS,
+                "description": str(self.files_verified)
+                + " of "
+                + str(self.files_total)
+                + " backup copies verified, "
+                + str(self.bytes_read)
+                + " bytes read; "
+                + str(len(self.findings))
+                + " problems found.",
+            }
+        )
+        if self.actions["verbose"]:
+            print(
+                self.files_verified,
+                "of",
+                self.files_total,
+                "backup copies verified,",
+                self.bytes_read,
+                "bytes read;",
+                len(self.findings),
+                "problems found.",
+            )
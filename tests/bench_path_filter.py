@@ -0,0 +1,70 @@
+"""
+Compare PathFilter against the substring scans it replaced.
+
+Run from the project directory:  python tests/bench_path_filter.py
+
+File:       bench_path_filter.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import os
+import random
+import string
+import sys
+import timeit
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from path_filter import PathFilter
+
+PATTERN_COUNTS = [1, 10, 100, 1000]
+""" The numbers of exclusion patterns to time. """
+
+NAME_COUNT = 10000
+""" The number of file names checked in each timing. """
+
+
+def random_word(length: int) -> str:
+    """Build a random lower case word."""
+    return "".join(random.choice(string.ascii_lowercase) for i in range(length))
+
+
+def main() -> None:
+    """Time both methods for each pattern count and print the results."""
+    random.seed(0)
+    names = [
+        random_word(random.randint(4, 20)) + random.choice([".txt", ".py", ".bak"])
+        for i in range(NAME_COUNT)
+    ]
+    print("patterns   substrings (s)   PathFilter (s)   speedup")
+    for count in PATTERN_COUNTS:
+        excluded = [random_word(random.randint(3, 10)) for i in range(count)]
+        included = [random_word(8)]
+        path_filter = PathFilter([], [], excluded, included)
+        file_included = path_filter.file_included
+
+        def substrings():
+            for name in names:
+                not any(substring in name for substring in excluded) or any(
+                    substring in name for substring in included
+                )
+
+        def compiled():
+            for name in names:
+                file_included(name)
+
+        substring_time = min(timeit.repeat(substrings, number=1, repeat=3))
+        filter_time = min(timeit.repeat(compiled, number=1, repeat=3))
+        print(
+            f"{count:8d}   {substring_time:14.4f}   {filter_time:14.4f}"
+            f"   {substring_time / filter_time:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
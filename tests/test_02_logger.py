@@ -5,10 +5,11 @@ File:       test_02_logger.py
 Author:     Lorn B Kerr
 Copyright:  (c) 2022 - 2025 Lorn B Kerr
 License:    MIT, see file LICENSE
-Version:    1.0.1
+Version:    1.1.1
 """
 
 import os
+import sqlite3
 import sys
 
 src_path = os.path.join(os.path.realpath("."), "src")
@@ -157,3 +158,95 @@ def test_02_05_add_log_entry(tmp_path):
     assert data["result"] == result_code
     assert data["description"] == description
     logger.close_log()
+
+
+def test_02_06_batched_entries(tmp_path):
+    """
+    Test writing the log entries in batches.
+
+    The entries are held until a batch is full, the oldest has waited
+    too long, found as an entry is added or by flush_if_due(), or the
+    log is closed; the log uses the WAL journal.
+    """
+    db_path = tmp_path / "logger" / "test_log.db"
+    dir_path, filename = os.path.split(db_path)
+    logger = Logger(dir_path, filename)
+    result = logger.log_db.sql_query("PRAGMA journal_mode", [])
+    assert list(logger.log_db.sql_fetchrow(result).values()) == ["wal"]
+
+    reader = sqlite3.connect(db_path)
+    count_sql = "SELECT COUNT(*) FROM " + logger.table
+    entry = {"timestamp": 1000000, "result": ResultCodes.SUCCESS, "description": "x"}
+    for count in range(Logger.BATCH_SIZE - 1):
+        logger.add_log_entry(dict(entry))
+    assert reader.execute(count_sql).fetchone() == (0,)
+    logger.add_log_entry(dict(entry))
+    assert reader.execute(count_sql).fetchone() == (Logger.BATCH_SIZE,)
+
+    logger.add_log_entry(dict(entry))
+    logger.pending_since -= Logger.FLUSH_INTERVAL
+    logger.add_log_entry(dict(entry))
+    assert reader.execute(count_sql).fetchone() == (Logger.BATCH_SIZE + 2,)
+
+    logger.add_log_entry(dict(entry))
+    logger.flush_if_due()
+    assert reader.execute(count_sql).fetchone() == (Logger.BATCH_SIZE + 2,)
+    logger.pending_since -= Logger.FLUSH_INTERVAL
+    logger.flush_if_due()
+    assert reader.execute(count_sql).fetchone() == (Logger.BATCH_SIZE + 3,)
+
+    logger.add_log_entry(dict(entry))
+    logger.close_log()
+    assert reader.execute(count_sql).fetchone() == (Logger.BATCH_SIZE + 4,)
+    reader.close()
+
+
+def test_02_07_runs_and_file_events(tmp_path):
+    """
+    Test the 'runs' and 'file_events' tables.
+
+    Opening the log again keeps its history; each run records its
+    times, the data copied and the errors logged.
+    """
+    db_path = tmp_path / "logger" / "test_log.db"
+    dir_path, filename = os.path.split(db_path)
+    logger = Logger(dir_path, filename)
+    first = logger.start_run(1000)
+    logger.add_log_entry(
+        {"timestamp": 1001, "result": ResultCodes.SUCCESS, "description": "ok"}
+    )
+    logger.add_log_entry(
+        {
+            "timestamp": 1002,
+            "result": ResultCodes.FILE_NOT_COPIED,
+            "description": "Backup of file /home/me/a.txt failed.",
+        }
+    )
+    logger.add_file_event(ResultCodes.FILE_NOT_COPIED, "/home/me/a.txt", 1002)
+    logger.finish_run(1010, 5, 4096)
+    logger.close_log()
+
+    logger = Logger(dir_path, filename)
+    second = logger.start_run(2000)
+    assert second == first + 1
+    runs = logger.runs()
+    assert runs[0] == {
+        "run_id": first,
+        "start": 1000,
+        "end": 1010,
+        "bytes_copied": 4096,
+        "files_copied": 5,
+        "errors": 1,
+    }
+    assert runs[1]["end"] is None
+    result = logger.log_db.sql_query("SELECT COUNT(*) AS rows FROM Backup_Log", [])
+    assert logger.log_db.sql_fetchrow(result)["rows"] == 2
+    result = logger.log_db.sql_query("SELECT run_id, result, path FROM file_events", [])
+    assert logger.log_db.sql_fetchrowset(result) == [
+        {
+            "run_id": first,
+            "result": ResultCodes.FILE_NOT_COPIED,
+            "path": "/home/me/a.txt",
+        }
+    ]
+    logger.close_log()
@@ -8,7 +8,9 @@ License:    MIT, see file LICENSE
 Version:    1.1.0
 """
 
+import lzma
 import os
+import sqlite3
 import sys
 import time
 
@@ -24,8 +26,13 @@ from build_filesystem import (
     load_directory_set,
     new_filesys,
 )
+from bundle import Bundle
+from catalog import Catalog
+from delta_copier import DeltaCopier
 from external_storage import ExternalStorage
+from hasher import file_digest
 from logger import Logger
+from result_codes import ResultCodes
 
 
 def initialize_setup(tmp_path) -> ext_storage:
@@ -401,3 +408,652 @@ def test_03_18_process_dir_file_4(tmp_path):
 
     ext_storage.logger.close_log()
 
+
+def test_03_19_process_file_manifest(tmp_path):
+    """
+    Test ExternalStorage.process_file() with the manifest.
+
+    Once a file is recorded in the manifest, it is not checked against
+    or copied to the backup drive again until the source file changes.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    load_directory_set(directories, dest, False)
+
+    current_dir = source / "test1"
+    destination_dir = dest / "test1"
+    ext_storage.process_file(current_dir, destination_dir, "file1.txt")
+    assert ext_storage.manifest.lookup(destination_dir, "file1.txt") is not None
+
+    # unchanged, so a missing backup copy is not noticed
+    os.remove(destination_dir / "file1.txt")
+    ext_storage.process_file(current_dir, destination_dir, "file1.txt")
+    assert not os.path.isfile(destination_dir / "file1.txt")
+
+    # changed, so backed up again
+    new_time = time.time()
+    os.utime(current_dir / "file1.txt", (new_time, new_time))
+    ext_storage.process_file(current_dir, destination_dir, "file1.txt")
+    assert os.path.isfile(destination_dir / "file1.txt")
+    ext_storage.logger.close_log()
+
+
+def test_03_20_since_last_backup(tmp_path):
+    """
+    Test the 'since_last_backup' option.
+
+    The option is off by default. When on, it is not used for a new
+    manifest. Files older than the 'since_time' are skipped.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    load_directory_set(directories, dest, False)
+    assert ext_storage.since_last_backup() == 0
+
+    test_config.set_bool_value("since_last_backup", True)
+    test_config.setValue("last_backup", 1000)
+    ext_storage.manifest.reset = True
+    assert ext_storage.since_last_backup() == 0
+    ext_storage.manifest.reset = False
+    assert ext_storage.since_last_backup() == 1000
+
+    current_dir = source / "test1"
+    destination_dir = dest / "test1"
+    ext_storage.since_time = int(time.time()) + 10
+    ext_storage.process_file(current_dir, destination_dir, "file1.txt")
+    assert not os.path.isfile(destination_dir / "file1.txt")
+
+    ext_storage.since_time = 0
+    ext_storage.process_file(current_dir, destination_dir, "file1.txt")
+    assert os.path.isfile(destination_dir / "file1.txt")
+    ext_storage.logger.close_log()
+
+
+def test_03_21_copy_threads(tmp_path):
+    """
+    Test copying files with the copy threads.
+
+    Files queued by ExternalStorage.process_file() are all copied once
+    the threads are stopped; a file that cannot be copied is logged.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    load_directory_set(directories, dest, False)
+    files_backed_up = ext_storage.files_backed_up
+
+    current_dir = source / "test1"
+    destination_dir = dest / "test1"
+    add_files(additional_files, current_dir)
+    ext_storage.start_copiers(2)
+    assert len(ext_storage.copiers) == 2
+    ext_storage.process_dir_files(current_dir, destination_dir, additional_files)
+    ext_storage.process_file(current_dir, dest / "missing", "file1.txt")
+    ext_storage.stop_copiers()
+    assert ext_storage.copy_queue is None
+
+    for filename in additional_files:
+        assert os.path.isfile(destination_dir / filename)
+    assert ext_storage.files_backed_up == files_backed_up + len(additional_files)
+    assert ext_storage.files_failed == 1
+
+    ext_storage.log_failed_files()
+    assert ext_storage.failed_files.empty()
+    assert ext_storage.result == ResultCodes.FILE_NOT_COPIED
+    ext_storage.logger.close_log()
+
+
+def test_03_22_delta_copy(tmp_path):
+    """
+    Test the 'delta_copy' option.
+
+    Only the large files are copied by the delta copier, and the block
+    checksum sidecar is written beside the copy.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    load_directory_set(directories, dest, False)
+    assert ext_storage.delta_copier is None
+
+    current_dir = source / "test1"
+    destination_dir = dest / "test1"
+    (current_dir / "large.img").write_bytes(os.urandom(100000))
+    file_stat = os.stat(current_dir / "large.img")
+    ext_storage.delta_copier = DeltaCopier(4096)
+    ext_storage.delta_min_size = 50000
+    assert ext_storage.use_delta_copy(current_dir / "large.img", file_stat)
+    assert not ext_storage.use_delta_copy(
+        current_dir / "file1.txt", os.stat(current_dir / "file1.txt")
+    )
+
+    ext_storage.copy_file(current_dir, destination_dir, "large.img", file_stat)
+    assert (destination_dir / "large.img").read_bytes() == (
+        current_dir / "large.img"
+    ).read_bytes()
+    digests = ext_storage.delta_copier.read_sidecar(destination_dir / "large.img")
+    assert len(digests) == 25
+    assert ext_storage.delta_copier.blocks_written == 25
+
+    ext_storage.copy_file(current_dir, destination_dir, "large.img", file_stat)
+    assert ext_storage.delta_copier.blocks_written == 25
+    ext_storage.logger.close_log()
+
+
+def test_03_23_append_copy(tmp_path):
+    """
+    Test the 'append_copy' option.
+
+    A file that has grown is backed up by copying the new end; a file
+    that was changed is copied in full.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    load_directory_set(directories, dest, False)
+    assert not ext_storage.append_copy
+    ext_storage.append_copy = True
+
+    current_dir = source / "test1"
+    destination_dir = dest / "test1"
+    log_file = current_dir / "app.log"
+    log_file.write_text("first line\n")
+    ext_storage.copy_file(current_dir, destination_dir, "app.log", os.stat(log_file))
+    assert ext_storage.files_appended == 0
+
+    with open(log_file, "a") as log:
+        log.write("second line\n")
+    ext_storage.copy_file(current_dir, destination_dir, "app.log", os.stat(log_file))
+    assert ext_storage.files_appended == 1
+    assert (destination_dir / "app.log").read_text() == log_file.read_text()
+
+    log_file.write_text("new first line\n")
+    ext_storage.copy_file(current_dir, destination_dir, "app.log", os.stat(log_file))
+    assert ext_storage.files_appended == 1
+    assert (destination_dir / "app.log").read_text() == log_file.read_text()
+    ext_storage.logger.close_log()
+
+
+def test_03_24_snapshot_layout(tmp_path):
+    """
+    Test the 'snapshot' backup layout.
+
+    Each backup writes a new snapshot; unchanged files are hard links
+    to the previous snapshot and changed files are new copies.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    test_config.setValue("backup_layout", "snapshot")
+    actions = {"verbose": False}
+
+    logger = Logger(str(dest), "tests/test_log.db")
+    first = ExternalStorage(test_config, logger, actions)
+    first.logger.close_log()
+    first_dir = first.snapshots.working_dir
+    assert os.path.isfile(os.path.join(first_dir, "test1", "file1.txt"))
+    assert first.files_linked == 0
+
+    time.sleep(1)
+    (source / "test1" / "file2.txt").write_text("changed file")
+    logger = Logger(str(dest), "tests/test_log.db")
+    second = ExternalStorage(test_config, logger, actions)
+    second.logger.close_log()
+    test_config.setValue("backup_layout", "mirror")
+
+    second_dir = second.snapshots.working_dir
+    assert second.snapshots.names() == [
+        os.path.basename(first_dir),
+        os.path.basename(second_dir),
+    ]
+    assert second.files_linked > 0
+    assert os.path.samefile(
+        os.path.join(first_dir, "test1", "file1.txt"),
+        os.path.join(second_dir, "test1", "file1.txt"),
+    )
+    assert not os.path.samefile(
+        os.path.join(first_dir, "test1", "file2.txt"),
+        os.path.join(second_dir, "test1", "file2.txt"),
+    )
+    with open(os.path.join(second_dir, "test1", "file2.txt")) as copy:
+        assert copy.read() == "changed file"
+
+
+def test_03_25_repository_layout(tmp_path):
+    """
+    Test the 'repository' backup layout.
+
+    The backup writes a snapshot manifest of all the files, and no
+    mirror directories.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    test_config.setValue("backup_layout", "repository")
+    test_config.setValue("backup_location", str(dest / "repository"))
+
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    test_config.setValue("backup_layout", "mirror")
+    test_config.setValue("backup_location", str(dest / "backup_dir"))
+
+    repository = backup.repository
+    assert sorted(os.listdir(dest / "repository")) == ["chunks", "lock", "snapshots"]
+    assert repository.snapshot_names() == [repository.name]
+    paths = {entry["path"] for entry in repository.read_manifest(repository.name)}
+    assert os.path.join("test1", "file1.txt") in paths
+    assert backup.files_backed_up == len(paths)
+
+
+def test_03_26_compression(tmp_path):
+    """
+    Test the 'compression' option.
+
+    A file that compresses is backed up as '<name>.xz', replacing a
+    plain backup copy; a file that does not is copied as it is.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    load_directory_set(directories, dest, False)
+    ext_storage.logger.close_log()
+    test_config.setValue("compression", "lzma")
+    test_config.setValue("compression_workers", 1)
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    test_config.setValue("compression", "")
+    test_config.setValue("compression_workers", 0)
+    assert backup.compressor.method == "lzma"
+
+    current_dir = source / "test1"
+    destination_dir = dest / "test1"
+    text_file = current_dir / "notes.txt"
+    text_file.write_bytes(b"A line of notes to compress.\n" * 2000)
+    (destination_dir / "notes.txt").write_text("old plain copy")
+    image_file = current_dir / "photo.jpg"
+    image_file.write_bytes(b"\xff\xd8\xff\xe0" + os.urandom(1000))
+    try:
+        backup.copy_file(current_dir, destination_dir, "notes.txt", os.stat(text_file))
+        backup.copy_file(current_dir, destination_dir, "photo.jpg", os.stat(image_file))
+    finally:
+        backup.compressor.close()
+
+    assert not os.path.exists(destination_dir / "notes.txt")
+    compressed = destination_dir / "notes.txt.xz"
+    assert lzma.decompress(compressed.read_bytes()) == text_file.read_bytes()
+    assert int(os.stat(compressed).st_mtime) >= int(os.stat(text_file).st_mtime)
+    assert backup.backup_stat(str(destination_dir / "notes.txt")) == os.stat(compressed)
+    assert (destination_dir / "photo.jpg").read_bytes() == image_file.read_bytes()
+    assert not os.path.exists(destination_dir / "photo.jpg.xz")
+    assert backup.compressor.files_compressed == 1
+
+
+def test_03_27_bundles(tmp_path):
+    """
+    Test the 'bundle_max_size' option.
+
+    The small files of each directory are packed into a bundle, which
+    is only written again when one of its files changes.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    test_config.setValue("bundle_max_size", 1024)
+    actions = {"verbose": False}
+    large_file = source / "test1" / "large.dat"
+    large_file.write_bytes(os.urandom(4096))
+
+    first = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), actions
+    )
+    first.logger.close_log()
+    backup_dir = os.path.join(test_config.value("backup_location"), "test1")
+    assert first.bundles_written > 0
+    assert first.files_bundled == first.files_backed_up - 1
+    assert os.path.isfile(os.path.join(backup_dir, "large.dat"))
+    assert not os.path.exists(os.path.join(backup_dir, "file1.txt"))
+    bundle = Bundle(backup_dir)
+    assert bundle.read("file1.txt") == (source / "test1" / "file1.txt").read_bytes()
+    assert "large.dat" not in bundle.entries
+
+    second = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), actions
+    )
+    second.logger.close_log()
+    assert second.bundles_written == 0
+
+    (source / "test1" / "file2.txt").write_text("changed file")
+    third = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), actions
+    )
+    third.logger.close_log()
+    test_config.setValue("bundle_max_size", 0)
+    assert third.bundles_written == 1
+    assert third.files_bundled == 1
+    assert Bundle(backup_dir).read("file2.txt") == b"changed file"
+
+
+def test_03_28_detect_moves(tmp_path):
+    """
+    Test the 'detect_moves' option.
+
+    The backup copies of a renamed directory are renamed in the mirror,
+    and a copy of a file already backed up is hard linked to it.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    test_config.setValue("detect_moves", "content")
+    actions = {"verbose": False}
+    backup_location = test_config.value("backup_location")
+    (source / "test2" / "original.txt").write_text("a file to copy")
+
+    first = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), actions
+    )
+    first.logger.close_log()
+    assert first.files_moved == 0
+
+    os.rename(source / "test1", source / "renamed")
+    (source / "test2" / "copy.txt").write_text("a file to copy")
+    second = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), actions
+    )
+    second.logger.close_log()
+    test_config.setValue("detect_moves", "inode")
+    assert second.files_moved == len(os.listdir(source / "renamed")) + 1
+    assert not os.path.exists(os.path.join(backup_location, "test1", "file1.txt"))
+    with open(os.path.join(backup_location, "renamed", "file1.txt")) as copy:
+        assert copy.read() == "This is file1 in test1"
+    assert os.path.samefile(
+        os.path.join(backup_location, "test2", "original.txt"),
+        os.path.join(backup_location, "test2", "copy.txt"),
+    )
+
+
+def test_03_29_mirror_delete(tmp_path):
+    """
+    Test the 'mirror_delete' option.
+
+    Files and directories deleted from the source are removed from the
+    mirror.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    test_config.setValue("mirror_delete", True)
+    backup_location = test_config.value("backup_location")
+    assert os.path.isfile(os.path.join(backup_location, "test1", "file2.txt"))
+
+    os.unlink(source / "test1" / "file2.txt")
+    for filename in os.listdir(source / "test2"):
+        os.unlink(source / "test2" / filename)
+    os.rmdir(source / "test2")
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    test_config.setValue("mirror_delete", False)
+
+    assert backup.sweeper.files_deleted >= 3
+    assert backup.sweeper.dirs_deleted == 1
+    assert not os.path.exists(os.path.join(backup_location, "test1", "file2.txt"))
+    assert os.path.isfile(os.path.join(backup_location, "test1", "file1.txt"))
+    assert not os.path.exists(os.path.join(backup_location, "test2"))
+
+
+def test_03_30_checksum(tmp_path):
+    """
+    Test the '--checksum' action.
+
+    A backup copy with the same time but different contents is copied
+    again; the others are found unchanged by content.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    backup_copy = os.path.join(
+        test_config.value("backup_location"), "test1", "file1.txt"
+    )
+    backup_stat = os.stat(backup_copy)
+    with open(backup_copy, "r+") as copy:
+        copy.write("X")
+    os.utime(backup_copy, ns=(backup_stat.st_atime_ns, backup_stat.st_mtime_ns))
+
+    backup = ExternalStorage(
+        test_config,
+        Logger(str(dest), "tests/test_log.db"),
+        {"verbose": False, "checksum": True},
+    )
+    backup.logger.close_log()
+    assert backup.files_backed_up == 1
+    assert backup.files_matched > 0
+    assert backup.hasher.files_hashed > 0
+    with open(backup_copy) as copy:
+        assert copy.read() == "This is file1 in test1"
+
+
+def test_03_31_verify_copies(tmp_path):
+    """
+    Test the 'verify_copies' option.
+
+    Each file copied is hashed as it is copied, the hash kept in the
+    manifest and the copy read back; a copy that does not match is
+    removed and logged.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    new_file = source / "test1" / "verified.txt"
+    new_file.write_text("a file to verify")
+    test_config.setValue("verify_copies", True)
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    assert backup.hash_copies
+    assert backup.files_verified == backup.files_backed_up > 0
+    digest = file_digest(str(new_file))
+    assert backup.manifest.find_copies(new_file.stat().st_size, digest) == [
+        ("test1", "verified.txt")
+    ]
+
+    new_file.write_text("a changed file to verify")
+    backup.file_copier.copy_hashed = lambda source, destination: "0" * 64
+    backup.copy_file(
+        str(source / "test1"),
+        os.path.join(test_config.value("backup_location"), "test1"),
+        "verified.txt",
+        new_file.stat(),
+    )
+    assert not os.path.exists(
+        os.path.join(test_config.value("backup_location"), "test1", "verified.txt")
+    )
+    assert backup.unverified_files.get() == str(new_file)
+    test_config.setValue("verify_copies", False)
+
+
+def test_03_32_catalog(tmp_path):
+    """
+    Test the catalog of backed up files.
+
+    Each run records every included file, by its path relative to the
+    source, in the catalog beside the log database.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    catalog = Catalog(
+        Catalog.default_path(
+            test_config.value("log_path"), test_config.value("log_name")
+        )
+    )
+    runs = catalog.runs()
+    assert len(runs) == 2
+    assert runs[-1][3] >= backup.files_backed_up
+    matches = catalog.find("file1.txt")
+    assert (os.path.join("test1", "file1.txt"), runs[-1][0]) in [
+        match[:2] for match in matches
+    ]
+    catalog.close()
+
+
+def test_03_33_manifest_error_after_copy(tmp_path):
+    """
+    Test that a manifest error after a good copy does not fail the copy.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    new_file = source / "test1" / "recorded.txt"
+    new_file.write_text("a file to record")
+
+    def record(*arguments):
+        raise sqlite3.OperationalError("database is locked")
+
+    ext_storage.manifest.record = record
+    files_backed_up = ext_storage.files_backed_up
+    ext_storage.copy_file(
+        str(source / "test1"),
+        os.path.join(test_config.value("backup_location"), "test1"),
+        "recorded.txt",
+        new_file.stat(),
+    )
+    assert ext_storage.files_backed_up == files_backed_up + 1
+    assert ext_storage.failed_files.empty()
+    assert os.path.isfile(
+        os.path.join(test_config.value("backup_location"), "test1", "recorded.txt")
+    )
+    ext_storage.logger.close_log()
+
+
+def test_03_34_checksum_keeps_hash(tmp_path):
+    """
+    Test that '--checksum' keeps the content hash of an unchanged file.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    new_file = source / "test1" / "hashed.txt"
+    new_file.write_text("a file to hash")
+    test_config.setValue("verify_copies", True)
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    test_config.setValue("verify_copies", False)
+    digest = file_digest(str(new_file))
+    assert ("test1", "hashed.txt", digest) in backup.manifest.hashed_files()
+
+    backup = ExternalStorage(
+        test_config,
+        Logger(str(dest), "tests/test_log.db"),
+        {"verbose": False, "checksum": True},
+    )
+    backup.logger.close_log()
+    assert backup.files_backed_up == 0
+    assert ("test1", "hashed.txt", digest) in backup.manifest.hashed_files()
+
+
+def test_03_35_named_pipe(tmp_path):
+    """
+    Test that a named pipe in the source is logged, not read.
+
+    Reading a named pipe would block the backup; it fails as the copy
+    of any special file did, with and without '--checksum'.
+    """
+    if not hasattr(os, "mkfifo"):
+        return
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    os.mkfifo(source / "test1" / "pipe")
+    for actions in ({"verbose": False}, {"verbose": False, "checksum": True}):
+        backup = ExternalStorage(
+            test_config, Logger(str(dest), "tests/test_log.db"), actions
+        )
+        backup.logger.close_log()
+        assert backup.files_failed == 1
+        assert backup.result == ResultCodes.FILE_NOT_COPIED
+        assert not os.path.exists(
+            os.path.join(test_config.value("backup_location"), "test1", "pipe")
+        )
+
+
+def test_03_36_copy_job_error(tmp_path):
+    """
+    Test that a copy job that raises an error does not end its thread.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+
+    def record(*arguments):
+        raise sqlite3.OperationalError("database is locked")
+
+    ext_storage.manifest.record = record
+    files_failed = ext_storage.files_failed
+    ext_storage.start_copiers(1)
+    for filename in ("file1.txt", "file2.txt"):
+        ext_storage.run_job(
+            ext_storage.checksum_file,
+            (
+                str(source / "test1"),
+                os.path.join(test_config.value("backup_location"), "test1"),
+                filename,
+                os.stat(source / "test1" / filename),
+            ),
+        )
+    ext_storage.stop_copiers()
+    assert ext_storage.files_failed == files_failed + 2
+    failed = []
+    while not ext_storage.failed_files.empty():
+        failed.append(ext_storage.failed_files.get())
+    assert failed == [
+        os.path.join(str(source / "test1"), "file1.txt"),
+        os.path.join(str(source / "test1"), "file2.txt"),
+    ]
+    ext_storage.logger.close_log()
+
+
+def test_03_37_criteria_changed(tmp_path):
+    """
+    Test that a change of the criteria checks all files again.
+
+    A file excluded by the last backup and older than it is backed up
+    once it is no longer excluded, although 'since_last_backup' is set.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    old_file = source / "test1" / "old.txt"
+    old_file.write_text("an old file")
+    os.utime(old_file, (1000000, 1000000))
+    test_config.write_list("exclude_specific_files", ["old.txt"])
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    backup_copy = os.path.join(test_config.value("backup_location"), "test1", "old.txt")
+    assert not os.path.exists(backup_copy)
+
+    test_config.set_bool_value("since_last_backup", True)
+    test_config.setValue("last_backup", int(time.time()))
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    assert backup.since_time > 0
+
+    test_config.write_list("exclude_specific_files", [])
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    test_config.set_bool_value("since_last_backup", False)
+    assert backup.since_time == 0
+    assert os.path.isfile(backup_copy)
+
+
+def test_03_38_mirror_delete_empty_source(tmp_path):
+    """
+    Test that 'mirror_delete' removes nothing when the source is empty.
+    """
+    source, dest, ext_storage, test_config = initialize_setup(tmp_path)
+    ext_storage.logger.close_log()
+    test_config.setValue("mirror_delete", True)
+    backup_location = test_config.value("backup_location")
+    # the drive holding the source is not mounted
+    os.rename(source, tmp_path / "unmounted")
+    source.mkdir()
+    backup = ExternalStorage(
+        test_config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    test_config.setValue("mirror_delete", False)
+    assert backup.result == ResultCodes.FILE_NOT_REMOVED
+    assert backup.sweeper.files_deleted == 0
+    assert os.path.isfile(os.path.join(backup_location, "test1", "file1.txt"))
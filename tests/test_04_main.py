@@ -114,6 +114,48 @@ def test_04_03_required_actions(tmp_path):
     assert actions["setup"]
     assert actions["verbose"]
     assert actions["version"]
+    assert not actions["prune"]
+
+    # do action list with prune only
+    actions = backup.set_required_actions(["--prune"])
+    assert not actions["backup"]
+    assert actions["prune"]
+
+    # checksum runs the backup
+    actions = backup.set_required_actions(["--checksum"])
+    assert actions["backup"]
+    assert actions["checksum"]
+    assert not actions["prune"]
+
+    # restore takes its values with '='
+    actions = backup.set_required_actions(
+        ["--restore=docs/letters", "--at=2025-06-01 14:30", "--restore-to=/tmp/r"]
+    )
+    assert actions["restore"]
+    assert not actions["backup"]
+    assert actions["restore_path"] == "docs/letters"
+    assert actions["restore_time"] == "2025-06-01 14:30"
+    assert actions["restore_to"] == "/tmp/r"
+    assert backup.set_required_actions(["--restore"])["restore_path"] == ""
+
+    # verify checks the backup copies only
+    actions = backup.set_required_actions(["--verify"])
+    assert actions["verify"]
+    assert not actions["backup"]
+
+    # find takes its pattern as the next argument or with '='
+    actions = backup.set_required_actions(["--find", "letters/*.txt", "-v"])
+    assert actions["find"] == "letters/*.txt"
+    assert actions["verbose"]
+    assert not actions["backup"]
+    assert backup.set_required_actions(["--find=report"])["find"] == "report"
+    assert backup.set_required_actions(["-v"])["find"] == ""
+
+    # diff takes the two runs as the next arguments
+    actions = backup.set_required_actions(["--diff", "3", "7"])
+    assert actions["diff"]
+    assert (actions["diff_from"], actions["diff_to"]) == ("3", "7")
+    assert not actions["backup"]
 
     # do action list with combined settings;
     action_list = ["-bsv", "--version"]
@@ -0,0 +1,173 @@
+"""
+Test the Scanner class functionality.
+
+File:       test_05_scanner.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.1
+"""
+
+import os
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from scanner import Scanner
+
+
+def build_tree(base):
+    """
+    Build a small directory tree for scanning.
+
+    Parameters:
+        base (Path): the top of the tree.
+    """
+    for a_dir in ["one", "one/two", "three"]:
+        (base / a_dir).mkdir(parents=True)
+        (base / a_dir / "file1.txt").write_text("file1 in " + a_dir)
+    (base / "top.txt").write_text("top file")
+    if sys.platform.startswith("linux"):
+        os.symlink(base / "one", base / "link_dir")
+        os.symlink(base / "top.txt", base / "link_file")
+
+
+def test_05_01_scan_matches_walk(tmp_path):
+    """
+    Test Scanner.scan() against os.walk().
+
+    The same directories, subdirectories and files must be found.
+    """
+    build_tree(tmp_path)
+
+    walked = {
+        current_dir: (sorted(subdirs), sorted(files))
+        for current_dir, subdirs, files in os.walk(tmp_path)
+    }
+    scanned = {
+        current_dir: (sorted(subdirs), sorted(entry.name for entry in files))
+        for current_dir, subdirs, files in Scanner(tmp_path).scan()
+    }
+    assert scanned == walked
+
+
+def test_05_02_scan_entries(tmp_path):
+    """
+    Test the file entries returned by Scanner.scan().
+
+    The entries carry the same file status as os.stat().
+    """
+    build_tree(tmp_path)
+
+    for current_dir, subdirs, files in Scanner(tmp_path).scan():
+        for entry in files:
+            assert isinstance(entry, os.DirEntry)
+            assert entry.path == os.path.join(current_dir, entry.name)
+            assert entry.stat().st_mtime_ns == os.stat(entry.path).st_mtime_ns
+
+
+def test_05_03_scan_missing_dir(tmp_path):
+    """
+    Test Scanner.scan() on a directory that does not exist.
+
+    Nothing is returned.
+    """
+    assert list(Scanner(tmp_path / "missing").scan()) == []
+
+
+def test_05_04_scan_prune(tmp_path):
+    """
+    Test Scanner.scan() with an excluded directory.
+
+    The excluded directory and everything below it is not walked, and
+    is left out of the subdirectory list.
+    """
+    build_tree(tmp_path)
+
+    scanner = Scanner(tmp_path, lambda path: os.path.basename(path) == "one")
+    scanned = {
+        current_dir: sorted(subdirs) for current_dir, subdirs, files in scanner.scan()
+    }
+    assert str(tmp_path / "one") not in scanned
+    assert str(tmp_path / "one" / "two") not in scanned
+    assert "one" not in scanned[str(tmp_path)]
+    assert str(tmp_path / "three") in scanned
+    assert scanner.directories_pruned >= 1
+
+
+def test_05_05_scan_prune_seeds(tmp_path):
+    """
+    Test Scanner.scan() with a seed inside an excluded directory.
+
+    The seed directory is walked even though its parent is not.
+    """
+    build_tree(tmp_path)
+
+    scanner = Scanner(
+        tmp_path,
+        lambda path: os.path.basename(path) == "one",
+        [str(tmp_path / "one" / "two"), str(tmp_path / "missing")],
+    )
+    scanned = [current_dir for current_dir, subdirs, files in scanner.scan()]
+    assert str(tmp_path / "one") not in scanned
+    assert str(tmp_path / "one" / "two") in scanned
+    assert len(scanned) == len(set(scanned))
+
+
+def test_05_06_scan_parallel(tmp_path):
+    """
+    Test Scanner.scan() with several workers.
+
+    The directories come back in the same order as with one worker,
+    and the file status is already held by the entries.
+    """
+    for i in range(20):
+        for j in range(3):
+            (tmp_path / str(i) / str(j)).mkdir(parents=True)
+            (tmp_path / str(i) / str(j) / "file.txt").write_text("file")
+        (tmp_path / str(i) / "skip").mkdir()
+
+    def is_excluded(path):
+        return os.path.basename(path) == "skip"
+
+    single = Scanner(tmp_path, is_excluded)
+    expected = [
+        (current_dir, subdirs, [entry.name for entry in files])
+        for current_dir, subdirs, files in single.scan()
+    ]
+    parallel = Scanner(tmp_path, is_excluded, workers=4)
+    scanned = []
+    for current_dir, subdirs, files in parallel.scan():
+        scanned.append((current_dir, subdirs, [entry.name for entry in files]))
+        for entry in files:
+            assert entry.stat().st_size == 4
+    assert scanned == expected
+    assert parallel.directories_pruned == single.directories_pruned == 20
+
+
+def test_05_07_scan_nested_seeds(tmp_path):
+    """
+    Test Scanner.scan() with a seed inside another seed.
+
+    Each directory is walked once; a seed inside an excluded directory
+    within the outer seed is still walked.
+    """
+    build_tree(tmp_path)
+    (tmp_path / "one" / "two" / "skip" / "deep").mkdir(parents=True)
+
+    scanner = Scanner(
+        tmp_path,
+        lambda path: os.path.basename(path) in ("one", "skip"),
+        [
+            str(tmp_path / "one"),
+            str(tmp_path / "one" / "two"),
+            str(tmp_path / "one" / "two" / "skip" / "deep"),
+        ],
+    )
+    scanned = [current_dir for current_dir, subdirs, files in scanner.scan()]
+    assert len(scanned) == len(set(scanned))
+    assert str(tmp_path / "one" / "two") in scanned
+    assert str(tmp_path / "one" / "two" / "skip") not in scanned
+    assert str(tmp_path / "one" / "two" / "skip" / "deep") in scanned
@@ -0,0 +1,90 @@
+"""
+Test the PathFilter class functionality.
+
+File:       test_06_path_filter.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import os
+import random
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from path_filter import PathFilter
+
+
+def substring_included(name, excluded, included):
+    """The original criteria test, for comparison."""
+    return not any(substring in name for substring in excluded) or any(
+        substring in name for substring in included
+    )
+
+
+def test_06_01_empty_lists():
+    """
+    Test PathFilter with no criteria.
+
+    Everything is included.
+    """
+    path_filter = PathFilter([], [], [], [])
+    assert path_filter.dir_included("/home/me/.cache")
+    assert path_filter.file_included("file.bak")
+    assert path_filter.file_included("")
+
+
+def test_06_02_default_criteria():
+    """
+    Test PathFilter with the usual exclusions and an inclusion.
+    """
+    path_filter = PathFilter(
+        ["cache", "Cache", "venv", "tox"], ["cache/keep"], ["~", ".bak"], ["keep.bak"]
+    )
+    assert not path_filter.dir_included("/home/me/.cache")
+    assert not path_filter.dir_included("/home/me/project/venv/lib")
+    assert path_filter.dir_included("/home/me/.cache/keep/here")
+    assert path_filter.dir_included("/home/me/Documents")
+    assert not path_filter.file_included("notes.txt~")
+    assert not path_filter.file_included("notes.bak")
+    assert path_filter.file_included("keep.bak")
+    assert path_filter.file_included("notes.txt")
+
+
+def test_06_03_special_characters():
+    """
+    Test PathFilter with regular expression characters in the criteria.
+    """
+    path_filter = PathFilter(["$RECYCLE.BIN", "a[b]"], [], ["^-\\"], [])
+    assert not path_filter.dir_included("D:/$RECYCLE.BIN/x")
+    assert path_filter.dir_included("D:/RECYCLEXBIN")
+    assert not path_filter.dir_included("/a[b]/c")
+    assert path_filter.dir_included("/ab/c")
+    assert not path_filter.file_included("x^-\\y")
+
+
+def test_06_04_same_as_substrings():
+    """
+    Test PathFilter gives the same results as the substring scans.
+
+    Includes empty strings and strings that are prefixes of others.
+    """
+    random.seed(3)
+    chars = "ab.~-]^\\/"
+
+    def random_string(length):
+        return "".join(random.choice(chars) for i in range(length))
+
+    for trial in range(500):
+        excluded = [random_string(random.randint(0, 4)) for i in range(6)]
+        included = [random_string(random.randint(0, 4)) for i in range(2)]
+        path_filter = PathFilter(excluded, included, excluded, included)
+        for i in range(10):
+            name = random_string(random.randint(0, 12))
+            expected = substring_included(name, excluded, included)
+            assert path_filter.dir_included(name) == expected
+            assert path_filter.file_included(name) == expected
@@ -0,0 +1,136 @@
+"""
+Test the Manifest class functionality.
+
+File:       test_07_manifest.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import os
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from hasher import file_digest
+from manifest import Manifest
+
+
+def test_07_01_init(tmp_path):
+    """
+    Testing Manifest.__init__()
+
+    The database and its directory are created.
+    """
+    manifest_path = tmp_path / "log" / "test.manifest"
+    manifest = Manifest(str(manifest_path), "/source", "/dest")
+    assert isinstance(manifest, Manifest)
+    assert os.path.isfile(manifest_path)
+    manifest.close()
+
+
+def test_07_02_record_and_check(tmp_path):
+    """
+    Test Manifest.record() and Manifest.is_unchanged().
+
+    A recorded file is unchanged until its status changes, and the
+    record survives closing and reopening the manifest.
+    """
+    a_file = tmp_path / "file1.txt"
+    a_file.write_text("file1")
+    file_stat = os.stat(a_file)
+    manifest_path = str(tmp_path / "test.manifest")
+
+    manifest = Manifest(manifest_path, "/source", "/dest")
+    assert manifest.lookup(tmp_path, "file1.txt") is None
+    assert not manifest.is_unchanged(tmp_path, "file1.txt", file_stat)
+    manifest.record(tmp_path, "file1.txt", file_stat)
+    assert manifest.is_unchanged(tmp_path, "file1.txt", file_stat)
+    manifest.close()
+
+    manifest = Manifest(manifest_path, "/source", "/dest")
+    assert manifest.is_unchanged(tmp_path, "file1.txt", file_stat)
+    os.utime(a_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1000))
+    assert not manifest.is_unchanged(tmp_path, "file1.txt", os.stat(a_file))
+    manifest.close()
+
+
+def test_07_03_new_location(tmp_path):
+    """
+    Test the records are dropped for a new backup location or layout.
+    """
+    a_file = tmp_path / "file1.txt"
+    a_file.write_text("file1")
+    file_stat = os.stat(a_file)
+    manifest_path = str(tmp_path / "test.manifest")
+
+    manifest = Manifest(manifest_path, "/source", "/dest")
+    manifest.record(tmp_path, "file1.txt", file_stat)
+    manifest.close()
+
+    manifest = Manifest(manifest_path, "/source", "/other_dest")
+    assert not manifest.is_unchanged(tmp_path, "file1.txt", file_stat)
+    manifest.record(tmp_path, "file1.txt", file_stat)
+    manifest.close()
+
+    manifest = Manifest(manifest_path, "/source", "/other_dest", "mirror")
+    assert manifest.is_unchanged(tmp_path, "file1.txt", file_stat)
+    manifest.close()
+
+    manifest = Manifest(manifest_path, "/source", "/other_dest", "snapshot")
+    assert manifest.reset
+    assert not manifest.is_unchanged(tmp_path, "file1.txt", file_stat)
+    manifest.close()
+
+
+def test_07_04_dir_key(tmp_path):
+    """
+    Test Manifest.dir_key().
+
+    Backup directories are keyed relative to the backup location.
+    """
+    manifest = Manifest(str(tmp_path / "test.manifest"), "/source", "/dest")
+    assert manifest.dir_key("/dest") == ""
+    assert manifest.dir_key("/dest/") == ""
+    assert manifest.dir_key(os.path.join("/dest", "a", "b")) == os.path.join("a", "b")
+    assert manifest.dir_key("/destination/a") == "/destination/a"
+    manifest.close()
+
+
+def test_07_05_find_moved(tmp_path):
+    """
+    Test Manifest.find_moved(), Manifest.find_copies() and
+    Manifest.remove().
+
+    A record is found by its inode or content hash, both before and
+    after it is written, and not once removed.
+    """
+    a_file = tmp_path / "file1.txt"
+    a_file.write_text("file1")
+    file_stat = os.stat(a_file)
+    digest = file_digest(str(a_file))
+    manifest_path = str(tmp_path / "test.manifest")
+    backup_dir = os.path.join("/dest", "old")
+
+    manifest = Manifest(manifest_path, "/source", "/dest")
+    manifest.record(backup_dir, "file1.txt", file_stat, digest)
+    assert manifest.find_moved(file_stat) == [("old", "file1.txt")]
+    assert manifest.find_copies(file_stat.st_size, digest) == [("old", "file1.txt")]
+    manifest.close()
+
+    manifest = Manifest(manifest_path, "/source", "/dest")
+    assert manifest.find_moved(file_stat) == [("old", "file1.txt")]
+    assert manifest.find_copies(file_stat.st_size, digest) == [("old", "file1.txt")]
+    assert manifest.find_copies(file_stat.st_size + 1, digest) == []
+    manifest.remove(backup_dir, "file1.txt")
+    assert manifest.find_moved(file_stat) == []
+    assert manifest.lookup(backup_dir, "file1.txt") is None
+    manifest.close()
+
+    manifest = Manifest(manifest_path, "/source", "/dest")
+    assert manifest.find_moved(file_stat) == []
+    assert manifest.find_copies(file_stat.st_size, digest) == []
+    manifest.close()
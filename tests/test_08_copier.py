@@ -0,0 +1,228 @@
+"""
+Test the FileCopier class functionality.
+
+File:       test_08_copier.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.2.1
+"""
+
+import os
+import shutil
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+import pytest
+from copier import CopyMethodUnsupported, FileCopier
+from hasher import file_digest
+
+
+def make_file(path, size):
+    """
+    Write a file of repeatable, non-repeating data.
+
+    Parameters:
+        path (Path): the file to write.
+        size (int): the file size.
+    """
+    data = bytearray((i * 7 + i // 251) % 256 for i in range(size))
+    path.write_bytes(data)
+    os.utime(path, (1000000, 2000000))
+    return data
+
+
+def test_08_01_init():
+    """
+    Testing FileCopier.__init__()
+
+    The buffered copy is always available and always last.
+    """
+    copier = FileCopier()
+    assert isinstance(copier, FileCopier)
+    assert copier.methods[-1] == "buffered"
+
+
+@pytest.mark.parametrize("method", ["copy_file_range", "sendfile", "buffered"])
+def test_08_02_copy_methods(tmp_path, method):
+    """
+    Test each of the copy methods available on this system.
+
+    The copy must have the same data, permissions and times.
+    """
+    copier = FileCopier()
+    if method not in copier.methods:
+        pytest.skip(method + " not available")
+    copier.methods = [method, "buffered"]
+
+    source = tmp_path / "source.bin"
+    data = make_file(source, 3 * FileCopier.BUFFER_SIZE + 17)
+    destination = tmp_path / "dest.bin"
+    destination.write_bytes(b"old contents, longer than nothing")
+
+    used = copier.copy(source, destination)
+    assert used in (method, "buffered")
+    assert destination.read_bytes() == data
+    assert os.stat(destination).st_mtime == os.stat(source).st_mtime
+    assert os.stat(destination).st_mode == os.stat(source).st_mode
+
+
+def test_08_03_copy_fallback(tmp_path):
+    """
+    Test falling back from a copy method that does not work.
+
+    The failed method is not tried again for the same file systems.
+    """
+    copier = FileCopier()
+    calls = []
+
+    def copy_unsupported(source_fd, dest_fd, size):
+        calls.append(size)
+        os.write(dest_fd, b"partial")
+        raise CopyMethodUnsupported()
+
+    copier.copy_unsupported = copy_unsupported
+    copier.methods = ["unsupported", "buffered"]
+
+    source = tmp_path / "source.bin"
+    data = make_file(source, 1000)
+    assert copier.copy(source, tmp_path / "dest1.bin") == "buffered"
+    assert (tmp_path / "dest1.bin").read_bytes() == data
+    assert copier.copy(source, tmp_path / "dest2.bin") == "buffered"
+    assert (tmp_path / "dest2.bin").read_bytes() == data
+    assert len(calls) == 1
+
+
+def test_08_04_copy_empty_and_link(tmp_path):
+    """
+    Test copying an empty file and a symbolic link.
+    """
+    copier = FileCopier()
+    source = tmp_path / "empty.txt"
+    source.write_bytes(b"")
+    copier.copy(source, tmp_path / "empty_copy.txt")
+    assert (tmp_path / "empty_copy.txt").read_bytes() == b""
+
+    if sys.platform.startswith("linux"):
+        os.symlink(source, tmp_path / "link")
+        assert copier.copy(tmp_path / "link", tmp_path / "link_copy") == "link"
+        assert os.readlink(tmp_path / "link_copy") == str(source)
+
+
+@pytest.mark.parametrize("method", ["copy_file_range", "sendfile", "buffered"])
+def test_08_05_append_tail(tmp_path, method):
+    """
+    Test FileCopier.append_tail() on a file that has grown.
+
+    Only the new end is copied; the backup copy matches the file.
+    """
+    copier = FileCopier()
+    if method not in copier.methods:
+        pytest.skip(method + " not available")
+    copier.methods = ["reflink", method, "buffered"]
+
+    source = tmp_path / "source.log"
+    destination = tmp_path / "dest.log"
+    data = make_file(source, 3 * FileCopier.TAIL_CHECK_SIZE + 5)
+    copier.copy(source, destination)
+    with open(source, "ab") as log:
+        log.write(b"new log lines\n" * 1000)
+    os.utime(source, (1000000, 3000000))
+    remembered = dict(copier.first_method)
+
+    assert copier.append_tail(source, destination) in (method, "buffered")
+    assert destination.read_bytes() == source.read_bytes()
+    assert os.stat(destination).st_mtime == 3000000
+    assert copier.first_method == remembered
+
+
+def test_08_06_append_tail_not_prefix(tmp_path):
+    """
+    Test FileCopier.append_tail() when the file has not just grown.
+
+    Nothing is copied if the last block of the backup copy differs,
+    the file is not longer or the backup copy has other links.
+    """
+    copier = FileCopier()
+    source = tmp_path / "source.log"
+    destination = tmp_path / "dest.log"
+    assert copier.append_tail(source, destination) is None
+
+    data = make_file(source, 2 * FileCopier.TAIL_CHECK_SIZE)
+    copier.copy(source, destination)
+    assert copier.append_tail(source, destination) is None
+
+    data[-10] ^= 0xFF
+    source.write_bytes(bytes(data) + b"more")
+    assert copier.append_tail(source, destination) is None
+    assert os.stat(destination).st_size == len(data)
+
+    copier.copy(source, destination)
+    os.link(destination, tmp_path / "other.log")
+    with open(source, "ab") as log:
+        log.write(b"more")
+    assert copier.append_tail(source, destination) is None
+
+
+def test_08_07_copy_replaces_shared(tmp_path):
+    """
+    Test FileCopier.copy() over a copy shared by a hard link.
+
+    The copy is replaced, the other link keeps the old data.
+    """
+    copier = FileCopier()
+    source = tmp_path / "source.txt"
+    destination = tmp_path / "dest.txt"
+    source.write_text("old data")
+    copier.copy(source, destination)
+    os.link(destination, tmp_path / "snapshot.txt")
+
+    source.write_text("new data")
+    copier.copy(source, destination)
+    assert destination.read_text() == "new data"
+    assert (tmp_path / "snapshot.txt").read_text() == "old data"
+
+
+def test_08_08_copy_hashed(tmp_path):
+    """
+    Test FileCopier.copy_hashed().
+
+    The copy is hashed as it is written, with the hash of the file; a
+    link is copied as a link, with no hash.
+    """
+    copier = FileCopier()
+    copier.BUFFER_SIZE = 4096
+    source = tmp_path / "source.bin"
+    destination = tmp_path / "dest.bin"
+    make_file(source, 50000)
+    os.chmod(source, 0o640)
+    assert copier.copy_hashed(source, destination) == file_digest(source)
+    assert destination.read_bytes() == source.read_bytes()
+    assert os.stat(destination).st_mode & 0o777 == 0o640
+    assert os.stat(destination).st_mtime_ns == os.stat(source).st_mtime_ns
+
+    link = tmp_path / "link.bin"
+    os.symlink(source, link)
+    assert copier.copy_hashed(link, tmp_path / "link_copy.bin") is None
+    assert os.path.islink(tmp_path / "link_copy.bin")
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+def test_08_09_named_pipe(tmp_path):
+    """
+    Test that a named pipe is not read, which would block the copy.
+    """
+    copier = FileCopier()
+    pipe = tmp_path / "pipe"
+    os.mkfifo(pipe)
+    with pytest.raises(shutil.SpecialFileError):
+        copier.copy(pipe, tmp_path / "pipe_copy")
+    with pytest.raises(shutil.SpecialFileError):
+        copier.copy_hashed(pipe, tmp_path / "pipe_copy")
+    assert not os.path.exists(tmp_path / "pipe_copy")
+
+    (tmp_path / "pipe_copy").write_bytes(b"data")
+    assert copier.append_tail(pipe, tmp_path / "pipe_copy") is None
@@ -0,0 +1,149 @@
+"""
+Test the DeltaCopier class functionality.
+
+File:       test_09_delta_copier.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import os
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from delta_copier import DeltaCopier
+
+BLOCK_SIZE = 4096
+
+
+def make_file(path, size):
+    """
+    Write a file of repeatable, non-repeating data.
+
+    Parameters:
+        path (Path): the file to write.
+        size (int): the file size.
+    """
+    data = bytearray(os.urandom(size))
+    path.write_bytes(data)
+    return data
+
+
+def backup(copier, source, destination):
+    """
+    Copy a file and write its sidecar, as the backup does.
+
+    Parameters:
+        copier (DeltaCopier): the copier.
+        source (Path): the file to copy.
+        destination (Path): the backup copy.
+    """
+    digests = copier.copy(source, destination)
+    copier.write_sidecar(destination, digests)
+
+
+def test_09_01_first_copy(tmp_path):
+    """
+    Test DeltaCopier.copy() with no previous copy.
+
+    Every block is written and the sidecar describes the copy.
+    """
+    copier = DeltaCopier(BLOCK_SIZE)
+    source = tmp_path / "source.img"
+    destination = tmp_path / "dest.img"
+    data = make_file(source, 10 * BLOCK_SIZE + 100)
+
+    backup(copier, source, destination)
+    assert destination.read_bytes() == data
+    assert copier.blocks_checked == copier.blocks_written == 11
+    assert os.path.isfile(tmp_path / ".dest.img.blocksums")
+    assert DeltaCopier.is_sidecar(".dest.img.blocksums")
+    assert len(copier.read_sidecar(destination)) == 11
+    assert os.stat(destination).st_mtime == os.stat(source).st_mtime
+
+
+def test_09_02_changed_blocks(tmp_path):
+    """
+    Test DeltaCopier.copy() with a previous copy.
+
+    Only the changed blocks are written; a shorter or longer source
+    is followed.
+    """
+    copier = DeltaCopier(BLOCK_SIZE)
+    source = tmp_path / "source.img"
+    destination = tmp_path / "dest.img"
+    data = make_file(source, 10 * BLOCK_SIZE + 100)
+    backup(copier, source, destination)
+
+    data[3 * BLOCK_SIZE + 5] ^= 0xFF
+    data[7 * BLOCK_SIZE] ^= 0xFF
+    source.write_bytes(data)
+    copier = DeltaCopier(BLOCK_SIZE)
+    backup(copier, source, destination)
+    assert destination.read_bytes() == data
+    assert copier.blocks_written == 2
+
+    data = data[: 5 * BLOCK_SIZE]
+    source.write_bytes(data)
+    backup(copier, source, destination)
+    assert destination.read_bytes() == data
+    assert copier.blocks_written == 2
+
+    data += b"more data"
+    source.write_bytes(data)
+    backup(copier, source, destination)
+    assert destination.read_bytes() == data
+    assert copier.blocks_written == 3
+
+
+def test_09_03_sidecar_not_valid(tmp_path):
+    """
+    Test DeltaCopier.copy() when the sidecar does not match the copy.
+
+    All blocks are written if the copy changed, the sidecar is damaged
+    or the block size changed.
+    """
+    copier = DeltaCopier(BLOCK_SIZE)
+    source = tmp_path / "source.img"
+    destination = tmp_path / "dest.img"
+    data = make_file(source, 4 * BLOCK_SIZE)
+    backup(copier, source, destination)
+
+    # the copy was changed after the sidecar was written
+    os.utime(destination, ns=(0, 1000))
+    assert copier.read_sidecar(destination) == []
+    backup(copier, source, destination)
+    assert copier.blocks_written == 8
+    assert destination.read_bytes() == data
+
+    # a damaged sidecar
+    sidecar = tmp_path / ".dest.img.blocksums"
+    sidecar.write_bytes(sidecar.read_bytes()[:-1])
+    assert copier.read_sidecar(destination) == []
+
+    # a different block size
+    backup(copier, source, destination)
+    assert DeltaCopier(2 * BLOCK_SIZE).read_sidecar(destination) == []
+
+
+def test_09_04_hard_link(tmp_path):
+    """
+    Test DeltaCopier.copy() on a copy with another hard link.
+
+    The copy is replaced, the other link is not changed.
+    """
+    copier = DeltaCopier(BLOCK_SIZE)
+    source = tmp_path / "source.img"
+    destination = tmp_path / "dest.img"
+    data = make_file(source, 4 * BLOCK_SIZE)
+    backup(copier, source, destination)
+    os.link(destination, tmp_path / "other.img")
+
+    new_data = make_file(source, 4 * BLOCK_SIZE)
+    backup(copier, source, destination)
+    assert destination.read_bytes() == new_data
+    assert (tmp_path / "other.img").read_bytes() == data
@@ -0,0 +1,92 @@
+"""
+Test the Snapshots class functionality.
+
+File:       test_10_snapshots.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.1
+"""
+
+import os
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from snapshots import Snapshots
+
+
+def test_10_01_init(tmp_path):
+    """
+    Testing Snapshots.__init__()
+
+    A new backup location has no snapshots.
+    """
+    snapshots = Snapshots(tmp_path)
+    assert isinstance(snapshots, Snapshots)
+    assert snapshots.names() == []
+    assert Snapshots(tmp_path / "missing").names() == []
+
+
+def test_10_02_start_finish(tmp_path):
+    """
+    Test Snapshots.start() and Snapshots.finish().
+
+    The snapshot is written to a partial directory, renamed when
+    finished, and is the previous snapshot for the next one.
+    """
+    snapshots = Snapshots(tmp_path)
+    working_dir = snapshots.start(0)
+    assert working_dir == str(tmp_path / "1970-01-01T000000Z.partial")
+    assert os.path.isdir(working_dir)
+    assert snapshots.previous_dir is None
+    assert snapshots.previous_path(os.path.join(working_dir, "file")) is None
+    assert snapshots.names() == []
+
+    assert snapshots.finish() == str(tmp_path / "1970-01-01T000000Z")
+    assert snapshots.names() == ["1970-01-01T000000Z"]
+
+    (tmp_path / "not_a_snapshot").mkdir()
+    snapshots = Snapshots(tmp_path)
+    working_dir = snapshots.start(86400)
+    assert snapshots.previous_dir == str(tmp_path / "1970-01-01T000000Z")
+    assert snapshots.previous_path(os.path.join(working_dir, "a", "file")) == str(
+        tmp_path / "1970-01-01T000000Z" / "a" / "file"
+    )
+    snapshots.finish()
+    assert snapshots.names() == ["1970-01-01T000000Z", "1970-01-02T000000Z"]
+
+
+def test_10_03_resume(tmp_path):
+    """
+    Test Snapshots.start() after a backup that did not finish.
+
+    The partial snapshot is carried on with and named for the new
+    backup.
+    """
+    snapshots = Snapshots(tmp_path)
+    working_dir = snapshots.start(0)
+    (tmp_path / working_dir / "file").write_text("copied")
+
+    snapshots = Snapshots(tmp_path)
+    assert snapshots.start(3600) == working_dir
+    assert snapshots.finish() == str(tmp_path / "1970-01-01T010000Z")
+    assert (tmp_path / "1970-01-01T010000Z" / "file").read_text() == "copied"
+
+
+def test_10_04_same_second(tmp_path):
+    """
+    Test two snapshots started in the same second.
+
+    The second snapshot is named for the next second, so both finish.
+    """
+    snapshots = Snapshots(tmp_path)
+    snapshots.start(1_700_000_000)
+    first = snapshots.finish()
+    snapshots.start(1_700_000_000)
+    second = snapshots.finish()
+    assert first != second
+    assert snapshots.names() == [os.path.basename(first), os.path.basename(second)]
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,147 @@
+"""
+Test the ChunkRepository class functionality.
+
+File:       test_11_repository.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.2
+"""
+
+import io
+import os
+import shutil
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+import pytest
+from repository import ChunkRepository
+
+
+class SmallChunks(ChunkRepository):
+    """A repository with small chunks, to keep the test files small."""
+
+    MIN_CHUNK = 1024
+    MAX_CHUNK = 16 * 1024
+    RUN_LENGTH = 10
+
+
+def test_11_01_chunks():
+    """
+    Test ChunkRepository.chunks().
+
+    The chunks hold all the data, are within the size limits and,
+    after an insert, the chunks after the insert are the same.
+    """
+    repository = SmallChunks("unused")
+    data = os.urandom(500 * 1024)
+    chunks = list(repository.chunks(io.BytesIO(data)))
+    assert b"".join(chunks) == data
+    assert all(len(chunk) <= SmallChunks.MAX_CHUNK for chunk in chunks)
+    assert all(len(chunk) >= SmallChunks.MIN_CHUNK for chunk in chunks[:-1])
+
+    shifted = list(repository.chunks(io.BytesIO(b"inserted" + data)))
+    assert len(set(chunks) & set(shifted)) >= len(chunks) - 2
+    assert list(repository.chunks(io.BytesIO(b""))) == []
+
+
+def test_11_02_store(tmp_path):
+    """
+    Test ChunkRepository.store().
+
+    The same data is stored once, and the snapshot manifest lists the
+    chunks of each file.
+    """
+    data = os.urandom(100 * 1024)
+    for name in ("one.bin", "two.bin"):
+        (tmp_path / name).write_bytes(data)
+    (tmp_path / "empty.txt").write_bytes(b"")
+    repository = SmallChunks(tmp_path / "repo")
+    repository.start(0)
+    for name in ("one.bin", "two.bin", "empty.txt"):
+        path = tmp_path / name
+        assert repository.store(str(path), name, os.stat(path))
+    assert repository.finish() == "1970-01-01T000000Z"
+    assert repository.snapshot_names() == ["1970-01-01T000000Z"]
+    assert repository.bytes_written == len(data)
+    assert repository.bytes_reused == len(data)
+
+    entries = {
+        entry["path"]: entry for entry in repository.read_manifest("1970-01-01T000000Z")
+    }
+    assert entries["one.bin"]["chunks"] == entries["two.bin"]["chunks"]
+    assert entries["empty.txt"]["chunks"] == []
+    assert entries["one.bin"]["size"] == len(data)
+    stored = b"".join(
+        open(repository.chunk_path(chunk_id), "rb").read()
+        for chunk_id in entries["one.bin"]["chunks"]
+    )
+    assert stored == data
+
+
+def test_11_03_unchanged(tmp_path):
+    """
+    Test ChunkRepository.store() with a previous snapshot.
+
+    An unchanged file is not read again; a changed file is.
+    """
+    for name in ("one.bin", "two.bin"):
+        (tmp_path / name).write_bytes(os.urandom(50 * 1024))
+    if sys.platform.startswith("linux"):
+        os.symlink(tmp_path / "one.bin", tmp_path / "link")
+
+    repository = SmallChunks(tmp_path / "repo")
+    repository.start(0)
+    for name in os.listdir(tmp_path):
+        if name != "repo":
+            path = tmp_path / name
+            repository.store(str(path), name, os.stat(path))
+    repository.finish()
+
+    (tmp_path / "two.bin").write_bytes(os.urandom(50 * 1024))
+    repository = SmallChunks(tmp_path / "repo")
+    repository.start(3600)
+    path = tmp_path / "one.bin"
+    assert not repository.store(str(path), "one.bin", os.stat(path))
+    path = tmp_path / "two.bin"
+    assert repository.store(str(path), "two.bin", os.stat(path))
+    repository.finish()
+    assert repository.files_unchanged == 1
+    assert repository.snapshot_names() == ["1970-01-01T000000Z", "1970-01-01T010000Z"]
+
+    if sys.platform.startswith("linux"):
+        entries = list(repository.read_manifest("1970-01-01T000000Z"))
+        links = [entry for entry in entries if entry["path"] == "link"]
+        assert links[0]["target"] == str(tmp_path / "one.bin")
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+def test_11_04_named_pipe(tmp_path):
+    """
+    Test that ChunkRepository.store() does not read a named pipe.
+    """
+    pipe = tmp_path / "pipe"
+    os.mkfifo(pipe)
+    repository = SmallChunks(tmp_path / "repo")
+    repository.start(0)
+    with pytest.raises(shutil.SpecialFileError):
+        repository.store(str(pipe), "pipe", os.stat(pipe))
+    repository.finish()
+    assert list(repository.read_manifest("1970-01-01T000000Z")) == []
+
+
+def test_11_05_same_second(tmp_path):
+    """
+    Test that two snapshots started in the same second get distinct names.
+    """
+    (tmp_path / "file").write_bytes(b"data")
+    repository = SmallChunks(tmp_path / "repo")
+    for expected in ("1970-01-01T000000Z", "1970-01-01T000001Z"):
+        repository.start(0)
+        repository.store(str(tmp_path / "file"), "file", os.stat(tmp_path / "file"))
+        assert repository.finish() == expected
+    assert repository.snapshot_names() == ["1970-01-01T000000Z", "1970-01-01T000001Z"]
+    assert [entry["path"] for entry in repository.read_manifest(expected)] == ["file"]
@@ -0,0 +1,202 @@
+"""
+Test the Pruner class functionality.
+
+File:       test_12_pruner.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.1
+"""
+
+import os
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from build_filesystem import build_config_file, new_filesys
+from logger import Logger
+from pruner import Pruner
+from repository import ChunkRepository
+from result_codes import ResultCodes
+
+DAY = 86400
+
+
+def prune_config(tmp_path, layout):
+    """
+    Build the configuration for a prune keeping one day.
+
+    Parameters:
+        tmp_path (Path): the test directory.
+        layout (str): the backup layout.
+
+    Returns:
+        (Settings) the configuration.
+    """
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    new_filesys(source, dest)
+    config = build_config_file(source, dest)
+    config.setValue("backup_layout", layout)
+    config.setValue("keep_daily", 1)
+    config.setValue("keep_weekly", 0)
+    config.setValue("keep_monthly", 0)
+    return config
+
+
+def reset_config(config):
+    """
+    Set the changed configuration values back to their defaults.
+
+    Parameters:
+        config (Settings): the configuration.
+    """
+    config.setValue("backup_layout", "mirror")
+    config.setValue("keep_daily", 7)
+    config.setValue("keep_weekly", 4)
+    config.setValue("keep_monthly", 12)
+
+
+def test_12_01_select_kept():
+    """
+    Test Pruner.select_kept().
+
+    The latest snapshot of each period is kept, and always the latest.
+    """
+    names = [
+        "2025-01-01T010000Z",
+        "2025-01-01T020000Z",
+        "2025-01-02T010000Z",
+        "2025-01-09T010000Z",
+        "2025-02-01T010000Z",
+        "2025-02-02T010000Z",
+        "2025-02-02T020000Z",
+    ]
+    assert Pruner.select_kept(names, 0, 0, 0) == {"2025-02-02T020000Z"}
+    assert Pruner.select_kept(names, 2, 0, 0) == {
+        "2025-02-01T010000Z",
+        "2025-02-02T020000Z",
+    }
+    assert Pruner.select_kept(names, 0, 3, 0) == {
+        "2025-01-02T010000Z",
+        "2025-01-09T010000Z",
+        "2025-02-02T020000Z",
+    }
+    assert Pruner.select_kept(names, 1, 0, 2) == {
+        "2025-01-09T010000Z",
+        "2025-02-02T020000Z",
+    }
+    assert Pruner.select_kept([], 7, 4, 12) == set()
+
+
+def test_12_02_prune_snapshots(tmp_path):
+    """
+    Test pruning the 'snapshot' layout.
+
+    The old snapshots are removed, and only files not linked to a kept
+    snapshot free any space.
+    """
+    config = prune_config(tmp_path, "snapshot")
+    location = tmp_path / "dest" / "backup_dir"
+    old = location / "2025-01-01T000000Z"
+    new = location / "2025-01-02T000000Z"
+    for snapshot in (old, new):
+        (snapshot / "sub").mkdir(parents=True)
+    (old / "sub" / "shared.txt").write_text("in both snapshots")
+    os.link(old / "sub" / "shared.txt", new / "sub" / "shared.txt")
+    (old / "sub" / "old.bin").write_bytes(os.urandom(8192))
+    (location / "2024-12-01T000000Z.deleting" / "sub").mkdir(parents=True)
+
+    logger = Logger(str(tmp_path / "dest"), "tests/test_log.db")
+    pruner = Pruner(config, logger, {"verbose": False})
+    logger.close_log()
+    reset_config(config)
+
+    assert pruner.result == ResultCodes.SUCCESS
+    assert sorted(os.listdir(location)) == ["2025-01-02T000000Z"]
+    assert (new / "sub" / "shared.txt").read_text() == "in both snapshots"
+    assert pruner.snapshots_removed == 1
+    assert pruner.snapshots_kept == 1
+    assert pruner.items_removed == 2
+    assert pruner.bytes_reclaimed >= 8192
+
+
+def test_12_03_prune_repository(tmp_path):
+    """
+    Test pruning the 'repository' layout.
+
+    The old manifest is removed with the chunks only it used.
+    """
+    config = prune_config(tmp_path, "repository")
+    location = tmp_path / "dest" / "backup_dir"
+    shared = tmp_path / "shared.bin"
+    shared.write_bytes(os.urandom(4096))
+    old_only = tmp_path / "old_only.bin"
+    old_only.write_bytes(os.urandom(4096))
+
+    repository = ChunkRepository(location)
+    repository.start(0)
+    for path in (shared, old_only):
+        repository.store(str(path), path.name, os.stat(path))
+    repository.finish()
+    repository = ChunkRepository(location)
+    repository.start(DAY)
+    repository.store(str(shared), shared.name, os.stat(shared))
+    repository.finish()
+
+    logger = Logger(str(tmp_path / "dest"), "tests/test_log.db")
+    pruner = Pruner(config, logger, {"verbose": False})
+    logger.close_log()
+    reset_config(config)
+
+    assert pruner.result == ResultCodes.SUCCESS
+    assert repository.snapshot_names() == ["1970-01-02T000000Z"]
+    entries = list(repository.read_manifest("1970-01-02T000000Z"))
+    for chunk_id in entries[0]["chunks"]:
+        assert os.path.isfile(repository.chunk_path(chunk_id))
+    chunk_count = sum(
+        len(files) for current_dir, dirs, files in os.walk(repository.chunks_dir)
+    )
+    assert chunk_count == len(entries[0]["chunks"])
+    assert pruner.items_removed == 2
+    assert pruner.bytes_reclaimed >= 4096
+
+
+def test_12_04_prune_repository_locked(tmp_path):
+    """
+    Test pruning a repository while a backup holds the lock.
+
+    No chunk is removed while the backup runs, not even its partly
+    written chunks; once it has finished, the unused chunks go.
+    """
+    config = prune_config(tmp_path, "repository")
+    location = tmp_path / "dest" / "backup_dir"
+    a_file = tmp_path / "data.bin"
+    a_file.write_bytes(os.urandom(4096))
+
+    repository = ChunkRepository(location)
+    repository.start(0)
+    repository.store(str(a_file), a_file.name, os.stat(a_file))
+    repository.finish()
+    running = ChunkRepository(location)
+    running.start(DAY)
+    (chunk_id,) = running.previous[a_file.name][2]
+    partly_written = running.chunk_path(chunk_id)[:-4] + "0000.1.tmp"
+    with open(partly_written, "wb") as chunk:
+        chunk.write(b"new chunk")
+    assert not ChunkRepository(location).acquire(wait=False)
+
+    logger = Logger(str(tmp_path / "dest"), "tests/test_log.db")
+    Pruner(config, logger, {"verbose": False})
+    assert os.path.isfile(partly_written)
+    assert os.path.isfile(running.chunk_path(chunk_id))
+
+    running.finish()
+    pruner = Pruner(config, logger, {"verbose": False})
+    logger.close_log()
+    reset_config(config)
+    assert not os.path.exists(partly_written)
+    assert not os.path.exists(running.chunk_path(chunk_id))
+    assert pruner.result == ResultCodes.SUCCESS
@@ -0,0 +1,137 @@
+"""
+Test the Compressor class functionality.
+
+File:       test_13_compressor.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.1.0
+"""
+
+import lzma
+import os
+import sys
+
+import pytest
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from compressor import (
+    Compressor,
+    compress_file,
+    is_compressible,
+    open_compressed,
+    zstd,
+)
+from hasher import file_digest
+
+TEXT = b"The quick brown fox jumps over the lazy dog.\n" * 4000
+
+
+def test_13_01_is_compressible():
+    """
+    Test is_compressible().
+
+    Text compresses; known compressed formats, random data and empty
+    files do not.
+    """
+    assert is_compressible(TEXT)
+    assert not is_compressible(b"\xff\xd8\xff\xe0" + TEXT)  # JPEG
+    assert not is_compressible(b"PK\x03\x04" + TEXT)  # ZIP
+    assert not is_compressible(b"\x00\x00\x00\x18ftypmp42" + TEXT)  # MP4
+    assert not is_compressible(os.urandom(64 * 1024))
+    assert not is_compressible(b"")
+
+
+def test_13_02_compress_file(tmp_path):
+    """
+    Test compress_file() with lzma.
+
+    A text file is compressed with its permissions kept; random data is
+    left to be copied.
+    """
+    source = tmp_path / "notes.txt"
+    source.write_bytes(TEXT)
+    os.chmod(source, 0o640)
+    destination = tmp_path / "notes.txt.xz"
+
+    compressed, bytes_read, bytes_written, digest = compress_file(
+        str(source), str(destination), "lzma", 0
+    )
+    assert compressed
+    assert digest == file_digest(str(source))
+    assert bytes_read == len(TEXT)
+    assert bytes_written == os.stat(destination).st_size < len(TEXT)
+    assert lzma.decompress(destination.read_bytes()) == TEXT
+    assert os.stat(destination).st_mode & 0o777 == 0o640
+    assert not os.path.exists(str(destination) + ".tmp")
+
+    source.write_bytes(os.urandom(100 * 1024))
+    os.unlink(destination)
+    assert compress_file(str(source), str(destination), "lzma", 1) == (
+        False,
+        0,
+        0,
+        None,
+    )
+    assert not os.path.exists(destination)
+
+
+@pytest.mark.skipif(zstd is None, reason="zstd needs Python 3.14")
+def test_13_03_compress_zstd(tmp_path):
+    """Test compress_file() with zstd."""
+    source = tmp_path / "notes.txt"
+    source.write_bytes(TEXT)
+    destination = tmp_path / "notes.txt.zst"
+    assert compress_file(str(source), str(destination), "zstd", 3)[0]
+    assert zstd.decompress(destination.read_bytes()) == TEXT
+
+
+def test_13_04_compressor(tmp_path):
+    """
+    Test the Compressor with its process pool.
+
+    The counts are kept for the files compressed only.
+    """
+    assert Compressor.available("lzma")
+    assert not Compressor.available("gzip")
+    compressor = Compressor("lzma", 1, 2)
+    assert compressor.suffix == ".xz"
+    assert compressor.workers == 2
+
+    text_file = tmp_path / "notes.txt"
+    text_file.write_bytes(TEXT)
+    image_file = tmp_path / "photo.jpg"
+    image_file.write_bytes(b"\xff\xd8\xff\xe0" + TEXT)
+    try:
+        assert compressor.compress(text_file, tmp_path / "backup.txt") == (
+            file_digest(str(text_file))
+        )
+        assert not compressor.compress(image_file, tmp_path / "backup.jpg")
+    finally:
+        compressor.close()
+    assert compressor.pool is None
+    assert lzma.decompress((tmp_path / "backup.txt.xz").read_bytes()) == TEXT
+    assert not os.path.exists(tmp_path / "backup.jpg.xz")
+    assert compressor.files_compressed == 1
+    assert compressor.bytes_read == len(TEXT)
+    assert compressor.bytes_written < len(TEXT)
+
+
+def test_13_05_open_compressed(tmp_path):
+    """
+    Test open_compressed().
+
+    A compressed copy is read back as the original data; a file without
+    a known suffix cannot be read.
+    """
+    source = tmp_path / "notes.txt"
+    source.write_bytes(TEXT)
+    destination = tmp_path / "notes.txt.xz"
+    compress_file(str(source), str(destination), "lzma", 1)
+    with open_compressed(str(destination)) as copy:
+        assert copy.read() == TEXT
+    with pytest.raises(ValueError):
+        open_compressed(str(source))
@@ -0,0 +1,115 @@
+"""
+Test the Bundle class functionality.
+
+File:       test_14_bundle.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.1
+"""
+
+import os
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from bundle import INDEX_NAME, PACK_NAME, Bundle
+
+
+def make_files(directory, contents: dict[str, bytes]) -> list:
+    """Write the source files and list them as the bundle takes them."""
+    files = []
+    for filename, data in contents.items():
+        path = directory / filename
+        path.write_bytes(data)
+        files.append((filename, str(path), os.stat(path)))
+    return files
+
+
+def test_14_01_write_and_read(tmp_path):
+    """
+    Test Bundle.write() and Bundle.read().
+
+    Each file can be read back from the pack, also after the index is
+    read again.
+    """
+    source = tmp_path / "source"
+    source.mkdir()
+    backup = tmp_path / "backup"
+    backup.mkdir()
+    contents = {"a.txt": b"first file", "b.txt": b"", "c.txt": b"third" * 100}
+    files = make_files(source, contents)
+
+    bundle = Bundle(backup)
+    assert bundle.entries == {}
+    assert not bundle.is_current(files)
+    assert bundle.changed_files(files) == 3
+    assert bundle.write(files) == sum(len(data) for data in contents.values())
+    assert sorted(os.listdir(backup)) == [PACK_NAME, INDEX_NAME]
+    assert Bundle.is_bundle_file(PACK_NAME) and Bundle.is_bundle_file(INDEX_NAME)
+    assert not Bundle.is_bundle_file("a.txt")
+
+    bundle = Bundle(backup)
+    assert bundle.is_current(files)
+    for filename, data in contents.items():
+        assert bundle.read(filename) == data
+
+
+def test_14_02_changes(tmp_path):
+    """
+    Test Bundle.is_current() and Bundle.changed_files().
+
+    A changed, added or removed file means the bundle is written again;
+    an index that does not match the pack is not used.
+    """
+    source = tmp_path / "source"
+    source.mkdir()
+    files = make_files(source, {"a.txt": b"first", "b.txt": b"second"})
+    bundle = Bundle(tmp_path)
+    bundle.write(files)
+
+    changed = make_files(source, {"a.txt": b"first, changed"})
+    assert bundle.changed_files(changed + files[1:]) == 1
+    assert not bundle.is_current(changed + files[1:])
+    assert not bundle.is_current(files[:1])
+
+    with open(bundle.pack_path, "ab") as pack:
+        pack.write(b"extra")
+    assert Bundle(tmp_path).entries == {}
+
+
+def test_14_03_extract_and_link(tmp_path):
+    """
+    Test Bundle.extract() and Bundle.link_from().
+
+    An extracted file has its mode and modification time; a linked
+    bundle shares the pack of the previous bundle.
+    """
+    source = tmp_path / "source"
+    source.mkdir()
+    path = source / "a.txt"
+    path.write_bytes(b"first file")
+    os.chmod(path, 0o600)
+    os.utime(path, ns=(1_000_000_000, 1_500_000_000))
+    files = [("a.txt", str(path), os.stat(path))]
+    first = tmp_path / "first"
+    first.mkdir()
+    previous = Bundle(first)
+    previous.write(files)
+
+    restored = tmp_path / "restored.txt"
+    assert previous.extract("a.txt", restored) == len(b"first file")
+    assert restored.read_bytes() == b"first file"
+    assert os.stat(restored).st_mode & 0o777 == 0o600
+    assert os.stat(restored).st_mtime_ns == 1_500_000_000
+
+    second = tmp_path / "second"
+    second.mkdir()
+    bundle = Bundle(second)
+    assert bundle.link_from(previous)
+    assert bundle.is_current(files)
+    assert os.path.samefile(bundle.pack_path, previous.pack_path)
+    assert not Bundle(second).link_from(previous)
+    assert Bundle(second).is_current(files)
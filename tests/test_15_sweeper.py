@@ -0,0 +1,159 @@
+"""
+Test the MirrorSweeper class functionality.
+
+File:       test_15_sweeper.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.2
+"""
+
+import os
+import shutil
+import sys
+import time
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from manifest import Manifest
+from snapshots import SNAPSHOT_FORMAT
+from sweeper import TOMBSTONE_DIR, MirrorSweeper
+
+
+def make_mirror(tmp_path) -> tuple:
+    """
+    Make a source and its mirror, with the mirror files in the manifest.
+
+    The source has 'keep/a.txt' and 'keep/b.txt', and 'gone/c.txt'
+    and 'gone/deeper/d.txt' in the mirror only.
+    """
+    source = tmp_path / "source"
+    backup = tmp_path / "backup"
+    manifest = Manifest(str(tmp_path / "test.manifest"), source, backup)
+    for relative in ("keep/a.txt", "keep/b.txt", "gone/c.txt", "gone/deeper/d.txt"):
+        path = backup / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("backup of " + relative)
+        manifest.record(str(path.parent), path.name, os.stat(path))
+    (source / "keep").mkdir(parents=True)
+    (source / "keep" / "a.txt").write_text("a")
+    return source, backup, manifest
+
+
+def test_15_01_sweep(tmp_path):
+    """
+    Test MirrorSweeper.check_dir() and MirrorSweeper.finish().
+
+    Files and directories no longer in the source are removed from the
+    mirror and the manifest.
+    """
+    source, backup, manifest = make_mirror(tmp_path)
+    sweeper = MirrorSweeper(source, backup, manifest, 2)
+    sweeper.check_dir(str(backup), [])
+    sweeper.check_dir(str(backup / "keep"), ["a.txt"])
+    assert os.path.exists(backup / "keep" / "b.txt")
+    sweeper.finish()
+    assert sorted(os.listdir(backup)) == ["keep"]
+    assert os.listdir(backup / "keep") == ["a.txt"]
+    assert sweeper.files_deleted == 3
+    assert sweeper.dirs_deleted == 2
+    assert sweeper.failed == []
+    assert manifest.dir_keys() == ["keep"]
+    assert manifest.names(str(backup / "keep")) == ["a.txt"]
+    manifest.close()
+
+
+def test_15_02_source_not_read(tmp_path):
+    """
+    Test nothing is removed if the top of the source was not walked.
+    """
+    source, backup, manifest = make_mirror(tmp_path)
+    sweeper = MirrorSweeper(source, backup, manifest, 2)
+    sweeper.finish()
+    assert sweeper.files_deleted == 0
+    assert os.path.exists(backup / "gone" / "c.txt")
+    manifest.close()
+
+
+def test_15_03_tombstones(tmp_path):
+    """
+    Test 'keep_days'.
+
+    Deleted files are moved to the tombstone directory, and tombstone
+    directories older than 'keep_days' are removed.
+    """
+    source, backup, manifest = make_mirror(tmp_path)
+    old_name = time.strftime(SNAPSHOT_FORMAT, time.gmtime(time.time() - 3 * 86400))
+    old_tombstone = backup / TOMBSTONE_DIR / old_name
+    old_tombstone.mkdir(parents=True)
+    (old_tombstone / "old.txt").write_text("old")
+
+    sweeper = MirrorSweeper(source, backup, manifest, 2, keep_days=2)
+    sweeper.check_dir(str(backup), [])
+    sweeper.check_dir(str(backup / "keep"), ["a.txt", "b.txt"])
+    sweeper.finish()
+    assert not os.path.exists(old_tombstone)
+    assert not os.path.exists(backup / "gone")
+    tombstone = sweeper.tombstone
+    assert os.path.dirname(tombstone) == str(backup / TOMBSTONE_DIR)
+    with open(os.path.join(tombstone, "gone", "deeper", "d.txt")) as deleted:
+        assert deleted.read() == "backup of gone/deeper/d.txt"
+    manifest.close()
+
+
+def test_15_04_compressed_name_kept(tmp_path):
+    """
+    Test removing a file whose compressed name is another source file.
+
+    The copy of the deleted 'notes' goes; the copy of 'notes.xz', still
+    in the source, is kept.
+    """
+    source, backup, manifest = make_mirror(tmp_path)
+    for name in ("notes", "notes.xz"):
+        path = backup / "keep" / name
+        path.write_text("backup of " + name)
+        manifest.record(str(path.parent), name, os.stat(path))
+    sweeper = MirrorSweeper(source, backup, manifest, 2, suffixes=[".xz"])
+    sweeper.check_dir(str(backup), ["keep"])
+    sweeper.check_dir(str(backup / "keep"), ["a.txt", "notes.xz"])
+    sweeper.finish()
+    assert sorted(os.listdir(backup / "keep")) == ["a.txt", "notes.xz"]
+    manifest.close()
+
+
+def test_15_05_sweep_refused(tmp_path):
+    """
+    Test nothing is removed from an empty source or beyond max_percent.
+
+    An empty source, such as an unmounted drive, looks as though all
+    its files were deleted.
+    """
+    source, backup, manifest = make_mirror(tmp_path)
+    shutil.rmtree(source / "keep")
+    sweeper = MirrorSweeper(source, backup, manifest, 2)
+    sweeper.check_dir(str(backup), [])
+    sweeper.finish()
+    assert sweeper.files_deleted == 0
+    assert "is empty" in sweeper.refused
+    assert os.path.exists(backup / "keep" / "a.txt")
+    assert manifest.count() == 4
+
+    (source / "keep").mkdir()
+    (source / "keep" / "a.txt").write_text("a")
+    sweeper = MirrorSweeper(source, backup, manifest, 2, max_percent=50)
+    sweeper.check_dir(str(backup), [])
+    sweeper.check_dir(str(backup / "keep"), ["a.txt"])
+    sweeper.finish()
+    assert sweeper.files_deleted == 0
+    assert sweeper.refused.startswith("3 of the 4 files")
+    assert os.path.exists(backup / "gone" / "c.txt")
+
+    sweeper = MirrorSweeper(source, backup, manifest, 2, max_percent=75)
+    sweeper.check_dir(str(backup), [])
+    sweeper.check_dir(str(backup / "keep"), ["a.txt"])
+    sweeper.finish()
+    assert sweeper.refused is None
+    assert sweeper.files_deleted == 3
+    manifest.close()
@@ -0,0 +1,138 @@
+"""
+Test the Hasher class functionality.
+
+File:       test_16_hasher.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.1.1
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+import hasher
+import pytest
+from hasher import Hasher, StreamDigest, file_digest, read_back_digest
+
+
+def test_16_01_file_digest(tmp_path, monkeypatch):
+    """
+    Test file_digest().
+
+    A small file is hashed whole; a large file by its leaves, with the
+    same hash with or without the thread pool.
+    """
+    small = tmp_path / "small.bin"
+    small.write_bytes(b"small file")
+    expected = hashlib.blake2b(b"small file", digest_size=32).hexdigest()
+    assert file_digest(small) == expected
+
+    monkeypatch.setattr(hasher, "LEAF_SIZE", 1024)
+    data = os.urandom(5000)
+    large = tmp_path / "large.bin"
+    large.write_bytes(data)
+    leaves = [hasher.leaf_digest(data[i : i + 1024]) for i in range(0, 5000, 1024)]
+    expected = hasher.tree_digest(leaves)
+    assert file_digest(large) == expected
+    with ThreadPoolExecutor(3) as pool:
+        assert file_digest(large, pool) == expected
+
+
+def test_16_02_cache(tmp_path):
+    """
+    Test the Hasher cache.
+
+    An unchanged file is not hashed again, also after the cache is
+    closed and reopened; a changed file is.
+    """
+    a_file = tmp_path / "file1.txt"
+    a_file.write_text("first contents")
+    cache_path = str(tmp_path / "log" / "test.hashes")
+
+    file_hasher = Hasher(cache_path, 2)
+    digest = file_hasher.digest(str(a_file))
+    assert file_hasher.digest(str(a_file), os.stat(a_file)) == digest
+    assert file_hasher.files_hashed == 1
+    assert file_hasher.cache_hits == 1
+    file_hasher.close()
+
+    file_hasher = Hasher(cache_path, 2)
+    assert file_hasher.cached(os.stat(a_file)) == digest
+    a_file.write_text("second contents")
+    assert file_hasher.cached(os.stat(a_file)) is None
+    assert file_hasher.digest(str(a_file)) == file_digest(a_file)
+    assert file_hasher.files_hashed == 1
+    file_hasher.close()
+
+
+def test_16_03_memory_cache(tmp_path):
+    """Test a Hasher with no cache database keeps the hashes in memory."""
+    a_file = tmp_path / "file1.txt"
+    a_file.write_text("contents")
+    file_hasher = Hasher()
+    file_hasher.digest(str(a_file))
+    file_hasher.flush()
+    assert file_hasher.digest(str(a_file)) == file_digest(a_file)
+    assert file_hasher.cache_hits == 1
+    file_hasher.close()
+
+
+def test_16_04_stream_digest(tmp_path, monkeypatch):
+    """
+    Test StreamDigest.
+
+    Data hashed in pieces of any size has the hash of the file, small,
+    exactly one leaf, or large.
+    """
+    monkeypatch.setattr(hasher, "LEAF_SIZE", 1024)
+    for size in (0, 100, 1024, 5000, 6144):
+        data = os.urandom(size)
+        a_file = tmp_path / "file.bin"
+        a_file.write_bytes(data)
+        digest = StreamDigest()
+        for offset in range(0, size, 700):
+            digest.update(data[offset : offset + 700])
+        assert digest.hexdigest() == file_digest(a_file)
+        assert read_back_digest(str(a_file)) == file_digest(a_file)
+
+
+def test_16_05_remember(tmp_path):
+    """
+    Test Hasher.remember().
+
+    A hash found while copying is cached, unless the file has changed.
+    """
+    a_file = tmp_path / "file1.txt"
+    a_file.write_text("contents")
+    file_hasher = Hasher()
+    file_stat = os.stat(a_file)
+    file_hasher.remember(str(a_file), "1234", file_stat)
+    assert file_hasher.cached(file_stat) == "1234"
+
+    other = tmp_path / "file2.txt"
+    other.write_text("contents")
+    other_stat = os.stat(other)
+    other.write_text("changed contents")
+    file_hasher.remember(str(other), "5678", other_stat)
+    assert file_hasher.cached(os.stat(other)) is None
+    file_hasher.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+def test_16_06_named_pipe(tmp_path):
+    """Test that a Hasher does not read a named pipe."""
+    pipe = tmp_path / "pipe"
+    os.mkfifo(pipe)
+    file_hasher = Hasher()
+    with pytest.raises(shutil.SpecialFileError):
+        file_hasher.digest(str(pipe))
+    assert file_hasher.files_hashed == 0
+    file_hasher.close()
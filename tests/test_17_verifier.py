@@ -0,0 +1,184 @@
+"""
+Test the Verifier class functionality.
+
+File:       test_17_verifier.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import os
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+import verifier
+from build_filesystem import build_config_file, new_filesys
+from external_storage import ExternalStorage
+from logger import Logger
+from repository import ChunkRepository
+from result_codes import ResultCodes
+from verifier import Verifier
+
+
+def verify_config(tmp_path, layout="mirror"):
+    """
+    Build the configuration for checking a backup.
+
+    Parameters:
+        tmp_path (Path): the test directory.
+        layout (str): the backup layout.
+
+    Returns:
+        (Settings) the configuration.
+    """
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    new_filesys(source, dest)
+    config = build_config_file(source, dest)
+    config.setValue("backup_layout", layout)
+    config.setValue("hash_copies", True)
+    config.setValue("verify_rate", 0)
+    return config
+
+
+def reset_config(config):
+    """
+    Set the changed configuration values back to their defaults.
+
+    Parameters:
+        config (Settings): the configuration.
+    """
+    config.setValue("backup_layout", "mirror")
+    config.setValue("hash_copies", False)
+    config.setValue("verify_rate", 50)
+    config.setValue("verify_sample", 1.0)
+
+
+def run_verifier(config, dest):
+    """
+    Check the backup copies.
+
+    Parameters:
+        config (Settings): the configuration.
+        dest (Path): the directory holding the log database.
+
+    Returns:
+        (Verifier) the completed check.
+    """
+    logger = Logger(str(dest), "tests/test_log.db")
+    checker = Verifier(config, logger, {"verbose": False})
+    logger.close_log()
+    return checker
+
+
+def test_17_01_verify_mirror(tmp_path):
+    """
+    Test checking a mirror.
+
+    The hashed copies are all found correct; a decayed copy and a
+    missing copy are found and logged.
+    """
+    config = verify_config(tmp_path)
+    dest = tmp_path / "dest"
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+
+    checker = run_verifier(config, dest)
+    assert checker.result == ResultCodes.SUCCESS
+    assert 2 < checker.files_total <= backup.files_backed_up
+    assert checker.files_verified == checker.files_total
+    assert checker.bytes_read > 0
+
+    location = config.value("backup_location")
+    decayed = os.path.join(location, "test1", "file1.txt")
+    decayed_stat = os.stat(decayed)
+    with open(decayed, "r+b") as copy:
+        copy.write(b"X")
+    os.utime(decayed, ns=(decayed_stat.st_atime_ns, decayed_stat.st_mtime_ns))
+    os.unlink(os.path.join(location, "test1", "file2.txt"))
+
+    checker = run_verifier(config, dest)
+    reset_config(config)
+    assert checker.files_verified == checker.files_total - 2
+    assert sorted(result for result, description in checker.findings) == [
+        ResultCodes.FILE_CORRUPTED,
+        ResultCodes.FILE_MISSING,
+    ]
+    assert checker.result != ResultCodes.SUCCESS
+
+
+def test_17_02_sample_rotation(tmp_path):
+    """
+    Test checking a sample of the files each run.
+
+    Each run checks its part of the files, those not checked for
+    longest first, so the runs cover all the files in turn.
+    """
+    config = verify_config(tmp_path)
+    dest = tmp_path / "dest"
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    config.setValue("verify_sample", 0.5)
+
+    first = run_verifier(config, dest)
+    second = run_verifier(config, dest)
+    reset_config(config)
+    first_items = {item for item, checked in first.checked}
+    second_items = {item for item, checked in second.checked}
+    total = first.files_total
+    assert len(first_items) == len(second_items) == (total + 1) // 2
+    assert len(first_items | second_items) == total
+
+
+def test_17_03_verify_repository(tmp_path):
+    """
+    Test checking a repository; a damaged chunk is found.
+    """
+    config = verify_config(tmp_path, "repository")
+    dest = tmp_path / "dest"
+    location = config.value("backup_location")
+    a_file = tmp_path / "data.bin"
+    a_file.write_bytes(os.urandom(8192))
+    repository = ChunkRepository(location)
+    repository.start(0)
+    repository.store(str(a_file), "data.bin", os.stat(a_file))
+    repository.finish()
+
+    checker = run_verifier(config, dest)
+    assert checker.files_total == 1
+    assert checker.files_verified == 1
+
+    (chunk_id,) = repository.known_chunks
+    with open(repository.chunk_path(chunk_id), "r+b") as chunk:
+        chunk.write(b"\x00\x01")
+    checker = run_verifier(config, dest)
+    reset_config(config)
+    assert checker.findings[0][0] == ResultCodes.FILE_CORRUPTED
+
+
+def test_17_04_throttle(tmp_path, monkeypatch):
+    """
+    Test the read rate limit.
+
+    Reading faster than the rate waits for the time the bytes are
+    allowed.
+    """
+    delays = []
+    monkeypatch.setattr(verifier.time, "sleep", delays.append)
+    checker = Verifier.__new__(Verifier)
+    checker.lock = verifier.threading.Lock()
+    checker.rate = 1024 * 1024
+    checker.next_read = 0.0
+    checker.bytes_read = 0
+    for count in range(4):
+        checker.throttle(512 * 1024)
+    assert checker.bytes_read == 2 * 1024 * 1024
+    assert 1.9 < delays[-1] <= 2.0
@@ -0,0 +1,438 @@
+"""
+Test the Restorer class functionality.
+
+File:       test_18_restorer.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.5
+"""
+
+import json
+import lzma
+import os
+import shutil
+import sys
+import time
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from build_filesystem import build_config_file, new_filesys
+from external_storage import ExternalStorage
+from logger import Logger
+from repository import ChunkRepository
+from restorer import Restorer, write_sparse
+from result_codes import ResultCodes
+
+
+def restore_config(tmp_path, layout="mirror"):
+    """
+    Build the configuration for a backup to restore from.
+
+    Parameters:
+        tmp_path (Path): the test directory.
+        layout (str): the backup layout.
+
+    Returns:
+        (Settings) the configuration.
+    """
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    new_filesys(source, dest)
+    config = build_config_file(source, dest)
+    config.setValue("backup_layout", layout)
+    return config
+
+
+def reset_config(config):
+    """
+    Set the changed configuration values back to their defaults.
+
+    Parameters:
+        config (Settings): the configuration.
+    """
+    config.setValue("backup_layout", "mirror")
+    config.setValue("compression", "")
+    config.setValue("bundle_max_size", 0)
+
+
+def run_restorer(config, dest, **values):
+    """
+    Restore from the backup.
+
+    Parameters:
+        config (Settings): the configuration.
+        dest (Path): the directory holding the log database.
+        values: the "restore_path", "restore_time" and "restore_to"
+            values.
+
+    Returns:
+        (Restorer) the completed restore.
+    """
+    actions = {"verbose": False, "restore": True}
+    actions.update(values)
+    logger = Logger(str(dest), "tests/test_log.db")
+    files = Restorer(config, logger, actions)
+    logger.close_log()
+    return files
+
+
+def test_18_01_write_sparse(tmp_path):
+    """
+    Test write_sparse().
+
+    The data is written whole, with the blocks of zeros left as holes.
+    """
+    data = b"start" + bytes(4 * 1024 * 1024) + b"end"
+    path = tmp_path / "sparse.bin"
+    size = write_sparse([data[:1000], data[1000:]], str(path))
+    assert size == len(data)
+    assert path.read_bytes() == data
+    if hasattr(os.stat(path), "st_blocks"):
+        assert os.stat(path).st_blocks * 512 < len(data)
+
+    assert write_sparse([bytes(1000)], str(path)) == 1000
+    assert path.read_bytes() == bytes(1000)
+
+
+def test_18_02_times_and_paths():
+    """
+    Test reading the restore time and path, and choosing a snapshot.
+    """
+    assert Restorer.parse_time("") is None
+    day = Restorer.parse_time("2025-06-01")
+    assert time.localtime(day)[:5] == (2025, 6, 1, 23, 59)
+    assert time.localtime(Restorer.parse_time("2025-06-01 14:30"))[3:5] == (14, 30)
+
+    assert Restorer.relative_path("", "/home/me") == ""
+    assert Restorer.relative_path("/home/me/docs/", "/home/me") == "docs"
+    assert Restorer.relative_path("docs/./a", "/home/me") == os.path.join("docs", "a")
+    assert Restorer.relative_path("/home/me", "/home/me") == ""
+    assert Restorer.relative_path("/etc/x", "/home/me") == os.path.join(
+        os.pardir, os.pardir, "etc", "x"
+    )
+
+    names = ["2025-01-01T000000Z", "2025-02-01T000000Z", "2025-03-01T000000Z"]
+    assert Restorer.select_snapshot(names, None) == "2025-03-01T000000Z"
+    february = Restorer.parse_time("2025-02-15")
+    assert Restorer.select_snapshot(names, february) == "2025-02-01T000000Z"
+    assert Restorer.select_snapshot(names, Restorer.parse_time("2024-12-01")) is None
+
+
+def test_18_03_restore_mirror(tmp_path):
+    """
+    Test restoring from a mirror with compressed and bundled copies.
+
+    The files come back with their contents and modification times; a
+    second restore finds them current.
+    """
+    config = restore_config(tmp_path)
+    config.setValue("compression", "lzma")
+    config.setValue("compression_workers", 1)
+    config.setValue("bundle_max_size", 16)
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    notes = source / "test1" / "notes.txt"
+    notes.write_text("The quick brown fox jumps over the lazy dog.\n" * 200)
+    tiny = source / "test1" / "tiny.txt"
+    tiny.write_text("tiny")
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    config.setValue("compression_workers", 0)
+    location = config.value("backup_location")
+    assert os.path.exists(os.path.join(location, "test1", "notes.txt.xz"))
+
+    target = tmp_path / "restored"
+    files = run_restorer(config, dest, restore_path="test1", restore_to=str(target))
+    assert files.result == ResultCodes.SUCCESS
+    assert files.files_restored >= 4
+    for name in ("file1.txt", "file2.txt", "notes.txt", "tiny.txt"):
+        restored = target / "test1" / name
+        original = source / "test1" / name
+        assert restored.read_bytes() == original.read_bytes()
+        assert abs(os.stat(restored).st_mtime - os.stat(original).st_mtime) < 0.01
+    assert not os.path.exists(target / "test1" / "notes.txt.xz")
+
+    files = run_restorer(config, dest, restore_path="test1", restore_to=str(target))
+    reset_config(config)
+    assert files.files_current >= 3
+
+
+def test_18_04_restore_in_place(tmp_path):
+    """
+    Test restoring a deleted directory and a single file in place.
+    """
+    config = restore_config(tmp_path)
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    original = (source / "test2" / "file1.txt").read_text()
+    shutil.rmtree(source / "test2")
+
+    files = run_restorer(config, dest, restore_path=str(source / "test2"))
+    assert (source / "test2" / "file1.txt").read_text() == original
+
+    os.unlink(source / "test2" / "file2.txt")
+    files = run_restorer(config, dest, restore_path="test2/file2.txt")
+    reset_config(config)
+    assert files.files_restored == 1
+    assert os.path.exists(source / "test2" / "file2.txt")
+    assert not os.path.exists(source / "test2" / "file2.txt.restoring")
+
+
+def test_18_05_restore_snapshot(tmp_path):
+    """
+    Test restoring from the snapshot of a point in time.
+    """
+    config = restore_config(tmp_path, "snapshot")
+    dest = tmp_path / "dest"
+    location = tmp_path / "dest" / "backup_dir"
+    for name, text in (
+        ("2025-01-01T000000Z", "january"),
+        ("2025-02-01T000000Z", "february"),
+    ):
+        (location / name / "docs").mkdir(parents=True)
+        (location / name / "docs" / "a.txt").write_text(text)
+
+    target = tmp_path / "restored"
+    files = run_restorer(
+        config, dest, restore_time="2025-01-20", restore_to=str(target)
+    )
+    assert files.snapshot == "2025-01-01T000000Z"
+    assert (target / "docs" / "a.txt").read_text() == "january"
+
+    files = run_restorer(
+        config, dest, restore_time="2024-01-20", restore_to=str(target)
+    )
+    reset_config(config)
+    assert files.result == ResultCodes.NO_SNAPSHOT
+
+
+def test_18_06_restore_repository(tmp_path):
+    """
+    Test restoring from a repository, keeping the mode and time.
+    """
+    config = restore_config(tmp_path, "repository")
+    dest = tmp_path / "dest"
+    a_file = tmp_path / "data.bin"
+    a_file.write_bytes(os.urandom(300 * 1024) + bytes(1024 * 1024))
+    os.chmod(a_file, 0o640)
+    os.utime(a_file, ns=(1_700_000_000_000_000_000, 1_700_000_000_123_456_789))
+    repository = ChunkRepository(config.value("backup_location"))
+    repository.start(0)
+    repository.store(str(a_file), os.path.join("sub", "data.bin"), os.stat(a_file))
+    repository.finish()
+
+    target = tmp_path / "restored"
+    files = run_restorer(config, dest, restore_path="sub", restore_to=str(target))
+    reset_config(config)
+    restored = target / "sub" / "data.bin"
+    assert restored.read_bytes() == a_file.read_bytes()
+    assert os.stat(restored).st_mtime_ns == 1_700_000_000_123_456_789
+    assert os.stat(restored).st_mode & 0o777 == 0o640
+    assert files.bytes_restored == os.stat(a_file).st_size
+
+
+def test_18_07_compressed_name_clash(tmp_path):
+    """
+    Test backing up and restoring a file whose compressed name is taken.
+
+    'notes' is copied as it is, as 'notes.xz' is another source file;
+    both are backed up and restored with their own contents.
+    """
+    config = restore_config(tmp_path)
+    config.setValue("compression", "lzma")
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    notes = source / "test1" / "notes"
+    notes.write_text("The quick brown fox jumps over the lazy dog.\n" * 200)
+    packed = source / "test1" / "notes.xz"
+    packed.write_bytes(lzma.compress(b"a real compressed file\n" * 200))
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    location = config.value("backup_location")
+    assert (
+        open(os.path.join(location, "test1", "notes"), "rb").read()
+        == notes.read_bytes()
+    )
+    assert (
+        open(os.path.join(location, "test1", "notes.xz"), "rb").read()
+        == packed.read_bytes()
+    )
+
+    target = tmp_path / "restored"
+    for manifest_path in (dest / "log_dir").glob("*.manifest*"):
+        os.unlink(manifest_path)  # the names alone must tell them apart
+    run_restorer(config, dest, restore_path="test1", restore_to=str(target))
+    reset_config(config)
+    assert (target / "test1" / "notes").read_bytes() == notes.read_bytes()
+    assert (target / "test1" / "notes.xz").read_bytes() == packed.read_bytes()
+
+
+def test_18_08_temp_names(tmp_path):
+    """
+    Test that only the backup's own temporary files are left out.
+
+    A source file ending in '.tmp' is restored; a copy being compressed,
+    temporary block checksums, a bundle being written and a file being
+    restored are not.
+    """
+    config = restore_config(tmp_path)
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    (source / "test1" / "notes.tmp").write_text("a file named like a temp file")
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    backup_dir = os.path.join(config.value("backup_location"), "test1")
+    temp_names = (
+        "file1.txt.xz.tmp",
+        "file1.txt.zst.tmp",
+        ".file1.txt.blocksums.tmp",
+        ".backup.pack.tmp",
+        ".backup.pack.index.tmp",
+        "file2.txt.restoring",
+    )
+    for name in temp_names:
+        with open(os.path.join(backup_dir, name), "w") as temp_file:
+            temp_file.write("partly written")
+
+    target = tmp_path / "restored"
+    files = run_restorer(config, dest, restore_path="test1", restore_to=str(target))
+    reset_config(config)
+    assert files.result == ResultCodes.SUCCESS
+    assert (target / "test1" / "notes.tmp").read_text() == (
+        "a file named like a temp file"
+    )
+    for name in temp_names:
+        assert not os.path.exists(target / "test1" / name)
+
+
+def test_18_09_short_pack(tmp_path):
+    """
+    Test that a bundled file the pack holds only part of is not restored.
+
+    A file whose index entry runs past the end of the pack fails, as
+    does a bundle whose index does not match its pack.
+    """
+    config = restore_config(tmp_path)
+    config.setValue("bundle_max_size", 16)
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    (source / "test1" / "tiny.txt").write_text("tiny")
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    backup_dir = os.path.join(config.value("backup_location"), "test1")
+    index_path = os.path.join(backup_dir, ".backup.pack.index")
+    with open(index_path) as index:
+        index_data = json.load(index)
+    for entry in index_data["files"]:
+        if entry["name"] == "tiny.txt":
+            entry["offset"] = os.path.getsize(os.path.join(backup_dir, ".backup.pack"))
+    with open(index_path, "w") as index:
+        json.dump(index_data, index)
+
+    target = tmp_path / "restored"
+    files = run_restorer(config, dest, restore_path="test1", restore_to=str(target))
+    assert files.result == ResultCodes.FILE_NOT_RESTORED
+    assert files.failed == [str(target / "test1" / "tiny.txt")]
+    assert not os.path.exists(target / "test1" / "tiny.txt")
+    assert not os.path.exists(target / "test1" / "tiny.txt.restoring")
+
+    os.truncate(os.path.join(backup_dir, ".backup.pack"), 0)
+    files = run_restorer(config, dest, restore_path="test1", restore_to=str(target))
+    reset_config(config)
+    assert files.failed == [str(target / "test1" / ".backup.pack")]
+
+
+def test_18_10_path_not_in_backup(tmp_path, capsys):
+    """
+    Test restoring a path that is not in the backup.
+
+    A full path outside the source is not taken to be in the source; a
+    restore time has no effect on a mirror, which says so.
+    """
+    config = restore_config(tmp_path)
+    dest = tmp_path / "dest"
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    target = tmp_path / "restored"
+    for restore_path in ("test1/missing.txt", "missing", os.sep + "test1"):
+        files = run_restorer(
+            config, dest, restore_path=restore_path, restore_to=str(target)
+        )
+        assert files.result == ResultCodes.FILE_NOT_RESTORED
+        assert files.files_restored == 0
+    files = run_restorer(
+        config,
+        dest,
+        restore_path="test1/file1.txt",
+        restore_to=str(target),
+        restore_time="2025-01-01",
+    )
+    assert files.result == ResultCodes.SUCCESS
+    assert files.files_restored == 1
+    assert "has no effect on a mirror" in capsys.readouterr().out
+
+    config.setValue("backup_layout", "repository")
+    repository = ChunkRepository(config.value("backup_location"))
+    repository.start(0)
+    repository.finish()
+    files = run_restorer(config, dest, restore_path="missing", restore_to=str(target))
+    reset_config(config)
+    assert files.result == ResultCodes.FILE_NOT_RESTORED
+
+
+def test_18_11_file_grown_out_of_bundle(tmp_path):
+    """
+    Test restoring a file that has grown too large to be bundled.
+
+    The last small file of a directory is copied on its own once it
+    grows, and the old bundle is removed; where an old bundle is left,
+    the copy made on its own is restored.
+    """
+    config = restore_config(tmp_path)
+    config.setValue("bundle_max_size", 16)
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    small = source / "test1" / "small.txt"
+    small.write_text("old small")
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    backup_dir = os.path.join(config.value("backup_location"), "test1")
+    old_pack = tmp_path / "old_pack"
+    shutil.copytree(backup_dir, old_pack)
+
+    small.write_text("a new file, too large to bundle")
+    backup = ExternalStorage(
+        config, Logger(str(dest), "tests/test_log.db"), {"verbose": False}
+    )
+    backup.logger.close_log()
+    assert not os.path.exists(os.path.join(backup_dir, ".backup.pack"))
+    assert not os.path.exists(os.path.join(backup_dir, ".backup.pack.index"))
+
+    for name in (".backup.pack", ".backup.pack.index"):
+        shutil.copy2(old_pack / name, os.path.join(backup_dir, name))
+    target = tmp_path / "restored"
+    files = run_restorer(config, dest, restore_path="test1", restore_to=str(target))
+    reset_config(config)
+    assert files.result == ResultCodes.SUCCESS
+    assert (target / "test1" / "small.txt").read_text() == (
+        "a new file, too large to bundle"
+    )
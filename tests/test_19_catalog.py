@@ -0,0 +1,130 @@
+"""
+Test the Catalog class functionality.
+
+File:       test_19_catalog.py
+Author:     Lorn B Kerr
+Copyright:  (c) 2022 - 2025 Lorn B Kerr
+License:    MIT, see file LICENSE
+Version:    1.0.0
+"""
+
+import os
+import sys
+
+src_path = os.path.join(os.path.realpath("."), "src")
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+from catalog import Catalog
+
+
+class FileStat:
+    """The parts of a file status the catalog keeps."""
+
+    def __init__(self, size, mtime_ns):
+        self.st_size = size
+        self.st_mtime_ns = mtime_ns
+
+
+def record_run(catalog, started, files, keep_runs=0):
+    """
+    Record a run of the files given.
+
+    Parameters:
+        catalog (Catalog): the catalog.
+        started (int): the start time of the run.
+        files (dict[str, int]): the size of each file, by path.
+        keep_runs (int): the number of runs to keep.
+
+    Returns:
+        (int) the run id.
+    """
+    run_id = catalog.start_run(started, "mirror", "/backup")
+    for path, size in files.items():
+        catalog.add(os.path.join("/home/me", path), FileStat(size, started * 10**9))
+    catalog.finish_run(keep_runs)
+    return run_id
+
+
+def test_19_01_find(tmp_path):
+    """
+    Test finding files by part of their path, by glob and by short parts.
+    """
+    catalog = Catalog(str(tmp_path / "log" / "test.catalog"), "/home/me")
+    first = record_run(
+        catalog, 1000, {"docs/Report.txt": 10, "docs/notes.md": 20, "a_b": 1}
+    )
+    second = record_run(catalog, 2000, {"docs/Report.txt": 15, "pics/cat.png": 30})
+    assert catalog.runs() == [(first, 1000, None, 3), (second, 2000, None, 2)]
+
+    matches = catalog.find("report")
+    assert [match[:2] for match in matches] == [
+        ("docs/Report.txt", first),
+        ("docs/Report.txt", second),
+    ]
+    assert matches[1][4:] == (15, 2000 * 10**9)
+    assert [match[0] for match in catalog.find("docs/*.md")] == ["docs/notes.md"]
+    assert [match[0] for match in catalog.find("a_")] == ["a_b"]
+    assert [match[0] for match in catalog.find("t.p")] == ["pics/cat.png"]
+    assert catalog.find("missing") == []
+    assert "docs/Report.txt  15 bytes" in Catalog.describe(matches[1])
+    catalog.close()
+
+
+def test_19_02_runs_kept(tmp_path):
+    """
+    Test dropping the oldest runs, unfinished runs and failed files.
+    """
+    catalog = Catalog(str(tmp_path / "test.catalog"), "/home/me")
+    record_run(catalog, 1000, {"old.txt": 1})
+    record_run(catalog, 2000, {"kept.txt": 1})
+    third = record_run(catalog, 3000, {"kept.txt": 2}, keep_runs=2)
+    assert [run[0] for run in catalog.runs()][-1] == third
+    assert len(catalog.runs()) == 2
+    assert catalog.find("old.txt") == []
+
+    catalog.start_run(4000, "mirror", "/backup")
+    catalog.add("/home/me/unfinished.txt", FileStat(1, 0))
+    catalog.add("/home/me/failed.txt", FileStat(1, 0))
+    catalog.discard("/home/me/failed.txt")
+    catalog.close()
+
+    catalog = Catalog(str(tmp_path / "test.catalog"), "/home/me")
+    assert catalog.find("unfinished") == []
+    fourth = record_run(catalog, 5000, {"new.txt": 1})
+    assert len(catalog.runs()) == 3
+    assert catalog.db.execute(
+        "SELECT COUNT(*) FROM runs WHERE NOT complete"
+    ).fetchone() == (0,)
+    assert catalog.find("new.txt")[0][1] == fourth
+    catalog.close()
+
+
+def test_19_03_diff(tmp_path):
+    """
+    Test comparing the files of two runs.
+    """
+    catalog = Catalog(str(tmp_path / "test.catalog"), "/home/me")
+    first = record_run(
+        catalog, 1000, {"same.txt": 1, "changed.txt": 2, "removed.txt": 3}
+    )
+    second = record_run(
+        catalog, 1000, {"same.txt": 1, "changed.txt": 5, "b_added.txt": 4}
+    )
+    catalog.start_run(3000, "mirror", "/backup")
+    catalog.add("/home/me/a_added.txt", FileStat(6, 0))
+    assert catalog.diff(first, second) == (
+        ["b_added.txt"],
+        ["removed.txt"],
+        ["changed.txt"],
+    )
+    assert catalog.diff(second, first) == (
+        ["removed.txt"],
+        ["b_added.txt"],
+        ["changed.txt"],
+    )
+    assert catalog.diff(first, first) == ([], [], [])
+    added, removed, modified = catalog.diff(second, catalog.run_id)
+    assert added == ["a_added.txt"]
+    assert len(removed) == 3
+    catalog.close()